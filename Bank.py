@@ -1,225 +1,29 @@
-import sqlite3
-import json
 import customtkinter as ctk
-from tkinter import messagebox, simpledialog
-import matplotlib.pyplot as plt
-from config import load_config, save_config, get_exchange_rate
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from datetime import datetime
-from forex_python.converter import CurrencyRates  # Add this import
-
-#MARK: - Classes
-class BankAccount:
-    def __init__(self, account_type, currency, exchange_rate, balance, income_percentage=None):
-        self.account_type = account_type
-        self.currency = currency
-        self.exchange_rate = exchange_rate
-        self.balance = balance
-        self.income_percentage = income_percentage
-
-    def calculate_monthly_income(self):
-        if self.income_percentage:
-            return self.balance * (self.income_percentage / 100)
-        return 0
-
-class CreditCardOutcome:
-    def __init__(self, account_id, amount, description, account_distributions=None):
-        self.account_id = account_id
-        self.amount = amount
-        self.description = description
-        self.account_distributions = account_distributions or {}
-
-class Asset:
-    def __init__(self, name, quantity, price_per_unit):
-        self.name = name
-        self.quantity = quantity
-        self.price_per_unit = price_per_unit
-
-#MARK: - Database Functions
-def create_database():
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS accounts (
-            id INTEGER PRIMARY KEY,
-            account_type TEXT NOT NULL,
-            currency TEXT NOT NULL,
-            exchange_rate REAL NOT NULL,
-            balance REAL NOT NULL,
-            income_percentage REAL,
-            date TEXT NOT NULL
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS credit_card_outcomes (
-            id INTEGER PRIMARY KEY,
-            account_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            description TEXT,
-            account_distributions TEXT,
-            FOREIGN KEY (account_id) REFERENCES accounts (id)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS assets (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            quantity REAL NOT NULL,
-            price_per_unit REAL NOT NULL
-        )
-    ''')
-    # Check if the balance column exists, and add it if it doesn't
-    cursor.execute("PRAGMA table_info(accounts)")
-    columns = [column[1] for column in cursor.fetchall()]
-    if 'balance' not in columns:
-        cursor.execute('''
-            ALTER TABLE accounts ADD COLUMN balance REAL NOT NULL DEFAULT 0
-        ''')
-    # Check if the date column exists, and add it if it doesn't
-    cursor.execute("PRAGMA table_info(accounts)")
-    columns = [column[1] for column in cursor.fetchall()]
-    if 'date' not in columns:
-        cursor.execute('''
-            ALTER TABLE accounts ADD COLUMN date TEXT NOT NULL DEFAULT ''
-        ''')
-    conn.commit()
-    conn.close()
-
-def add_account(account):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    cursor.execute('''
-        INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, current_date))
-    conn.commit()
-    conn.close()
-
-def get_accounts():
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM accounts')
-    accounts = cursor.fetchall()
-    conn.close()
-    return accounts
-
-def update_account(account_id, account):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE accounts
-        SET account_type = ?, currency = ?, exchange_rate = ?, balance = ?, income_percentage = ?
-        WHERE id = ?
-    ''', (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, account_id))
-    conn.commit()
-    conn.close()
-
-def delete_account(account_id):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
-    conn.commit()
-    conn.close()
-
-def add_credit_card_outcome(outcome):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO credit_card_outcomes (account_id, amount, description, account_distributions)
-        VALUES (?, ?, ?, ?)
-    ''', (outcome.account_id, outcome.amount, outcome.description, json.dumps(outcome.account_distributions)))
-    conn.commit()
-    conn.close()
-
-def get_credit_card_outcomes():
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM credit_card_outcomes')
-    outcomes = cursor.fetchall()
-    conn.close()
-    return outcomes
-
-def update_credit_card_outcome(outcome_id, outcome):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE credit_card_outcomes
-        SET account_id = ?, amount = ?, description = ?, account_distributions = ?
-        WHERE id = ?
-    ''', (outcome.account_id, outcome.amount, outcome.description, json.dumps(outcome.account_distributions), outcome_id))
-    conn.commit()
-    conn.close()
-
-def delete_credit_card_outcome(outcome_id):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT account_distributions FROM credit_card_outcomes WHERE id = ?', (outcome_id,))
-    outcome = cursor.fetchone()
-    if outcome:
-        account_distributions = json.loads(outcome[0])
-        for account_id, amount in account_distributions.items():
-            cursor.execute('UPDATE accounts SET balance = balance + ? WHERE id = ?', (amount, account_id))
-    cursor.execute('DELETE FROM credit_card_outcomes WHERE id = ?', (outcome_id,))
-    conn.commit()
-    conn.close()
-
-def add_asset(asset):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO assets (name, quantity, price_per_unit)
-        VALUES (?, ?, ?)
-    ''', (asset.name, asset.quantity, asset.price_per_unit))
-    conn.commit()
-    conn.close()
-
-def get_assets():
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM assets')
-    assets = cursor.fetchall()
-    conn.close()
-    return assets
-
-def update_asset(asset_id, asset):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE assets
-        SET name = ?, quantity = ?, price_per_unit = ?
-        WHERE id = ?
-    ''', (asset.name, asset.quantity, asset.price_per_unit, asset_id))
-    conn.commit()
-    conn.close()
-
-def delete_asset(asset_id):
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM assets WHERE id = ?', (asset_id,))
-    conn.commit()
-    conn.close()
-
-def calculate_total_money():
-    accounts = get_accounts()
-    total_money = sum(account[3] for account in accounts)  # Assuming the balance is in the 4th column
-    return total_money
-
-def calculate_total_outcome():
-    outcomes = get_credit_card_outcomes()
-    total_outcome = sum(outcome[2] for outcome in outcomes)  # Assuming the amount is in the 3rd column
-    return total_outcome
-
-def get_money_over_time():
-    conn = sqlite3.connect('bank_portfolio.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT date, SUM(balance) FROM accounts GROUP BY date')
-    data = cursor.fetchall()
-    conn.close()
-    return data
+from tkinter import messagebox, simpledialog, filedialog
+from portfolio import database, metrics
+from portfolio.config import load_config, save_config, get_exchange_rate
+from portfolio.models import BankAccount, CreditCardOutcome, Asset
+from portfolio.store import create_database
+from portfolio.cache import get_cache
+from portfolio.importer import import_file, detect_format, KINDS as IMPORT_KINDS
+from portfolio.chart_data import money_pie, outcome_pie, MONEY_GROUPS, OUTCOME_GROUPS, TOP_N
+from tasks import TaskExecutor, StallProbe
+from table_view import open_table, open_search
+from diagnostics import open_diagnostics
+from translations import LANG_DICT
+
+# The data layer lives in the headless portfolio package; NumPy and matplotlib are
+# imported on first use so the window appears before they have loaded. Edits and the
+# pie charts go through the in-memory portfolio cache, which writes back in the background.
 
 def main():
     create_database()
+    portfolio_cache = get_cache().start()
+    add_account, update_account, delete_account = portfolio_cache.add_account, portfolio_cache.update_account, portfolio_cache.delete_account
+    add_credit_card_outcome = portfolio_cache.add_credit_card_outcome
+    update_credit_card_outcome = portfolio_cache.update_credit_card_outcome
+    delete_credit_card_outcome = portfolio_cache.delete_credit_card_outcome
+    add_asset, update_asset, delete_asset = portfolio_cache.add_asset, portfolio_cache.update_asset, portfolio_cache.delete_asset
     ctk.set_appearance_mode("dark")  # Modes: "System" (standard), "Dark", "Light"
     ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
 
@@ -233,80 +37,13 @@ def main():
     # Handle the window close button (X) to call the same function as the exit button
     root.protocol("WM_DELETE_WINDOW", root.quit)
 
-    #MARK: Language dictionary
-    lang_dict = {
-        "en": {
-            "add_account": "Add Account",
-            "view_accounts": "View Accounts",
-            "update_account": "Update Account",
-            "delete_account": "Delete Account",
-            "add_credit_card_outcome": "Add Credit Card Outcome",
-            "view_credit_card_outcomes": "View Credit Card Outcomes",
-            "update_credit_card_outcome": "Update Credit Card Outcome",
-            "delete_credit_card_outcome": "Delete Credit Card Outcome",
-            "add_asset": "Add Asset",
-            "view_assets": "View Assets",
-            "update_asset": "Update Asset",
-            "delete_asset": "Delete Asset",
-            "show_total_money_pie_chart": "Show Total Money Pie Chart",
-            "show_total_outcome_pie_chart": "Show Total Outcome Pie Chart",
-            "exit": "Exit",
-            "switch_language": "Switch Language",
-            "info": "Info",
-            "error": "Error",
-            "account_added_successfully": "Account added successfully",
-            "account_updated_successfully": "Account updated successfully",
-            "account_deleted_successfully": "Account deleted successfully",
-            "credit_card_outcome_added": "Credit card outcome added successfully",
-            "credit_card_outcome_updated": "Credit card outcome updated successfully",
-            "credit_card_outcome_deleted": "Credit card outcome deleted successfully",
-            "asset_added_successfully": "Asset added successfully",
-            "asset_updated_successfully": "Asset updated successfully",
-            "asset_deleted_successfully": "Asset deleted successfully",
-            "invalid_input": "Invalid input",
-            "total_money_distribution": "Total Money Distribution",
-            "no_data": "No Data",
-            "total_outcome_distribution": "Total Outcome Distribution",
-            "show_money_distribution_list": "Show Money Distribution List"
-        },
-        "tr": {
-            "add_account": "Hesap Ekle",
-            "view_accounts": "Hesapları Görüntüle",
-            "update_account": "Hesabı Güncelle",
-            "delete_account": "Hesabı Sil",
-            "add_credit_card_outcome": "Kredi Kartı Harcaması Ekle",
-            "view_credit_card_outcomes": "Kredi Kartı Harcamalarını Görüntüle",
-            "update_credit_card_outcome": "Kredi Kartı Harcamasını Güncelle",
-            "delete_credit_card_outcome": "Kredi Kartı Harcamasını Sil",
-            "add_asset": "Varlık Ekle",
-            "view_assets": "Varlıkları Görüntüle",
-            "update_asset": "Varlığı Güncelle",
-            "delete_asset": "Varlığı Sil",
-            "show_total_money_pie_chart": "Toplam Para Pasta Grafiğini Göster",
-            "show_total_outcome_pie_chart": "Toplam Harcama Pasta Grafiğini Göster",
-            "exit": "Çıkış",
-            "switch_language": "Dili Değiştir",
-            "info": "Bilgi",
-            "error": "Hata",
-            "account_added_successfully": "Hesap başarıyla eklendi",
-            "account_updated_successfully": "Hesap başarıyla güncellendi",
-            "account_deleted_successfully": "Hesap başarıyla silindi",
-            "credit_card_outcome_added": "Kredi kartı harcaması başarıyla eklendi",
-            "credit_card_outcome_updated": "Kredi kartı harcaması başarıyla güncellendi",
-            "credit_card_outcome_deleted": "Kredi kartı harcaması başarıyla silindi",
-            "asset_added_successfully": "Varlık başarıyla eklendi",
-            "asset_updated_successfully": "Varlık başarıyla güncellendi",
-            "asset_deleted_successfully": "Varlık başarıyla silindi",
-            "invalid_input": "Geçersiz giriş",
-            "total_money_distribution": "Toplam Para Dağılımı",
-            "no_data": "Veri Yok",
-            "total_outcome_distribution": "Toplam Harcama Dağılımı",
-            "show_money_distribution_list": "Para Dağılımını Göster"
-        }
-    }
+    executor = TaskExecutor(root)
+
+    lang_dict = LANG_DICT
 
     config = load_config()
     current_lang = config.get("language", "en")
+    metrics.enable(config.get("metrics", False))
 
     def update_ui_text():
         add_account_button.configure(text=lang_dict[current_lang]["add_account"])
@@ -315,6 +52,7 @@ def main():
         delete_account_button.configure(text=lang_dict[current_lang]["delete_account"])
         add_credit_card_outcome_button.configure(text=lang_dict[current_lang]["add_credit_card_outcome"])
         view_credit_card_outcomes_button.configure(text=lang_dict[current_lang]["view_credit_card_outcomes"])
+        search_outcomes_button.configure(text=lang_dict[current_lang]["search_outcomes"])
         update_credit_card_outcome_button.configure(text=lang_dict[current_lang]["update_credit_card_outcome"])
         delete_credit_card_outcome_button.configure(text=lang_dict[current_lang]["delete_credit_card_outcome"])
         add_asset_button.configure(text=lang_dict[current_lang]["add_asset"])
@@ -323,6 +61,11 @@ def main():
         delete_asset_button.configure(text=lang_dict[current_lang]["delete_asset"])
         exit_button.configure(text=lang_dict[current_lang]["exit"])
         show_distribution_button.configure(text=lang_dict[current_lang]["show_money_distribution_list"])
+        import_button.configure(text=lang_dict[current_lang]["import_data"])
+        diagnostics_button.configure(text=lang_dict[current_lang]["diagnostics"])
+        projection_button.configure(text=lang_dict[current_lang]["projection"])
+        refresh_rates_button.configure(text=lang_dict[current_lang]["refresh_rates"])
+        group_by_label.configure(text=lang_dict[current_lang]["group_by"])
 
 
     #MARK: - Button Logic Functions
@@ -332,23 +75,60 @@ def main():
         config["language"] = current_lang
         save_config(config)
         update_ui_text()
+        update_charts()  # Titles and labels are drawn into the charts; a language seen before comes from the chart cache
+
+    def show_error(error):
+        messagebox.showerror(lang_dict[current_lang]["error"], str(error), parent=root)
+
+    def watch_saving(shown=None):
+        # The cache refuses edits while its flushes keep failing; say so once per failure, not on every check
+        error = portfolio_cache.write_error()
+        if error and error != shown:
+            messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["saving_paused"].format(error=error), parent=root)
+        root.after(1000, watch_saving, error)
+
+    def run_write(fn, *args, message_key):
+        # Writes land in the cache on the executor's writer thread, one at a time in the order they were made,
+        # and reach the database on the next write-behind flush; the charts refresh from the cache once the write is in
+        def done(_):
+            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang][message_key], parent=root)
+            update_charts()
+        executor.submit(fn, *args, on_done=done, on_error=show_error, serial=True)
+
+    def load_valuation():
+        from portfolio.valuation import value_portfolio
+        return value_portfolio(portfolio_cache.positions(), config.get("reporting_currency", "TRY"))
+
+    def chart_settings():
+        return (money_grouping, outcome_grouping, config.get("reporting_currency", "TRY"), config.get("chart_top_n", TOP_N))
+
+    def load_chart_data():
+        # Slices are grouped and cut to the top N from the cache's columns, then scaled into the reporting currency.
+        # The version is read first, so the data is at least as new as the key it is drawn under.
+        import charts  # Loads matplotlib on the worker rather than the UI thread
+        data_key = (portfolio_cache.version, chart_settings())
+        money_group, outcome_group, _, top_n = data_key[1]
+        valuation = load_valuation()
+        return (data_key, portfolio_cache.money_breakdown(money_group, top_n, 1.0 / valuation.rate),
+                portfolio_cache.outcome_breakdown(outcome_group, top_n, 1.0 / valuation.rate), valuation)
+
+    def draw_charts(data):
+        nonlocal chart_manager
+        data_key, money_slices, outcome_slices, valuation = data
+        # The canvases are created once, with the first data; after that only the wedge data and labels change
+        if chart_manager is None:
+            from charts import ChartManager
+            chart_manager = ChartManager(root, chart_frame, cache_size=config.get("chart_cache_size", 24))
+        texts = lang_dict[current_lang]
+        chart_manager.update(money=money_pie(money_slices, valuation, texts), outcome=outcome_pie(outcome_slices, valuation, texts),
+                             key=data_key + (current_lang,))
 
     def update_charts():
-        # Clear the existing charts
-        for widget in chart_frame.winfo_children():
-            widget.destroy()
-
-        # Create and display the updated charts
-        money_chart = show_total_money_pie_chart()
-        outcome_chart = show_total_outcome_pie_chart()
-
-        money_canvas = FigureCanvasTkAgg(money_chart, master=chart_frame)
-        money_canvas.draw()
-        money_canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
-
-        outcome_canvas = FigureCanvasTkAgg(outcome_chart, master=chart_frame)
-        outcome_canvas.draw()
-        outcome_canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+        # Pies already drawn for this data, settings and language are shown again without a query;
+        # otherwise bursts of edits are coalesced into a single query + redraw
+        if chart_manager is not None and chart_manager.show((portfolio_cache.version, chart_settings(), current_lang)):
+            return
+        executor.coalesce("charts", load_chart_data, on_done=draw_charts, on_error=show_error)
 
     def add_account_ui():
         try:
@@ -359,16 +139,17 @@ def main():
             currency = simpledialog.askstring("Input", "Enter currency:", parent=root)
             if not currency:
                 return
-            exchange_rate = get_exchange_rate(currency)
-            if exchange_rate is None:
-                messagebox.showerror(lang_dict[current_lang]["error"], f"Error fetching exchange rate for {currency}", parent=root)
-                return
             income_percentage = simpledialog.askstring("Input", "Enter income percentage (leave blank if not applicable):", parent=root)
             income_percentage = float(income_percentage) if income_percentage else None
-            account = BankAccount(account_type, currency, exchange_rate, balance, income_percentage)
-            add_account(account)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["account_added_successfully"], parent=root)
-            update_charts()  # Update charts after adding account
+
+            def save():
+                # The rate lookup may hit the network, so it runs on the worker with the write
+                exchange_rate = get_exchange_rate(currency)
+                if exchange_rate is None:
+                    raise ValueError(f"Error fetching exchange rate for {currency}")
+                account = BankAccount(account_type, currency, exchange_rate, balance, income_percentage)
+                add_account(account)
+            run_write(save, message_key="account_added_successfully")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
@@ -382,25 +163,24 @@ def main():
             currency = simpledialog.askstring("Input", "Enter new currency:", parent=root)
             if not currency:
                 return
-            exchange_rate = get_exchange_rate(currency)
-            if exchange_rate is None:
-                messagebox.showerror(lang_dict[current_lang]["error"], f"Error fetching exchange rate for {currency}", parent=root)
-                return
             income_percentage = simpledialog.askstring("Input", "Enter new income percentage (leave blank if not applicable):", parent=root)
             income_percentage = float(income_percentage) if income_percentage else None
-            account = BankAccount(account_type, currency, exchange_rate, balance, income_percentage)
-            update_account(account_id, account)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["account_updated_successfully"], parent=root)
-            update_charts()  # Update charts after updating account
+
+            def save():
+                # The rate lookup may hit the network, so it runs on the worker with the write
+                exchange_rate = get_exchange_rate(currency)
+                if exchange_rate is None:
+                    raise ValueError(f"Error fetching exchange rate for {currency}")
+                account = BankAccount(account_type, currency, exchange_rate, balance, income_percentage)
+                update_account(account_id, account)
+            run_write(save, message_key="account_updated_successfully")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
     def delete_account_ui():
         try:
             account_id = int(simpledialog.askstring("Input", "Enter account ID to delete:", parent=root))
-            delete_account(account_id)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["account_deleted_successfully"], parent=root)
-            update_charts()  # Update charts after deleting account
+            run_write(delete_account, account_id, message_key="account_deleted_successfully")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
@@ -419,16 +199,26 @@ def main():
                 dist_amount = float(simpledialog.askstring("Input", "Enter amount taken from this account:", parent=root))
                 account_distributions[int(dist_account_id)] = dist_amount
             outcome = CreditCardOutcome(account_id, amount, description, account_distributions)
-            add_credit_card_outcome(outcome)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["credit_card_outcome_added"], parent=root)
-            update_charts()  # Update charts after adding credit card outcome
+            run_write(add_credit_card_outcome, outcome, message_key="credit_card_outcome_added")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
+    def open_table_view(table, title_key, **options):
+        # Rows are paged in from the database as the user scrolls, sorts or filters, so pending cache writes go first
+        labels = {key: lang_dict[current_lang][key] for key in ("filter", "previous", "next")}
+        executor.submit(portfolio_cache.flush, on_error=show_error, serial=True,
+                        on_done=lambda _: open_table(root, executor, table, lang_dict[current_lang][title_key],
+                                                     on_error=show_error, labels=labels, **options))
+
     def view_credit_card_outcomes_ui():
-        outcomes = get_credit_card_outcomes()
-        outcomes_str = "\n".join([str(outcome) for outcome in outcomes])
-        messagebox.showinfo(lang_dict[current_lang]["info"], outcomes_str)
+        open_table_view("outcomes", "view_credit_card_outcomes")
+
+    def search_outcomes_ui():
+        # The search index and category totals are kept by database triggers, so pending cache writes go first
+        labels = {key: lang_dict[current_lang][key] for key in ("search", "all_categories", "category", "outcomes", "total")}
+        executor.submit(portfolio_cache.flush, on_error=show_error, serial=True,
+                        on_done=lambda _: open_search(root, executor, lang_dict[current_lang]["search_outcomes"],
+                                                      on_error=show_error, labels=labels))
 
     def update_credit_card_outcome_ui():
         try:
@@ -446,18 +236,14 @@ def main():
                 dist_amount = float(simpledialog.askstring("Input", "Enter new amount taken from this account:", parent=root))
                 account_distributions[int(dist_account_id)] = dist_amount
             outcome = CreditCardOutcome(account_id, amount, description, account_distributions)
-            update_credit_card_outcome(outcome_id, outcome)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["credit_card_outcome_updated"], parent=root)
-            update_charts()  # Update charts after updating credit card outcome
+            run_write(update_credit_card_outcome, outcome_id, outcome, message_key="credit_card_outcome_updated")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
     def delete_credit_card_outcome_ui():
         try:
             outcome_id = int(simpledialog.askstring("Input", "Enter outcome ID to delete:", parent=root))
-            delete_credit_card_outcome(outcome_id)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["credit_card_outcome_deleted"], parent=root)
-            update_charts()  # Update charts after deleting credit card outcome
+            run_write(delete_credit_card_outcome, outcome_id, message_key="credit_card_outcome_deleted")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
@@ -469,16 +255,12 @@ def main():
             quantity = float(simpledialog.askstring("Input", "Enter quantity:", parent=root))
             price_per_unit = float(simpledialog.askstring("Input", "Enter price per unit:", parent=root))
             asset = Asset(name, quantity, price_per_unit)
-            add_asset(asset)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["asset_added_successfully"], parent=root)
-            update_charts()  # Update charts after adding asset
+            run_write(add_asset, asset, message_key="asset_added_successfully")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
     def view_assets_ui():
-        assets = get_assets()
-        assets_str = "\n".join([str(asset) for asset in assets])
-        messagebox.showinfo(lang_dict[current_lang]["info"], assets_str)
+        open_table_view("assets", "view_assets")
 
     def update_asset_ui():
         try:
@@ -489,109 +271,227 @@ def main():
             quantity = float(simpledialog.askstring("Input", "Enter new quantity:", parent=root))
             price_per_unit = float(simpledialog.askstring("Input", "Enter new price per unit:", parent=root))
             asset = Asset(name, quantity, price_per_unit)
-            update_asset(asset_id, asset)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["asset_updated_successfully"], parent=root)
-            update_charts()  # Update charts after updating asset
+            run_write(update_asset, asset_id, asset, message_key="asset_updated_successfully")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
     def delete_asset_ui():
         try:
             asset_id = int(simpledialog.askstring("Input", "Enter asset ID to delete:", parent=root))
-            delete_asset(asset_id)
-            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["asset_deleted_successfully"], parent=root)
-            update_charts()  # Update charts after deleting asset
+            run_write(delete_asset, asset_id, message_key="asset_deleted_successfully")
         except (TypeError, ValueError):
             messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
 
     def view_accounts_ui():
-        accounts = get_accounts()
-        accounts_str = "\n".join([f"ID: {a[0]}, Type: {a[1]}, Currency: {a[2]}, Exchange Rate: {a[3]}, Income Percentage: {a[4]}, Date: {a[5]}" for a in accounts])
-        messagebox.showinfo(lang_dict[current_lang]["info"], accounts_str)
+        open_table_view("accounts", "view_accounts")
+
+    def import_ui():
+        path = filedialog.askopenfilename(parent=root, filetypes=[("Statements", "*.csv *.qif *.ofx"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            fmt = detect_format(path)
+            kind = "outcomes"
+            if fmt == "csv":
+                kind = (simpledialog.askstring("Input", lang_dict[current_lang]["import_kind"], parent=root) or "").strip().lower()
+                if not kind:
+                    return
+                if kind not in IMPORT_KINDS:
+                    raise ValueError(kind)
+            account_id = None
+            if kind == "outcomes":
+                account_id = simpledialog.askstring("Input", lang_dict[current_lang]["import_account_id"], parent=root)
+                account_id = int(account_id) if account_id else None
+        except (TypeError, ValueError):
+            messagebox.showerror(lang_dict[current_lang]["error"], lang_dict[current_lang]["invalid_input"], parent=root)
+            return
+
+        def progress(rows):
+            import_button.configure(text=f"{rows} ({lang_dict[current_lang]['cancel']})")
+
+        def finish():
+            import_button.configure(text=lang_dict[current_lang]["import_data"], command=import_ui)
+
+        def done(result):
+            finish()
+            message = "\n".join([result.summary()] + [str(e) for e in result.errors[:10]])
+            messagebox.showinfo(lang_dict[current_lang]["info"], message, parent=root)
+            update_charts()
+
+        def failed(error):
+            finish()
+            show_error(error)
+
+        def cancel():
+            # Batches already written stay committed
+            task.cancel()
+            finish()
+            update_charts()
+
+        def run_import(task):
+            # The importer writes straight to the database, so the cache is flushed before and re-read after
+            portfolio_cache.invalidate()
+            try:
+                return import_file(path, kind, fmt, account_id, progress=task.progress)
+            finally:
+                portfolio_cache.invalidate()
+
+        task = executor.submit(run_import, with_task=True, on_done=done, on_error=failed, on_progress=progress, serial=True)
+        import_button.configure(text=lang_dict[current_lang]["cancel"], command=cancel)
 
     #MARK: - Chart Logic and UI Functions
     chart_frame = ctk.CTkFrame(root)
     chart_frame.pack(side="right", fill="both", expand=True)
 
-    def show_total_money_pie_chart():
-        accounts = get_accounts()
-        if not accounts:
-            labels = [lang_dict[current_lang]["no_data"]]
-            sizes = [1]
-            autopct = lambda p: '0.0%' if p == 100 else ''
-            total_money = 0
-        else:
-            labels = [f"ID: {a[0]}, Type: {a[1]}" for a in accounts]
-            sizes = [a[3] for a in accounts]  # Assuming the balance is in the 4th column
-            autopct = '%1.1f%%'
-            total_money = sum(sizes)
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.pie(sizes, labels=labels, autopct=autopct, startangle=140)
-        ax.set_title(lang_dict[current_lang]["total_money_distribution"])
-        plt.figtext(0.5, 0.05, f"Total Money: {total_money}", ha="center", fontsize=12)  # Adjusted position
-        return fig
-
-    def show_total_outcome_pie_chart():
-        outcomes = get_credit_card_outcomes()
-        if not outcomes:
-            labels = [lang_dict[current_lang]["no_data"]]
-            sizes = [1]
-            autopct = lambda p: '0.0%' if p == 100 else ''
-            total_outcome = 0
-        else:
-            labels = [f"ID: {o[0]}, Desc: {o[3]}" for o in outcomes]
-            sizes = [o[2] for o in outcomes]  # Assuming the amount is in the 3rd column
-            autopct = '%1.1f%%'
-            total_outcome = sum(sizes)
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.pie(sizes, labels=labels, autopct=autopct, startangle=140)
-        ax.set_title(lang_dict[current_lang]["total_outcome_distribution"])
-        plt.figtext(0.5, 0.01, f"Total debt: {total_outcome}", ha="center", fontsize=12)
-        return fig
+    money_grouping = config.get("money_grouping", "account")
+    outcome_grouping = config.get("outcome_grouping", "outcome")
+
+    def set_money_grouping(group):
+        nonlocal money_grouping
+        money_grouping = config["money_grouping"] = group
+        save_config(config)
+        update_charts()
+
+    def set_outcome_grouping(group):
+        nonlocal outcome_grouping
+        outcome_grouping = config["outcome_grouping"] = group
+        save_config(config)
+        update_charts()
+
+    grouping_frame = ctk.CTkFrame(chart_frame)
+    grouping_frame.pack(side="top", fill="x")
+    group_by_label = ctk.CTkLabel(grouping_frame, text=lang_dict[current_lang]["group_by"])
+    group_by_label.pack(side="left", padx=10)
+    money_grouping_menu = ctk.CTkOptionMenu(grouping_frame, values=list(MONEY_GROUPS), command=set_money_grouping)
+    money_grouping_menu.set(money_grouping)
+    money_grouping_menu.pack(side="left", padx=10, pady=5)
+    outcome_grouping_menu = ctk.CTkOptionMenu(grouping_frame, values=list(OUTCOME_GROUPS), command=set_outcome_grouping)
+    outcome_grouping_menu.set(outcome_grouping)
+    outcome_grouping_menu.pack(side="left", padx=10, pady=5)
+
+    chart_manager = None
+    series_bitmaps = None
 
     def show_money_distribution_list_ui():
-        accounts = get_accounts()
-        accounts_str = "\n".join([f"ID: {a[0]}, Type: {a[1]}, Currency: {a[2]}, Exchange Rate: {a[3]}" for a in accounts])
-        assets = get_assets()
-        assets_str = "\n".join([f"ID: {asset[0]}, Name: {asset[1]}, Quantity: {asset[2]}, Price per Unit: {asset[3]}" for asset in assets])
-        distribution = f"Accounts:\n{accounts_str}\n\nAssets:\n{assets_str}"
-        messagebox.showinfo(lang_dict[current_lang]["info"], distribution)
+        executor.submit(load_valuation, on_done=draw_money_distribution_list, on_error=show_error)
+
+    def draw_money_distribution_list(valuation):
+        # Totals come from the valuation; the per-account values are paged from SQL in the reporting currency
+        currency = valuation.reporting_currency
+        exposure_str = ", ".join([f"{c}: {v:,.2f}" for c, v in valuation.exposure_by_currency().items()])
+        header = (f"Exposure ({currency}): {exposure_str}\n"
+                  f"Assets: {valuation.assets_total:,.2f} {currency}, Monthly Income: {valuation.monthly_income_total:,.2f} {currency}, "
+                  f"Net Worth: {valuation.net_worth:,.2f} {currency}")
+        open_table_view("distribution", "show_money_distribution_list", header=header, params={"scale": 1.0 / valuation.rate})
+
+    def load_money_series(start=None, end=None, max_points=None):
+        # Balance history is kept by database triggers, so pending cache writes go first.
+        # Returns (dates, balances, key), the key naming exactly this window of data for the chart cache;
+        # its last item is the reporting currency the balances are converted into.
+        from portfolio.timeseries import money_series, DEFAULT_MAX_POINTS
+        version = portfolio_cache.version
+        portfolio_cache.flush()
+        max_points = max_points or DEFAULT_MAX_POINTS
+        currency = config.get("reporting_currency", "TRY")
+        return money_series(start, end, max_points, reporting_currency=currency) + ((version, start, end, max_points, currency),)
+
+    def load_projection():
+        # Runs the simulation in worker processes; see portfolio/projection.py for the model
+        from portfolio.projection import project, DEFAULT_MONTHS, DEFAULT_PATHS
+        positions = portfolio_cache.positions()
+        if not len(positions.accounts) and not len(positions.assets):
+            return None
+        return project(positions, config.get("projection_months", DEFAULT_MONTHS), config.get("projection_paths", DEFAULT_PATHS),
+                       config.get("projection_workers"), reporting_currency=config.get("reporting_currency", "TRY"))
+
+    def show_projection_ui():
+        executor.submit(load_projection, on_done=draw_projection, on_error=show_error)
+
+    def draw_projection(projection):
+        if projection is None:
+            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["no_projection_data"], parent=root)
+            return
+        from charts import FanChart
+        window = ctk.CTkToplevel(root)
+        window.title(lang_dict[current_lang]["projection"])
+        chart = FanChart(window, xlabel="Date", ylabel=f"Net Worth ({projection.reporting_currency})")
+        chart.set_data(projection.dates, projection.quantiles, projection.bands,
+                       title=f"{lang_dict[current_lang]['projection']}: {projection.paths:,} paths, "
+                             f"{projection.paths_per_second:,.0f} paths/s on {projection.workers} process(es)")
+
+    def refresh_rates():
+        # Records today's rates and re-prices every account in SQL, so the cache is flushed before and re-read after
+        from portfolio.rate_history import refresh
+        portfolio_cache.invalidate()
+        try:
+            return refresh()
+        finally:
+            portfolio_cache.invalidate()
+
+    def refresh_rates_ui():
+        def done(result):
+            rates, updated = result
+            refresh_rates_button.configure(state="normal")
+            rates_str = ", ".join(f"{currency}: {rate:,.4f}" for currency, rate in sorted(rates.items()))
+            messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["rates_refreshed"].format(
+                accounts=sum(updated.values()), rates=rates_str), parent=root)
+            update_charts()
+
+        def failed(error):
+            refresh_rates_button.configure(state="normal")
+            show_error(error)
+
+        refresh_rates_button.configure(state="disabled")
+        executor.submit(refresh_rates, on_done=done, on_error=failed, serial=True)
+
+    def diagnostics_summary():
+        from portfolio.rates import get_rate_cache
+        summary = {"exchange rate cache": get_rate_cache().stats(), "portfolio cache": portfolio_cache.stats()}
+        if chart_manager:
+            summary["chart cache"] = chart_manager.stats()
+        if stall_probe:
+            summary["event loop"] = stall_probe.stats()
+        return summary
+
+    def show_diagnostics_ui():
+        labels = {key: lang_dict[current_lang][key] for key in ("record_metrics", "start_profiling", "stop_profiling", "reset", "export")}
+        open_diagnostics(root, lang_dict[current_lang]["diagnostics"], extra=diagnostics_summary, labels=labels)
 
     def show_money_over_time_chart():
+        executor.submit(load_money_series, on_done=draw_money_over_time_chart, on_error=show_error)
+
+    def draw_money_over_time_chart(data):
+        nonlocal series_bitmaps
         try:
-            data = get_money_over_time()
-            if not data:
+            dates, balances, data_key = data
+            if not len(dates):
                 messagebox.showinfo(lang_dict[current_lang]["info"], lang_dict[current_lang]["no_data"])
                 return
 
-            dates, balances = zip(*data)
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.plot(dates, balances, marker='o')
-            ax.set_title("Overall Money Over Time")
-            ax.set_xlabel("Date")
-            ax.set_ylabel("Total Money")
-            ax.grid(True)
-
+            from charts import TimeSeriesChart, BitmapCache
+            # Shared by every Money Over Time window, so reopening one on unchanged data is a copy of its pixels
+            series_bitmaps = series_bitmaps or BitmapCache(8)
+            texts = lang_dict[current_lang]
             chart_window = ctk.CTkToplevel(root)
-            chart_window.title("Overall Money Over Time")
-            chart_canvas = FigureCanvasTkAgg(fig, master=chart_window)
-            chart_canvas.draw()
-            chart_canvas.get_tk_widget().pack(fill="both", expand=True)
-        except Exception as e:
-            messagebox.showerror(lang_dict[current_lang]["error"], str(e))
+            chart_window.title(texts["money_over_time"])
 
-    #MARK: - UI Elements
-    money_chart = show_total_money_pie_chart()
-    outcome_chart = show_total_outcome_pie_chart()
+            def draw_window(window):
+                if chart_window.winfo_exists():
+                    window_dates, window_balances, window_key = window
+                    chart.set_data(window_dates, window_balances, key=window_key + (texts["money_over_time"],))
 
-    money_canvas = FigureCanvasTkAgg(money_chart, master=chart_frame)
-    money_canvas.draw()
-    money_canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+            def load_window(start, end):
+                # Pan/zoom re-reads only the visible dates, downsampled to the canvas width
+                executor.coalesce(f"money_over_time_{id(chart_window)}", load_money_series, start, end, chart.width_pixels,
+                                  on_done=draw_window, on_error=show_error)
 
-    outcome_canvas = FigureCanvasTkAgg(outcome_chart, master=chart_frame)
-    outcome_canvas.draw()
-    outcome_canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+            chart = TimeSeriesChart(chart_window, on_view_change=load_window, title=texts["money_over_time"],
+                                    xlabel=texts["date"], ylabel=f"{texts['total_money']} ({data_key[-1]})", bitmaps=series_bitmaps)
+            chart.set_data(dates, balances, fit=True, key=data_key + (texts["money_over_time"],))
+        except Exception as e:
+            messagebox.showerror(lang_dict[current_lang]["error"], str(e))
 
+    #MARK: - UI Elements
     add_account_button = ctk.CTkButton(root, text=lang_dict[current_lang]["add_account"], command=add_account_ui, width=button_width)
     add_account_button.pack(pady=10)
     view_accounts_button = ctk.CTkButton(root, text=lang_dict[current_lang]["view_accounts"], command=view_accounts_ui, width=button_width)
@@ -604,6 +504,8 @@ def main():
     add_credit_card_outcome_button.pack(pady=10)
     view_credit_card_outcomes_button = ctk.CTkButton(root, text=lang_dict[current_lang]["view_credit_card_outcomes"], command=view_credit_card_outcomes_ui, width=button_width)
     view_credit_card_outcomes_button.pack(pady=10)
+    search_outcomes_button = ctk.CTkButton(root, text=lang_dict[current_lang]["search_outcomes"], command=search_outcomes_ui, width=button_width)
+    search_outcomes_button.pack(pady=10)
     update_credit_card_outcome_button = ctk.CTkButton(root, text=lang_dict[current_lang]["update_credit_card_outcome"], command=update_credit_card_outcome_ui, width=button_width)
     update_credit_card_outcome_button.pack(pady=10)
     delete_credit_card_outcome_button = ctk.CTkButton(root, text=lang_dict[current_lang]["delete_credit_card_outcome"], command=delete_credit_card_outcome_ui, width=button_width)
@@ -618,10 +520,21 @@ def main():
     delete_asset_button.pack(pady=10)
     show_distribution_button = ctk.CTkButton(root, text=lang_dict[current_lang]["show_money_distribution_list"], command=show_money_distribution_list_ui, width=button_width)
     show_distribution_button.pack(pady=10)
+    import_button = ctk.CTkButton(root, text=lang_dict[current_lang]["import_data"], command=import_ui, width=button_width)
+    import_button.pack(pady=10)
 
     show_money_over_time_button = ctk.CTkButton(root, text="Show Money Over Time", command=show_money_over_time_chart, width=button_width)
     show_money_over_time_button.pack(pady=10)
 
+    projection_button = ctk.CTkButton(root, text=lang_dict[current_lang]["projection"], command=show_projection_ui, width=button_width)
+    projection_button.pack(pady=10)
+
+    refresh_rates_button = ctk.CTkButton(root, text=lang_dict[current_lang]["refresh_rates"], command=refresh_rates_ui, width=button_width)
+    refresh_rates_button.pack(pady=10)
+
+    diagnostics_button = ctk.CTkButton(root, text=lang_dict[current_lang]["diagnostics"], command=show_diagnostics_ui, width=button_width)
+    diagnostics_button.pack(pady=10)
+
     language_button = ctk.CTkButton(root, text="Switch Language", command=switch_language, width=button_width)
     language_button.pack(pady=10)
 
@@ -629,8 +542,32 @@ def main():
     exit_button.pack(pady=32)
 
     update_ui_text()
+    stall_probe = StallProbe(root).start() if config.get("stall_probe") else None
     update_charts()
+    watch_saving()
     root.mainloop()
+    if stall_probe:
+        print(f"Event loop responsiveness: {stall_probe.stats()}")
+    if chart_manager:
+        chart_manager.close()
+    executor.shutdown()
+    # Edits were reported as saved when they reached the cache, so they are only given up if the user says so
+    while True:
+        try:
+            portfolio_cache.close()
+            break
+        except Exception as e:
+            if not messagebox.askretrycancel(lang_dict[current_lang]["error"],
+                                             lang_dict[current_lang]["unsaved_changes"].format(error=e), parent=root):
+                break
+    # Archiving and VACUUM/ANALYZE when due (archive_keep_years and the intervals in config.json), after the
+    # window has closed and nothing holds the outcomes any more
+    try:
+        from portfolio import archive
+        archive.run_scheduled(config, log=print)
+    except Exception as e:
+        print(f"Scheduled maintenance failed: {e}")
+    database.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+# Archiving closed years of outcomes into per-year attached databases (portfolio/archive.py).
+# The generated outcomes are dated evenly over --years years ending today, then the everyday paths are
+# timed on the full main database, again after every year but this one is archived (with VACUUM and
+# ANALYZE), and the history reads that attach the archives are timed last.
+# Run from the repository root: python -m benchmarks.bench_archive --outcomes 1000000
+import argparse
+import os
+import tempfile
+import time
+
+from portfolio import archive, cache, chart_data, database, exporter, pages, search, summary
+from portfolio.valuation import load_positions
+from benchmarks import generator
+
+def spread_dates(years):
+    # Each outcome moves to a day within the last years, in id order, so a year is a range of ids
+    with database.connection() as conn:
+        last = conn.execute("SELECT MAX(id) FROM credit_card_outcomes").fetchone()[0] or 1
+        conn.execute('''
+            UPDATE credit_card_outcomes SET date = date('now', '-' || CAST((? - id) * ? / ? AS INTEGER) || ' days')
+        ''', (last, years * 365, last))
+        conn.commit()
+
+def timed(fn, repetitions=5):
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fn()
+    return result, (time.perf_counter() - start) / repetitions * 1000
+
+def load_cache():
+    portfolio_cache = cache.PortfolioCache()
+    portfolio_cache.positions()
+    portfolio_cache.close()
+
+HOT_PATHS = (
+    ("PortfolioCache load", load_cache, 1),
+    ("load_positions", load_positions, 5),
+    ("outcome_breakdown", lambda: chart_data.outcome_breakdown("outcome"), 5),
+    ("fetch_page outcomes", lambda: pages.fetch_page("outcomes", limit=100), 20),
+    ("search 'travel'", lambda: search.search_outcomes("travel"), 20),
+    ("get_category_totals", search.get_category_totals, 20),
+    ("summary totals", lambda: summary.get_totals("account_type"), 20),
+)
+
+def file_mb(*paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path)) / 2**20
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark archiving closed years of outcomes")
+    parser.add_argument("--outcomes", type=int, default=1_000_000)
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--years", type=int, default=5, help="Years the outcomes are dated over, this one included")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "archive.db")
+        generator.generate(path, generator.Sizes(accounts=args.accounts, outcomes=args.outcomes, assets=1_000), args.seed)
+        database.configure(path)
+        spread_dates(args.years)
+        before = {name: timed(fn, repetitions)[1] for name, fn, repetitions in HOT_PATHS}
+        main_before = file_mb(path, path + "-wal")
+
+        start = time.perf_counter()
+        runs = archive.archive_outcomes(time.localtime().tm_year, log=print)
+        moved = time.perf_counter() - start
+        maintenance = archive.maintain(force=True)
+        print(f"Archived {sum(run.outcomes for run in runs):,} outcomes in {moved:.2f} s; "
+              + ", ".join(f"{task.upper()} {seconds:.2f} s" for task, seconds in maintenance))
+        after = {name: timed(fn, repetitions)[1] for name, fn, repetitions in HOT_PATHS}
+
+        print(f"\n{'hot path':<24}{'before ms':>11}{'after ms':>11}{'speedup':>9}")
+        for name, _, _ in HOT_PATHS:
+            print(f"{name:<24}{before[name]:>11.2f}{after[name]:>11.2f}{before[name] / after[name]:>8.1f}x")
+
+        print(f"\nmain database: {main_before:,.1f} MB before, {file_mb(path, path + '-wal'):,.1f} MB after")
+        for year, outcomes, amount, archive_file in archive.archives():
+            print(f"  {year}: {outcomes:,} outcomes, {file_mb(archive_file):,.1f} MB")
+
+        print(f"\n{'history read':<24}{'ms':>11}")
+        export_path = os.path.join(workdir, "outcomes.csv")
+        for name, fn, repetitions in (
+            ("export outcomes", lambda: exporter.export_file(export_path, "outcomes", history=True), 1),
+            ("get_category_totals", lambda: search.get_category_totals(True), 20),
+            ("search 'travel'", lambda: search.search_outcomes("travel", history=True), 5),
+        ):
+            _, ms = timed(fn, repetitions)
+            print(f"{name:<24}{ms:>11.2f}")
+        database.close()
+
+if __name__ == "__main__":
+    main()
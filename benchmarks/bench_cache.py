@@ -0,0 +1,86 @@
+# Memory and latency of the columnar portfolio cache against the SQL-backed store.
+# Memory is what stays allocated (tracemalloc) holding the outcomes table: the list of tuples
+# store.get_credit_card_outcomes returns vs. the cache's columns.
+# Run from the repository root: python -m benchmarks.bench_cache --outcomes 1000000
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from portfolio import database, store, chart_data
+from portfolio.cache import PortfolioCache
+from portfolio.models import BankAccount
+from portfolio.valuation import load_positions
+from benchmarks import generator
+
+def retained(fn):
+    # (result, MB still allocated while the result is held)
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    return result, current
+
+def timed(fn, repetitions=5):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fn()
+    return (time.perf_counter() - start) / repetitions * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the columnar portfolio cache")
+    generator.add_size_arguments(parser)
+    parser.set_defaults(accounts=10_000, outcomes=1_000_000, assets=1_000)
+    parser.add_argument("--writes", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "cache.db")
+        sizes = generator.sizes_from(args)
+        generator.generate(path, sizes, args.seed)
+        database.configure(path)
+
+        rows, tuples_mb = retained(store.get_credit_card_outcomes)
+        count = len(rows)
+        del rows
+        cache = PortfolioCache()
+        start = time.perf_counter()
+        _, cache_mb = retained(cache.calculate_total_money)  # First use loads every table
+        load_s = time.perf_counter() - start
+        outcomes_mb = (cache.outcomes.memory_bytes() + 16 * len(cache.dist_accounts)) / 2**20
+
+        print(f"{sizes.accounts:,} accounts, {count:,} outcomes, {sizes.assets:,} assets")
+        print(f"{'memory':<44}{'MB':>10}{'bytes/outcome':>15}")
+        print(f"{'outcomes as list of tuples (store)':<44}{tuples_mb:>10.1f}{tuples_mb * 2**20 / count:>15.0f}")
+        print(f"{'outcome columns + distributions (cache)':<44}{outcomes_mb:>10.1f}{outcomes_mb * 2**20 / count:>15.0f}")
+        print(f"{'whole cache, all tables (tracemalloc)':<44}{cache_mb:>10.1f}")
+        print(f"cache load: {load_s:.2f} s")
+
+        account = BankAccount("Checking", "USD", 32.45, 100.0, 1.0)
+        operations = (
+            ("calculate_total_money", store.calculate_total_money, cache.calculate_total_money, 100),
+            ("get_accounts", store.get_accounts, cache.get_accounts, 5),
+            ("valuation positions", load_positions, cache.positions, 3),
+            ("money_breakdown (currency)", lambda: chart_data.money_breakdown('currency'), lambda: cache.money_breakdown('currency'), 5),
+            ("outcome_breakdown (description)", lambda: chart_data.outcome_breakdown('description'),
+             lambda: cache.outcome_breakdown('description'), 3),
+            ("add_account", lambda: store.add_account(account), lambda: cache.add_account(account), args.writes))
+        # Store writes make the cache read the tables again after its next flush, so time the store first and reload after
+        store_ms = [timed(sql_fn, repetitions) for _, sql_fn, _, repetitions in operations]
+        cache.invalidate()
+        cache.calculate_total_money()
+        print(f"\n{'operation':<34}{'store ms':>12}{'cache ms':>12}")
+        for (name, _, cache_fn, repetitions), sql_ms in zip(operations, store_ms):
+            print(f"{name:<34}{sql_ms:>12.3f}{timed(cache_fn, repetitions):>12.3f}")
+
+        start = time.perf_counter()
+        written = cache.flush()
+        print(f"\nflush of {written:,} pending writes: {(time.perf_counter() - start) * 1000:.1f} ms in one transaction")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Rendered-chart cache for the dashboard pies, off-screen with the Agg backend (no Tk or display needed).
+# Each scenario is run by a PieChart without a cache, which renders every draw as before, and by one
+# sharing a charts.BitmapCache, which copies pixels back for data, language and size it has drawn before:
+#   repeat: the same view drawn again (a redraw with no data change)
+#   language: switching between two languages, each with its own titles and labels
+#   resize: a window resized back and forth between two sizes
+# Run from the repository root: python -m benchmarks.bench_chart_cache --draws 200
+import argparse
+import time
+
+from charts import PieChart, BitmapCache
+
+LANGUAGES = {"en": ("Total Money Distribution", "Total Money", "Other"),
+             "tr": ("Toplam Para Dağılımı", "Toplam Para", "Diğer")}
+SIZES = ((6, 6), (4.5, 4.5))
+
+def pie(language, slices=11):
+    title, footer, other = LANGUAGES[language]
+    sizes = [100 - 7 * k for k in range(slices - 1)] + [250]
+    labels = [f"ID: {k}, Type: Checking" for k in range(slices - 1)] + [f"{other} (188)"]
+    return sizes, labels, title, f"{footer}: {sum(sizes):,.2f} TRY"
+
+def repeat(chart, cached, i):
+    if i == 0:
+        chart.set_data(*pie("en"), key=(1, "en"))
+    chart.draw()
+
+def language(chart, cached, i):
+    lang = "en" if i % 2 == 0 else "tr"
+    key = (1, lang)
+    # As update_charts does through ChartManager.show: a language drawn before is switched back to
+    if cached and chart.remembers(key):
+        chart.show(key)
+    else:
+        chart.set_data(*pie(lang), key=key)
+    chart.draw()
+
+def resize(chart, cached, i):
+    if i == 0:
+        chart.set_data(*pie("en"), key=(1, "en"))
+    chart.figure.set_size_inches(*SIZES[i % 2])
+    chart.draw()
+
+def timed(scenario, cached, draws):
+    cache = BitmapCache() if cached else None
+    chart = PieChart(bitmaps=cache, name="money")
+    start = time.perf_counter()
+    for i in range(draws):
+        scenario(chart, cached, i)
+    return (time.perf_counter() - start) / draws * 1000, cache.stats() if cache else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rendered chart cache")
+    parser.add_argument("--draws", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<10}{'render ms':>11}{'cached ms':>11}{'speedup':>9}   cache")
+    for name, scenario in (("repeat", repeat), ("language", language), ("resize", resize)):
+        rendered, _ = timed(scenario, False, args.draws)
+        cached, stats = timed(scenario, True, args.draws)
+        print(f"{name:<10}{rendered:>11.2f}{cached:>11.2f}{rendered / cached:>8.1f}x   "
+              f"{stats['hits']} hits, {stats['misses']} misses, {stats['memory_mb']} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Before/after benchmark of the CRUD functions in portfolio/store.py.
+# "legacy" reproduces the original connect-per-call implementation, "pooled" calls portfolio/store.py through the connection pool.
+# Run from the repository root: python -m benchmarks.bench_crud --rows 10000 1000000
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from portfolio import database
+from portfolio import store
+from portfolio.models import BankAccount, CreditCardOutcome, Asset
+
+#MARK: - Legacy (connect per call) implementation
+def legacy_add_account(path, account):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    cursor.execute('''
+        INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, current_date))
+    conn.commit()
+    conn.close()
+
+def legacy_get_accounts(path):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM accounts')
+    accounts = cursor.fetchall()
+    conn.close()
+    return accounts
+
+def legacy_update_account(path, account_id, account):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE accounts
+        SET account_type = ?, currency = ?, exchange_rate = ?, balance = ?, income_percentage = ?
+        WHERE id = ?
+    ''', (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, account_id))
+    conn.commit()
+    conn.close()
+
+def legacy_delete_account(path, account_id):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+    conn.commit()
+    conn.close()
+
+def legacy_add_credit_card_outcome(path, outcome):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO credit_card_outcomes (account_id, amount, description, account_distributions)
+        VALUES (?, ?, ?, ?)
+    ''', (outcome.account_id, outcome.amount, outcome.description, json.dumps(outcome.account_distributions)))
+    conn.commit()
+    conn.close()
+
+def legacy_get_credit_card_outcomes(path):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM credit_card_outcomes')
+    outcomes = cursor.fetchall()
+    conn.close()
+    return outcomes
+
+def legacy_delete_credit_card_outcome(path, outcome_id):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT account_distributions FROM credit_card_outcomes WHERE id = ?', (outcome_id,))
+    outcome = cursor.fetchone()
+    if outcome:
+        account_distributions = json.loads(outcome[0])
+        for account_id, amount in account_distributions.items():
+            cursor.execute('UPDATE accounts SET balance = balance + ? WHERE id = ?', (amount, account_id))
+    cursor.execute('DELETE FROM credit_card_outcomes WHERE id = ?', (outcome_id,))
+    conn.commit()
+    conn.close()
+
+def legacy_add_asset(path, asset):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO assets (name, quantity, price_per_unit)
+        VALUES (?, ?, ?)
+    ''', (asset.name, asset.quantity, asset.price_per_unit))
+    conn.commit()
+    conn.close()
+
+def legacy_get_money_over_time(path):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT date, SUM(balance) FROM accounts GROUP BY date')
+    data = cursor.fetchall()
+    conn.close()
+    return data
+
+#MARK: - Scenarios
+def scenarios(ops, scans):
+    account = BankAccount("Checking", "USD", 32.5, 1000.0, 3.0)
+    outcome = CreditCardOutcome(1, 250.0, "Groceries", {1: 150.0, 2: 100.0})
+    asset = Asset("Gold", 2.0, 2500.0)
+    # (name, repetitions, legacy callable, pooled callable); the loop index is passed to both
+    return [
+        ("add_account", ops, lambda p, i: legacy_add_account(p, account), lambda i: store.add_account(account)),
+        ("update_account", ops, lambda p, i: legacy_update_account(p, i + 1, account), lambda i: store.update_account(i + 1, account)),
+        ("delete_account", ops, lambda p, i: legacy_delete_account(p, i + 1), lambda i: store.delete_account(i + 1)),
+        ("add_credit_card_outcome", ops, lambda p, i: legacy_add_credit_card_outcome(p, outcome), lambda i: store.add_credit_card_outcome(outcome)),
+        ("delete_credit_card_outcome", ops, lambda p, i: legacy_delete_credit_card_outcome(p, i + 1), lambda i: store.delete_credit_card_outcome(i + 1)),
+        ("add_asset", ops, lambda p, i: legacy_add_asset(p, asset), lambda i: store.add_asset(asset)),
+        ("get_accounts", scans, lambda p, i: legacy_get_accounts(p), lambda i: store.get_accounts()),
+        ("get_credit_card_outcomes", scans, lambda p, i: legacy_get_credit_card_outcomes(p), lambda i: store.get_credit_card_outcomes()),
+        ("get_money_over_time", scans, lambda p, i: legacy_get_money_over_time(p), lambda i: store.get_money_over_time()),
+    ]
+
+def seed(path, rows):
+    database.configure(path, 1)
+    store.create_database()
+    database.close()
+    conn = sqlite3.connect(path)
+    distributions = json.dumps({"1": 150.0, "2": 100.0})
+    with conn:
+        conn.executemany(
+            "INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date) VALUES (?, ?, ?, ?, ?, ?)",
+            (("Checking", ("USD", "EUR", "TRY")[i % 3], 1.0, float(i % 5000), 2.5, f"2024-{i % 12 + 1:02d}-01") for i in range(rows)))
+        conn.executemany(
+            "INSERT INTO credit_card_outcomes (account_id, amount, description, account_distributions) VALUES (?, ?, ?, ?)",
+            ((i % 100 + 1, float(i % 700), f"Outcome {i}", distributions) for i in range(rows)))
+        conn.executemany(
+            "INSERT INTO assets (name, quantity, price_per_unit) VALUES (?, ?, ?)",
+            ((f"Asset {i}", 1.0, float(i % 900)) for i in range(rows)))
+    # Start both copies from SQLite's default rollback journal, as the original code did
+    conn.execute("PRAGMA journal_mode=DELETE")
+    # The rows above use the original JSON distributions; marking the file as version 1 lets the pooled copy migrate them
+    conn.execute("PRAGMA user_version=1")
+    conn.close()
+
+def timed(fn, repetitions):
+    start = time.perf_counter()
+    for i in range(repetitions):
+        fn(i)
+    return (time.perf_counter() - start) / repetitions * 1000
+
+def run(rows, ops, scans, workdir):
+    seeded = os.path.join(workdir, f"seed_{rows}.db")
+    seed(seeded, rows)
+    legacy_path = os.path.join(workdir, f"legacy_{rows}.db")
+    pooled_path = os.path.join(workdir, f"pooled_{rows}.db")
+    shutil.copyfile(seeded, legacy_path)
+    shutil.copyfile(seeded, pooled_path)
+    os.remove(seeded)
+
+    results = []
+    database.configure(pooled_path)
+    store.create_database()  # Apply schema upgrades (e.g. distribution migration) to the pooled copy
+    for name, repetitions, legacy_fn, pooled_fn in scenarios(ops, scans):
+        legacy_ms = timed(lambda i: legacy_fn(legacy_path, i), repetitions)
+        pooled_ms = timed(pooled_fn, repetitions)
+        results.append({"rows": rows, "operation": name, "legacy_ms": legacy_ms, "pooled_ms": pooled_ms,
+                        "speedup": legacy_ms / pooled_ms if pooled_ms else float("inf")})
+    database.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CRUD functions before/after connection pooling")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000], help="Table sizes to seed")
+    parser.add_argument("--ops", type=int, default=500, help="Repetitions of each single-row operation")
+    parser.add_argument("--scans", type=int, default=3, help="Repetitions of each full-table read")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            results.extend(run(rows, args.ops, args.scans, workdir))
+
+    print(f"{'rows':>9}  {'operation':<28}{'legacy ms/op':>14}{'pooled ms/op':>14}{'speedup':>9}")
+    for r in results:
+        print(f"{r['rows']:>9}  {r['operation']:<28}{r['legacy_ms']:>14.3f}{r['pooled_ms']:>14.3f}{r['speedup']:>8.1f}x")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
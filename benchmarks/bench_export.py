@@ -0,0 +1,98 @@
+# Streaming export of the outcomes table to CSV and JSON Lines, and of every table to a columnar snapshot.
+# For each size, reports rows/s and peak Python memory (tracemalloc). The original export fetched
+# every row into a list before writing; it is timed next to the streaming exports. Then the snapshot is
+# mapped back in and a few analytics reads are timed against the same questions asked in SQL.
+# Run from the repository root: python -m benchmarks.bench_export --outcomes 100000 1000000
+import argparse
+import csv
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from portfolio import database, exporter, snapshot
+from benchmarks import generator
+
+def measured(fn):
+    # (result, seconds, peak MB allocated while it ran). Timed on its own, since tracing every allocation
+    # slows the row-at-a-time writers far more than the columnar one, then run again under tracemalloc.
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def fetchall_export(path):
+    # The whole table in memory first, as before the exporter streamed
+    query, header = exporter.EXPORT_SQL["outcomes"]
+    with database.connection() as conn:
+        rows = conn.execute(query).fetchall()
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return len(rows)
+
+def timed(fn, repetitions=5):
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fn()
+    return result, (time.perf_counter() - start) / repetitions * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming exports and columnar snapshots")
+    parser.add_argument("--outcomes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'outcomes':>10}  {'export':<28}{'s':>8}{'rows/s':>12}{'peak MB':>10}{'file MB':>10}")
+        for outcomes in args.outcomes:
+            path = os.path.join(workdir, f"export_{outcomes}.db")
+            generator.generate(path, generator.Sizes(accounts=args.accounts, outcomes=outcomes, assets=1_000), args.seed)
+            database.configure(path)
+            csv_path, jsonl_path = os.path.join(workdir, "outcomes.csv"), os.path.join(workdir, "outcomes.jsonl")
+            snapshot_path = os.path.join(workdir, "portfolio.snapshot")
+            for name, fn, output in (
+                ("CSV, fetch all (before)", lambda: fetchall_export(csv_path), csv_path),
+                ("CSV, streamed", lambda: exporter.export_file(csv_path, "outcomes"), csv_path),
+                ("JSON Lines, streamed", lambda: exporter.export_file(jsonl_path, "outcomes"), jsonl_path),
+                ("snapshot, every table", lambda: sum(table["rows"] for table in snapshot.write_snapshot(snapshot_path)["tables"].values()), snapshot_path),
+            ):
+                rows, seconds, peak = measured(fn)
+                size = (sum(entry.stat().st_size for entry in os.scandir(output)) if os.path.isdir(output)
+                        else os.path.getsize(output)) / 2**20
+                print(f"{outcomes:>10,}  {name:<28}{seconds:>8.2f}{rows / seconds:>12,.0f}{peak:>10.1f}{size:>10.1f}")
+
+            loaded, open_ms = timed(lambda: snapshot.load_snapshot(snapshot_path))
+            print(f"\n{'read (' + format(outcomes, ',') + ' outcomes)':<48}{'ms':>10}")
+            print(f"{'load_snapshot (manifest only)':<48}{open_ms:>10.2f}")
+            outcomes_table, accounts = loaded["outcomes"], loaded["accounts"]
+
+            def sql(query):
+                with database.connection() as conn:
+                    return conn.execute(query).fetchall()
+            for name, fn in (
+                ("SUM(amount) in SQL", lambda: sql("SELECT SUM(amount) FROM credit_card_outcomes")),
+                ("sum of the mapped amount column", lambda: float(snapshot.load_snapshot(snapshot_path)["outcomes"]["amount"].sum())),
+                ("SUM(balance * exchange_rate) in SQL", lambda: sql("SELECT SUM(balance * exchange_rate) FROM accounts")),
+                ("balance * exchange_rate, mapped", lambda: float((accounts["balance"] * accounts["exchange_rate"]).sum())),
+                ("COUNT(*) WHERE description = 'Travel' in SQL",
+                 lambda: sql("SELECT COUNT(*) FROM credit_card_outcomes WHERE description = 'Travel'")),
+                ("description equals 'Travel', mapped", lambda: int(outcomes_table["description"].equals("Travel").sum())),
+            ):
+                _, ms = timed(fn)
+                print(f"{name:<48}{ms:>10.2f}")
+            print()
+            database.close()
+
+if __name__ == "__main__":
+    main()
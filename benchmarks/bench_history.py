@@ -0,0 +1,99 @@
+# Money-over-time queries on years of balance history: the trigger-maintained daily/monthly rollups
+# vs. aggregating balance_snapshots on every call, plus the cost of the history triggers on balance updates.
+# Run from the repository root: python -m benchmarks.bench_history --accounts 2000 --days 1825
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from portfolio import database, history, store
+
+def snapshot_rows(accounts, days, changes_per_day, seed=7):
+    rng = random.Random(seed)
+    balances = [0.0] * accounts
+    first = date.today() - timedelta(days=days)
+    for offset in range(days):
+        day = (first + timedelta(days=offset)).isoformat()
+        for account in rng.sample(range(accounts), min(accounts, changes_per_day)):
+            change = round(rng.uniform(-200, 250), 2)
+            balances[account] += change
+            yield day, account + 1, balances[account], change
+
+def scan_snapshots(start):
+    # Same answer as history.money_over_time, computed from the raw snapshots
+    with database.connection() as conn:
+        opening = conn.execute('SELECT COALESCE(SUM(change), 0) FROM balance_snapshots WHERE date < ?', (start,)).fetchone()[0]
+        return conn.execute('''
+            SELECT date, ? + SUM(SUM(change)) OVER (ORDER BY date) FROM balance_snapshots
+            WHERE date >= ? GROUP BY date ORDER BY date
+        ''', (opening, start)).fetchall()
+
+def timed(fn, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        result = fn()
+    return (time.perf_counter() - start) / repetitions * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark balance history queries")
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=1825, help="Days of history (default: five years)")
+    parser.add_argument("--changes-per-day", type=int, default=300)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "history.db")
+        database.configure(path)
+        store.create_database()
+        conn = sqlite3.connect(path)
+        first = (date.today() - timedelta(days=args.days)).isoformat()
+        with conn:
+            conn.executemany(
+                "INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date) VALUES (?, ?, ?, ?, ?, ?)",
+                (("Checking", "USD", 1.0, 0.0, None, first) for _ in range(args.accounts)))
+        start = time.perf_counter()
+        with conn:
+            conn.executemany("INSERT INTO balance_snapshots (date, account_id, currency, balance, change) VALUES (?, ?, 'USD', ?, ?)",
+                             snapshot_rows(args.accounts, args.days, args.changes_per_day))
+        snapshots = conn.execute("SELECT COUNT(*) FROM balance_snapshots").fetchone()[0]
+        seed_rate = snapshots / (time.perf_counter() - start)
+
+        updates = min(args.accounts, 5000)
+        start = time.perf_counter()
+        with conn:
+            conn.executemany("UPDATE accounts SET balance = balance + 1 WHERE id = ?", ((i + 1,) for i in range(updates)))
+        with_history = updates / (time.perf_counter() - start)
+        for trigger in ("accounts_history_update", "balance_snapshots_rollup"):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        start = time.perf_counter()
+        with conn:
+            conn.executemany("UPDATE accounts SET balance = balance + 1 WHERE id = ?", ((i + 1,) for i in range(updates)))
+        without_history = updates / (time.perf_counter() - start)
+        conn.execute("UPDATE accounts SET balance = balance - 1")  # Undo the untracked updates
+        conn.commit()
+        conn.close()
+
+        year_ago = (date.today() - timedelta(days=365)).isoformat()
+        rows = [
+            ("full history, daily", lambda: history.money_over_time(), lambda: scan_snapshots('')),
+            ("last year, daily", lambda: history.money_over_time(year_ago), lambda: scan_snapshots(year_ago)),
+        ]
+        print(f"{args.accounts} accounts, {args.days} days, {snapshots:,} snapshots (seeded at {seed_rate:,.0f} rows/s)")
+        print(f"{'query':<22}{'snapshots ms':>14}{'rollups ms':>12}{'speedup':>10}{'points':>8}")
+        for name, rollup, scan in rows:
+            scan_ms, expected = timed(scan, args.repetitions)
+            rollup_ms, result = timed(rollup, args.repetitions)
+            assert len(result) == len(expected) and all(abs(a[1] - b[1]) < 1e-6 * max(1, abs(b[1])) for a, b in zip(result, expected))
+            print(f"{name:<22}{scan_ms:>14.2f}{rollup_ms:>12.2f}{scan_ms / rollup_ms:>9.0f}x{len(result):>8}")
+        monthly_ms, months = timed(lambda: history.money_over_time(granularity='month'), args.repetitions)
+        account_ms, _ = timed(lambda: history.account_history(1), args.repetitions)
+        print(f"Monthly series: {monthly_ms:.2f} ms for {len(months)} months; one account's history: {account_ms:.2f} ms")
+        print(f"Balance updates: {with_history:,.0f}/s with history triggers, {without_history:,.0f}/s without")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Startup import cost of the CLI and GUI paths, measured with python -X importtime in fresh interpreters.
+# "original" imports what Bank.py and config.py pulled in at module level before the portfolio package split.
+# Run from the repository root: python -m benchmarks.bench_importtime --runs 5
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+TARGETS = {
+    "cli": "import portfolio.cli",
+    "gui": "import Bank",
+    "original": ("import sqlite3, json, customtkinter, matplotlib.pyplot, matplotlib.backends.backend_tkagg, "
+                 "forex_python.converter, requests"),
+}
+HEAVY = ("customtkinter", "tkinter", "matplotlib", "numpy", "requests", "forex_python", "PIL")
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def measure(statement):
+    # Returns (total ms, {top-level module: cumulative ms}, every module loaded) for one cold interpreter
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, cwd=os.getcwd(), check=True)
+    modules, loaded = {}, set()
+    for match in IMPORT_LINE.finditer(result.stderr):
+        _, cumulative, indent, name = match.groups()
+        loaded.add(name.split('.')[0])
+        if len(indent) == 1:
+            modules[name] = int(cumulative) / 1000
+    return sum(modules.values()), modules, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time of the CLI and GUI startup paths")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports to list per target")
+    parser.add_argument("targets", nargs="*", default=list(TARGETS), help=f"Any of {', '.join(TARGETS)} (default: all)")
+    args = parser.parse_args()
+    for target in args.targets:
+        if target not in TARGETS:
+            parser.error(f"unknown target {target}")
+
+    for target in args.targets:
+        runs = [measure(TARGETS[target]) for _ in range(args.runs)]
+        totals = [total for total, _, _ in runs]
+        _, modules, loaded = runs[-1]
+        heavy = sorted(loaded.intersection(HEAVY))
+        print(f"{target}: median {statistics.median(totals):.1f} ms over {args.runs} runs ({TARGETS[target]})")
+        for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {ms:8.1f} ms  {name}")
+        print(f"  heavy dependencies loaded: {', '.join(heavy) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Journal posting throughput (postings/sec) one outcome per transaction and in import-sized batches,
+# and the time to reconcile the whole journal against balances, over a synthetic portfolio.
+# Run from the repository root: python -m benchmarks.bench_ledger --outcomes 100000 --postings 5000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from portfolio import database, importer, ledger, store
+from portfolio.models import CreditCardOutcome
+from benchmarks import generator
+
+def outcomes(rng, count, accounts):
+    for _ in range(count):
+        payers = rng.sample(range(1, accounts + 1), rng.randint(1, 3))
+        yield CreditCardOutcome(rng.randint(1, accounts), 100.0, "Bench", {payer: round(rng.uniform(1, 50), 2) for payer in payers})
+
+def journal_size():
+    with database.connection() as conn:
+        return (conn.execute('SELECT COUNT(*) FROM journal_entries').fetchone()[0],
+                conn.execute('SELECT COUNT(*) FROM journal_postings').fetchone()[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark journal postings and reconciliation")
+    generator.add_size_arguments(parser)
+    parser.add_argument("--postings", type=int, default=5000, help="Outcomes posted by each write scenario")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Outcomes per transaction in the batched scenario")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "ledger.db")
+        sizes = generator.sizes_from(args)
+        generator.generate(path, sizes, args.seed)
+        database.configure(path)
+        entries, postings = journal_size()
+        print(f"{sizes.accounts:,} accounts, {sizes.outcomes:,} outcomes: {entries:,} entries, {postings:,} postings")
+        print(f"{'scenario':<34}{'seconds':>10}{'entries/s':>12}{'postings/s':>12}")
+
+        def report(name, fn):
+            before = journal_size()
+            start = time.perf_counter()
+            fn()
+            seconds = time.perf_counter() - start
+            after = journal_size()
+            print(f"{name:<34}{seconds:>10.2f}{(after[0] - before[0]) / seconds:>12,.0f}{(after[1] - before[1]) / seconds:>12,.0f}")
+
+        def one_per_transaction():
+            for outcome in outcomes(rng, args.postings, sizes.accounts):
+                store.add_credit_card_outcome(outcome)
+
+        def batched():
+            batch = list(outcomes(rng, args.postings, sizes.accounts))
+            for start in range(0, len(batch), args.batch_size):
+                with database.transaction() as conn:
+                    importer.write_batch(conn, "outcomes", batch[start:start + args.batch_size])
+
+        def reversals():
+            first = sizes.outcomes + 1
+            for outcome_id in range(first, first + args.postings):
+                store.delete_credit_card_outcome(outcome_id)
+
+        report("add outcome, 1 per transaction", one_per_transaction)
+        report(f"add outcomes, {args.batch_size} per transaction", batched)
+        report("delete outcome (reversal)", reversals)
+
+        entries, postings = journal_size()
+        start = time.perf_counter()
+        problems = ledger.reconcile()
+        seconds = time.perf_counter() - start
+        print(f"\nreconcile {postings:,} postings: {seconds:.2f} s ({postings / seconds:,.0f} postings/s), {len(problems)} discrepancies")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Opening a table view: the original fetchall + one string per table vs. keyset pages of the table views.
+# Reports time and peak Python memory for the first page, and the cost of a page deep into the table.
+# Run from the repository root: python -m benchmarks.bench_pages --rows 1000000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from portfolio import database, store, pages
+
+def legacy_view_accounts(path):
+    conn = sqlite3.connect(path)
+    accounts = conn.execute('SELECT * FROM accounts').fetchall()
+    conn.close()
+    return "\n".join([f"ID: {a[0]}, Type: {a[1]}, Currency: {a[2]}, Exchange Rate: {a[3]}, Balance: {a[4]}, "
+                      f"Income Percentage: {a[5]}, Date: {a[6]}" for a in accounts])
+
+def measured(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+def walk(page_count, **options):
+    # Pages forward page_count times and returns the average ms per page
+    page = pages.fetch_page("accounts", **options)
+    start = time.perf_counter()
+    for _ in range(page_count):
+        page = pages.fetch_page("accounts", after=page.boundary(), **options)
+    return (time.perf_counter() - start) / page_count * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark paginated table views")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "pages.db")
+        database.configure(path)
+        store.create_database()
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany(
+                "INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date) VALUES (?, ?, ?, ?, ?, ?)",
+                ((("Checking", "Savings")[i % 2], ("USD", "EUR", "TRY")[i % 3], 1.0, float(i % 100_000), 2.0, "2024-01-01")
+                 for i in range(args.rows)))
+        conn.close()
+
+        legacy_ms, legacy_mb, _ = measured(lambda: legacy_view_accounts(path))
+        page_ms, page_mb, _ = measured(lambda: pages.fetch_page("accounts", limit=args.page_size))
+        print(f"{args.rows:,} accounts")
+        print(f"{'open':<34}{'ms':>10}{'peak MB':>10}")
+        print(f"{'original fetchall + string':<34}{legacy_ms:>10.1f}{legacy_mb:>10.1f}")
+        print(f"{'first page':<34}{page_ms:>10.2f}{page_mb:>10.2f}")
+        for name, options in (("next page by id", {}), ("next page by balance, descending", {"sort": "balance", "descending": True}),
+                              ("next page filtered on currency", {"filters": {"currency": "eur"}})):
+            print(f"{name:<34}{walk(20, limit=args.page_size, **options):>10.2f}")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# Monte Carlo projection throughput (paths/sec) by number of worker processes, over a synthetic portfolio.
+# Run from the repository root: python -m benchmarks.bench_projection --paths 20000 --workers 1 2 4 8
+import argparse
+import os
+import tempfile
+
+from portfolio import database
+from portfolio.valuation import load_positions
+from portfolio.projection import project
+from benchmarks import generator
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Monte Carlo projection across process counts")
+    generator.add_size_arguments(parser)
+    parser.add_argument("--paths", type=int, default=20_000)
+    parser.add_argument("--months", type=int, default=120)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "projection.db")
+        sizes = generator.sizes_from(args)
+        generator.generate(path, sizes, args.seed)
+        database.configure(path)
+        positions = load_positions()
+        database.close()
+
+    cores = os.cpu_count() or 1
+    print(f"{sizes.accounts:,} accounts, {sizes.assets:,} assets, {args.paths:,} paths x {args.months} months, {cores} core(s)")
+    print(f"{'processes':>10}{'seconds':>10}{'paths/s':>12}{'speedup':>9}  median net worth at horizon")
+    baseline = None
+    for workers in args.workers:
+        if workers > cores:
+            print(f"{workers:>10}  skipped, only {cores} core(s)")
+            continue
+        result = project(positions, args.months, args.paths, workers, seed=args.seed)
+        baseline = baseline or result.paths_per_second
+        print(f"{result.workers:>10}{result.seconds:>10.2f}{result.paths_per_second:>12,.0f}"
+              f"{result.paths_per_second / baseline:>8.1f}x  {result.band(50)[-1]:,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Bulk revaluation and point-in-time valuation over a recorded exchange-rate history.
+# Records a daily rate for every generated currency, then times re-pricing every account at a new day's
+# rates (one UPDATE per currency), a repeat that changes nothing, and net worth on past dates.
+# Run from the repository root: python -m benchmarks.bench_revalue --accounts 100000
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from portfolio import database, rate_history
+from benchmarks import generator
+
+def rate_history_rows(rng, days):
+    # A random walk of at most 1% a day from each generated rate, one row per currency and day
+    for currency, rate in generator.CURRENCIES:
+        if currency == "TRY":
+            continue
+        for day in range(days):
+            rate *= 1 + rng.uniform(-0.01, 0.01)
+            yield currency, (generator.FIRST_DATE + timedelta(days=day)).isoformat(), rate, "bench"
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exchange-rate revaluation")
+    generator.add_size_arguments(parser)
+    parser.set_defaults(accounts=100_000, outcomes=100_000, assets=1_000)
+    parser.add_argument("--days", type=int, default=1460, help="Days of recorded rates")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "revalue.db")
+        sizes = generator.sizes_from(args)
+        generator.generate(path, sizes, args.seed)
+        database.configure(path)
+        rng = random.Random(args.seed)
+        rows = list(rate_history_rows(rng, args.days))
+        with database.transaction() as conn:
+            _, load_ms = timed(lambda: conn.executemany(
+                'INSERT OR REPLACE INTO exchange_rates (currency, date, rate, source) VALUES (?, ?, ?, ?)', rows))
+        print(f"{sizes.accounts:,} accounts, {len(rows):,} recorded rates ({args.days} days), loaded in {load_ms:.1f} ms")
+
+        last_day = (generator.FIRST_DATE + timedelta(days=args.days - 1)).isoformat()
+        print(f"\n{'operation':<44}{'ms':>10}{'accounts':>12}")
+        for name, fn in (
+            (f"revalue at {last_day}", lambda: rate_history.revalue(last_day)),
+            ("revalue again (nothing to change)", lambda: rate_history.revalue(last_day)),
+            (f"revalue at {generator.FIRST_DATE.isoformat()}", lambda: rate_history.revalue(generator.FIRST_DATE.isoformat())),
+        ):
+            updated, ms = timed(fn)
+            print(f"{name:<44}{ms:>10.1f}{sum(updated.values()):>12,}")
+
+        _, ms = timed(lambda: rate_history.rates_on(last_day))
+        print(f"{'rates_on (latest rate per currency)':<44}{ms:>10.1f}")
+        for day in (args.days // 4, args.days // 2, args.days - 1):
+            date = (generator.FIRST_DATE + timedelta(days=day)).isoformat()
+            valuation, ms = timed(lambda: rate_history.value_on(date, "USD"))
+            print(f"{'net worth on ' + date:<44}{ms:>10.1f}{len(valuation.account_ids):>12,}"
+                  f"   {valuation.net_worth:,.0f} USD")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Full-text search and category totals over credit card outcome descriptions.
+# Loads outcomes with varied merchant descriptions through the search triggers (reported as rows/s) and
+# applies the queued index changes, then times ranked FTS5 queries, prefix and phrase queries, category listings and totals, next to the
+# LIKE scan they replace, and re-categorizing every outcome after a rule is added.
+# Run from the repository root: python -m benchmarks.bench_search --outcomes 1000000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from portfolio import database, search
+from benchmarks import generator
+
+MERCHANTS = ("Migros", "Carrefour", "Starbucks", "Shell", "Opet", "Hilton", "Pegasus", "Zara", "Teknosa", "Netflix",
+             "Spotify", "Eczane", "Bim", "Uber", "Ikea", "Apple", "Amazon", "Decathlon", "Burger King", "Kahve Dunyasi")
+KINDS = generator.DESCRIPTIONS + ("Market", "Cafe", "Fuel station", "Hotel", "Pharmacy", "Subscription", "Taxi", "Parking")
+CITIES = ("Istanbul", "Ankara", "Izmir", "Bursa", "Antalya", "London", "Berlin", "Paris")
+
+def descriptions(rng, count):
+    for _ in range(count):
+        yield f"{rng.choice(MERCHANTS)} {rng.choice(KINDS)} {rng.choice(CITIES)} #{rng.randrange(10_000)}"
+
+def timed(fn, repetitions=20):
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fn()
+    return result, (time.perf_counter() - start) / repetitions * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark outcome search and category totals")
+    parser.add_argument("--outcomes", type=int, default=1_000_000)
+    parser.add_argument("--accounts", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "search.db")
+        generator.generate(path, generator.Sizes(accounts=args.accounts, outcomes=0, assets=0), args.seed)
+        database.configure(path)
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        batch = 10_000
+        for first in range(0, args.outcomes, batch):
+            rows = [(rng.randint(1, args.accounts), round(rng.uniform(5, 2_000), 2), description)
+                    for description in descriptions(rng, min(batch, args.outcomes - first))]
+            with database.transaction() as conn:
+                conn.executemany("INSERT INTO credit_card_outcomes (account_id, amount, description) VALUES (?, ?, ?)", rows)
+        load_s = time.perf_counter() - start
+        print(f"{args.outcomes:,} outcomes indexed and categorized on insert: {load_s:.1f} s "
+              f"({args.outcomes / load_s:,.0f} rows/s)")
+        start = time.perf_counter()
+        synced = search.sync_index()
+        print(f"first search applies the {synced:,} queued index changes: {time.perf_counter() - start:.1f} s")
+
+        def like_scan(pattern):
+            with database.connection() as conn:
+                return conn.execute('''
+                    SELECT id, account_id, amount, description FROM credit_card_outcomes WHERE description LIKE ?
+                ''', (pattern,)).fetchall()
+
+        print(f"\n{'query (100 results)':<48}{'ms':>10}{'matches':>12}   order")
+        for name, fn in (
+            ("LIKE '%hilton%antalya%' scan (before)", lambda: like_scan("%hilton%antalya%")),
+            ("LIKE '%sta%' scan (before)", lambda: like_scan("%sta%")),
+            ("search 'hilton antalya'", lambda: search.search_outcomes("hilton antalya")),
+            ("search 'netflix subscription'", lambda: search.search_outcomes("netflix subscription")),
+            ("search '\"fuel station\" izmir'", lambda: search.search_outcomes('"fuel station" izmir')),
+            ("search as you type 'sta' (prefix)", lambda: search.search_outcomes("sta", prefix_last=True)),
+            ("search as you type 'kahve du' (prefix)", lambda: search.search_outcomes("kahve du", prefix_last=True)),
+            ("search 'antalya' within category Travel", lambda: search.search_outcomes("antalya", category="Travel")),
+            ("category Groceries, largest 100", lambda: search.search_outcomes(category="Groceries")),
+            ("category totals", search.get_category_totals),
+        ):
+            result, ms = timed(fn)
+            if isinstance(result, search.Results):
+                order = "rank" if result.ranked else "newest" if name.startswith("search") else "amount"
+                print(f"{name:<48}{ms:>10.2f}{result.matches:>12,}   {order}")
+            else:
+                print(f"{name:<48}{ms:>10.2f}{len(result):>12,}")
+
+        start = time.perf_counter()
+        _, moved = search.add_rule("Coffee", "%starbucks%", priority=10)
+        print(f"\nadd rule Starbucks -> Coffee: {moved:,} outcomes re-categorized in {time.perf_counter() - start:.2f} s")
+        print(f"consistency: {len(search.check_search())} discrepancies")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Cost of create_database at startup on a large existing file: the original statements that ran on every
+# launch vs. the user_version migration engine, plus the one-off upgrade of an unversioned file.
+# Run from the repository root: python -m benchmarks.bench_startup --outcomes 1000000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from portfolio import database, migrations, summary
+
+def legacy_create_database(path):
+    # Everything the original create_database ran on each launch, one autocommit statement at a time
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY, account_type TEXT NOT NULL, currency TEXT NOT NULL, exchange_rate REAL NOT NULL,
+            balance REAL NOT NULL, income_percentage REAL, date TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS credit_card_outcomes (
+            id INTEGER PRIMARY KEY, account_id INTEGER NOT NULL, amount REAL NOT NULL, description TEXT,
+            account_distributions TEXT, FOREIGN KEY (account_id) REFERENCES accounts (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assets (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL, quantity REAL NOT NULL, price_per_unit REAL NOT NULL
+        )
+    ''')
+    for column in ('balance', 'date'):
+        cursor.execute("PRAGMA table_info(accounts)")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            raise RuntimeError("seeded file is missing columns")
+    cursor.execute('''
+        INSERT OR REPLACE INTO outcome_distributions (outcome_id, account_id, amount)
+        SELECT o.id, CAST(d.key AS INTEGER), d.value
+        FROM credit_card_outcomes o, json_each(o.account_distributions) d
+        WHERE o.account_distributions IS NOT NULL AND o.account_distributions NOT IN ('', '{}')
+    ''')
+    cursor.execute('UPDATE credit_card_outcomes SET account_distributions = NULL WHERE account_distributions IS NOT NULL')
+    summary.create_summary(conn)
+    conn.commit()
+    conn.close()
+
+def seed(path, accounts, outcomes):
+    database.configure(path)
+    migrations.migrate()
+    database.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date) VALUES (?, ?, ?, ?, ?, ?)",
+            (("Checking", "USD", 32.5, float(i % 5000), 2.0, f"2024-{i % 12 + 1:02}-01") for i in range(accounts)))
+        conn.executemany(
+            "INSERT INTO credit_card_outcomes (account_id, amount, description) VALUES (?, ?, ?)",
+            ((i % accounts + 1, float(i % 700), f"Outcome {i}") for i in range(outcomes)))
+    conn.close()
+
+def timed(fn, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fn()
+    return (time.perf_counter() - start) / repetitions * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark create_database on an existing database")
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--outcomes", type=int, default=1_000_000)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "startup.db")
+        seed(path, args.accounts, args.outcomes)
+
+        legacy_ms = timed(lambda: legacy_create_database(path), args.repetitions)
+
+        def versioned():
+            database.configure(path)
+            migrations.migrate()
+            database.close()
+        versioned_ms = timed(versioned, args.repetitions)
+
+        # Forget the version to time the one-off upgrade of a file written before versioning
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA user_version = 0")
+        conn.close()
+        upgrade_ms = timed(versioned, 1)
+
+    print(f"{args.accounts} accounts, {args.outcomes} outcomes")
+    print(f"Original create_database per launch: {legacy_ms:9.2f} ms")
+    print(f"Versioned, schema up to date:        {versioned_ms:9.2f} ms (includes opening the pool)")
+    print(f"One-off upgrade from version 0:      {upgrade_ms:9.2f} ms")
+
+if __name__ == "__main__":
+    main()
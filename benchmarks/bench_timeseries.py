@@ -0,0 +1,58 @@
+# Money Over Time rendering cost, off-screen with the Agg backend: the original plot of every point with
+# string dates and markers vs. parsing to datetime64 and downsampling with LTTB to the canvas width.
+# Run from the repository root: python -m benchmarks.bench_timeseries --points 1000000
+import argparse
+import time
+from datetime import date, timedelta
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+from matplotlib.figure import Figure
+
+from charts import TimeSeriesChart
+from portfolio.timeseries import to_arrays, downsample
+
+def rows(points, seed=3):
+    first = date(1000, 1, 1)  # A million days of history runs to the 3700s
+    values = 10_000 + np.cumsum(np.random.default_rng(seed).normal(0, 50, points))
+    return [((first + timedelta(days=i)).isoformat(), float(value)) for i, value in enumerate(values)]
+
+def legacy_render(data):
+    dates, balances = zip(*data)
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot()
+    ax.plot(dates, balances, marker='o')
+    ax.grid(True)
+    fig.canvas.draw()
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Money Over Time rendering")
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--legacy-points", type=int, nargs="+", default=[1000, 5000, 20000],
+                        help="Sizes for the original string-date plot, which grows too slow to run at --points")
+    args = parser.parse_args()
+
+    for points in args.legacy_points:
+        legacy_ms, _ = timed(lambda: legacy_render(rows(points)))
+        print(f"original, {points:>9,} points: {legacy_ms:9.1f} ms")
+
+    data = rows(args.points)
+    chart = TimeSeriesChart(title="Overall Money Over Time")
+    parse_ms, (dates, values) = timed(lambda: to_arrays(data))
+    sample_ms, (sample_dates, sample_values) = timed(lambda: downsample(dates, values, chart.width_pixels))
+    draw_ms, _ = timed(lambda: (chart.set_data(sample_dates, sample_values, fit=True), chart.canvas.draw()))
+    # A zoom re-reads the window and redraws it; with downsampling the drawn size is the same at any zoom
+    window = slice(len(dates) // 2, len(dates) // 2 + len(dates) // 10)
+    zoom_ms, _ = timed(lambda: (chart.set_data(*downsample(dates[window], values[window], chart.width_pixels)),
+                                chart.canvas.draw()))
+    print(f"pipeline, {args.points:>9,} points: parse {parse_ms:.1f} ms, LTTB to {len(sample_dates)} points {sample_ms:.1f} ms, "
+          f"draw {draw_ms:.1f} ms, zoom to 10% {zoom_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
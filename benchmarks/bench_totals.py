@@ -0,0 +1,89 @@
+# Dashboard total latency: full-table Python sums (original) vs. the trigger-maintained portfolio_totals table.
+# Also reports what the triggers cost on bulk inserts.
+# Run from the repository root: python -m benchmarks.bench_totals --outcomes 1000000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from portfolio import database
+from portfolio import store
+from portfolio import summary
+
+def legacy_total_money(path):
+    conn = sqlite3.connect(path)
+    accounts = conn.execute('SELECT * FROM accounts').fetchall()
+    conn.close()
+    return sum(account[4] for account in accounts)
+
+def legacy_total_outcome(path):
+    conn = sqlite3.connect(path)
+    outcomes = conn.execute('SELECT * FROM credit_card_outcomes').fetchall()
+    conn.close()
+    return sum(outcome[2] for outcome in outcomes)
+
+def timed(fn, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        result = fn()
+    return (time.perf_counter() - start) / repetitions * 1000, result
+
+def insert_outcomes(conn, count, offset=0):
+    start = time.perf_counter()
+    with conn:
+        conn.executemany(
+            "INSERT INTO credit_card_outcomes (account_id, amount, description) VALUES (?, ?, ?)",
+            ((i % 100 + 1, float(i % 700), f"Outcome {i}") for i in range(offset, offset + count)))
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard totals at scale")
+    parser.add_argument("--outcomes", type=int, default=1_000_000)
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "totals.db")
+        database.configure(path)
+        store.create_database()
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany(
+                "INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date) VALUES (?, ?, ?, ?, ?, ?)",
+                (("Checking", ("USD", "EUR", "TRY")[i % 3], 1.0, float(i % 5000), 2.5, "2024-01-01") for i in range(args.accounts)))
+        with_triggers = insert_outcomes(conn, args.outcomes)
+
+        # Same insert on a copy of the schema without the summary triggers
+        for trigger in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            conn.execute(f"DROP TRIGGER {trigger[0]}")
+        without_triggers = insert_outcomes(conn, 100_000, args.outcomes)
+        conn.execute("DELETE FROM credit_card_outcomes WHERE id > ?", (args.outcomes,))
+        conn.commit()
+        conn.close()
+        database.close()
+        database.configure(path)
+        with database.transaction() as conn:
+            summary.create_summary(conn)  # Restores the triggers
+
+        legacy_money_ms, legacy_money = timed(lambda: legacy_total_money(path), args.repetitions)
+        legacy_outcome_ms, legacy_outcome = timed(lambda: legacy_total_outcome(path), args.repetitions)
+        money_ms, money = timed(store.calculate_total_money, args.repetitions * 100)
+        outcome_ms, outcome = timed(store.calculate_total_outcome, args.repetitions * 100)
+        check_start = time.perf_counter()
+        drift = summary.check_totals()
+        check_ms = (time.perf_counter() - check_start) * 1000
+        database.close()
+
+    print(f"{args.accounts} accounts, {args.outcomes} outcomes")
+    print(f"{'total':<22}{'full scan ms':>14}{'summary ms':>12}{'speedup':>10}")
+    print(f"{'calculate_total_money':<22}{legacy_money_ms:>14.3f}{money_ms:>12.4f}{legacy_money_ms / money_ms:>9.0f}x")
+    print(f"{'calculate_total_outcome':<22}{legacy_outcome_ms:>14.3f}{outcome_ms:>12.4f}{legacy_outcome_ms / outcome_ms:>9.0f}x")
+    print(f"Totals agree: money {abs(money - legacy_money) < 1e-6 * max(1, abs(money))}, "
+          f"outcomes {abs(outcome - legacy_outcome) < 1e-6 * max(1, abs(outcome))}")
+    print(f"Bulk insert: {with_triggers:,.0f} rows/s with triggers, {without_triggers:,.0f} rows/s without")
+    print(f"Consistency check: {check_ms:.1f} ms, {len(drift)} drifted totals")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Valuation engine at scale: loading positions into NumPy arrays and valuing them in a reporting currency.
+# Run from the repository root: python -m benchmarks.bench_valuation --positions 1000000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from portfolio import database
+from portfolio import store
+from portfolio.valuation import load_positions, value_portfolio
+
+CURRENCIES = (("TRY", 1.0), ("USD", 32.45), ("EUR", 35.21), ("GBP", 41.03))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the currency-normalized valuation engine")
+    parser.add_argument("--positions", type=int, default=1_000_000, help="Number of accounts (and outcomes)")
+    parser.add_argument("--assets", type=int, default=100_000)
+    parser.add_argument("--reporting-currency", default="USD")
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "valuation.db")
+        database.configure(path)
+        store.create_database()
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany(
+                "INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date) VALUES (?, ?, ?, ?, ?, ?)",
+                (("Savings", *CURRENCIES[i % 4], float(i % 5000), 3.0 if i % 2 else None, "2024-01-01") for i in range(args.positions)))
+            conn.executemany(
+                "INSERT INTO credit_card_outcomes (account_id, amount, description) VALUES (?, ?, ?)",
+                ((i % 1000 + 1, float(i % 700), "Outcome") for i in range(args.positions)))
+            conn.executemany(
+                "INSERT INTO assets (name, quantity, price_per_unit) VALUES (?, ?, ?)",
+                ((f"Asset {i}", 2.0, float(i % 900)) for i in range(args.assets)))
+        conn.close()
+
+        start = time.perf_counter()
+        positions = load_positions()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repetitions):
+            valuation = value_portfolio(positions, args.reporting_currency)
+        value_ms = (time.perf_counter() - start) / args.repetitions * 1000
+        database.close()
+
+    print(f"{args.positions} accounts, {args.positions} outcomes, {args.assets} assets")
+    print(f"Load positions: {load_ms:.1f} ms")
+    print(f"Value portfolio in {valuation.reporting_currency}: {value_ms:.1f} ms")
+    print(f"Net worth {valuation.net_worth:,.2f}, monthly income {valuation.monthly_income_total:,.2f}")
+    print(f"Exposure: {', '.join(f'{c} {v:,.0f}' for c, v in valuation.exposure_by_currency().items())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Deterministic synthetic portfolios for the benchmarks: the same seed and sizes always give the same file.
+# Run from the repository root to build one: python -m benchmarks.generator portfolio.db --accounts 10000
+import argparse
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from portfolio import database, ledger, store
+
+CURRENCIES = (("TRY", 1.0), ("USD", 32.45), ("EUR", 35.21), ("GBP", 41.03), ("JPY", 0.22))
+ACCOUNT_TYPES = ("Checking", "Savings", "Credit Card", "Brokerage")
+DESCRIPTIONS = ("Groceries", "Rent", "Fuel", "Restaurants", "Travel", "Utilities", "Electronics", "Clothing", "Health", "Subscriptions")
+ASSET_NAMES = ("Gold", "Silver", "Apartment", "Car", "Stocks", "Bonds", "Bitcoin", "Land")
+FIRST_DATE = date(2020, 1, 1)
+
+class Sizes:
+    def __init__(self, accounts=10_000, outcomes=100_000, assets=1_000, max_distributions=3, days=1460):
+        self.accounts = accounts
+        self.outcomes = outcomes
+        self.assets = assets
+        self.max_distributions = max_distributions  # Paying accounts per outcome, 1..max
+        self.days = days  # Account opening dates are spread over this many days from FIRST_DATE
+
+    def as_dict(self):
+        return dict(vars(self))
+
+def account_rows(rng, sizes):
+    for _ in range(sizes.accounts):
+        currency, rate = rng.choice(CURRENCIES)
+        yield (rng.choice(ACCOUNT_TYPES), currency, rate, round(rng.uniform(-500, 50_000), 2),
+               rng.choice((None, 0.5, 1.0, 2.5, 4.0)), (FIRST_DATE + timedelta(days=rng.randrange(sizes.days))).isoformat())
+
+def outcome_rows(rng, sizes):
+    # (outcome row, distribution rows); outcome ids are 1..M because the file starts empty
+    for outcome_id in range(1, sizes.outcomes + 1):
+        amount = round(rng.uniform(5, 2_000), 2)
+        payers = rng.sample(range(1, sizes.accounts + 1), min(sizes.accounts, rng.randint(1, sizes.max_distributions)))
+        shares = [round(amount / len(payers), 2)] * len(payers)
+        yield ((rng.randint(1, sizes.accounts), amount, rng.choice(DESCRIPTIONS)),
+               [(outcome_id, payer, share) for payer, share in zip(payers, shares)])
+
+def asset_rows(rng, sizes):
+    for i in range(sizes.assets):
+        yield (f"{rng.choice(ASSET_NAMES)} {i}", round(rng.uniform(0.1, 100), 3), round(rng.uniform(10, 100_000), 2))
+
+def generate(path, sizes=None, seed=42, batch_size=10_000):
+    # Creates the schema through the normal startup path, then bulk loads the synthetic rows
+    sizes = sizes or Sizes()
+    rng = random.Random(seed)
+    database.configure(path)
+    store.create_database()
+    database.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', account_rows(rng, sizes))
+        outcomes, distributions = [], []
+        for outcome, shares in outcome_rows(rng, sizes):
+            outcomes.append(outcome)
+            distributions.extend(shares)
+            if len(outcomes) >= batch_size:
+                _write_outcomes(conn, outcomes, distributions)
+        _write_outcomes(conn, outcomes, distributions)
+        conn.executemany("INSERT INTO assets (name, quantity, price_per_unit) VALUES (?, ?, ?)", asset_rows(rng, sizes))
+        # The generated balances are today's, with the outcomes already paid out of them
+        ledger.rebuild_journal(conn)
+    conn.execute("ANALYZE")
+    conn.close()
+    return sizes
+
+def _write_outcomes(conn, outcomes, distributions):
+    conn.executemany("INSERT INTO credit_card_outcomes (account_id, amount, description) VALUES (?, ?, ?)", outcomes)
+    conn.executemany("INSERT OR IGNORE INTO outcome_distributions (outcome_id, account_id, amount) VALUES (?, ?, ?)", distributions)
+    outcomes.clear()
+    distributions.clear()
+
+def add_size_arguments(parser):
+    defaults = Sizes()
+    parser.add_argument("--accounts", type=int, default=defaults.accounts)
+    parser.add_argument("--outcomes", type=int, default=defaults.outcomes)
+    parser.add_argument("--assets", type=int, default=defaults.assets)
+    parser.add_argument("--max-distributions", type=int, default=defaults.max_distributions)
+    parser.add_argument("--seed", type=int, default=42)
+
+def sizes_from(args):
+    return Sizes(args.accounts, args.outcomes, args.assets, args.max_distributions)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic portfolio database")
+    parser.add_argument("path")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+    generate(args.path, sizes_from(args), args.seed)
+    print(f"Wrote {args.path}: {sizes_from(args).as_dict()}")
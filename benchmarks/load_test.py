@@ -0,0 +1,154 @@
+# Load test of the HTTP API (portfolio/server.py) from many concurrent keep-alive clients.
+# Starts python -m portfolio serve on a generated portfolio (or targets --url), then has --connections
+# clients send a mix of page reads, single-row reads, polls of the aggregates with If-None-Match, and
+# writes (new outcomes, edited accounts) for --duration seconds. Reports requests/s and p50/p99 latency
+# per kind of request, and how many aggregate polls were answered 304.
+# Run from the repository root: python -m benchmarks.load_test --connections 64 --duration 10
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from benchmarks import generator
+
+class Client:
+    # One keep-alive HTTP/1.1 connection; raw streams keep the client's own overhead out of the numbers
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+        self.etags = {}  # path -> last ETag, sent back as If-None-Match
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(payload)}"]
+        if path in self.etags:
+            headers.append(f"If-None-Match: {self.etags[path]}")
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + payload)
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            name = name.lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "etag":
+                self.etags[path] = value.strip()
+        return status, await self.reader.readexactly(length)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def choose(rng, accounts, write_ratio):
+    # (kind, method, path, body)
+    if rng.random() < write_ratio:
+        account_id = rng.randint(1, accounts)
+        if rng.random() < 0.5:
+            amount = round(rng.uniform(5, 500), 2)
+            return ("write outcome", "POST", "/outcomes", {"account_id": account_id, "amount": amount,
+                    "description": rng.choice(generator.DESCRIPTIONS), "account_distributions": {str(account_id): amount}})
+        currency, rate = rng.choice(generator.CURRENCIES)
+        return ("write account", "PUT", f"/accounts/{account_id}", {"account_type": rng.choice(generator.ACCOUNT_TYPES),
+                "currency": currency, "exchange_rate": rate, "balance": round(rng.uniform(0, 50_000), 2)})
+    kind = rng.random()
+    if kind < 0.3:
+        return "page", "GET", f"/accounts?limit=50&after={rng.randint(0, accounts)}", None
+    if kind < 0.6:
+        return "row", "GET", f"/accounts/{rng.randint(1, accounts)}", None
+    if kind < 0.9:
+        return "totals", "GET", "/totals", None
+    return "money over time", "GET", "/money-over-time?granularity=month", None
+
+async def worker(host, port, seed, accounts, write_ratio, deadline, latencies, statuses):
+    rng = random.Random(seed)
+    client = Client(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            kind, method, path, body = choose(rng, accounts, write_ratio)
+            start = time.perf_counter()
+            status, _ = await client.request(method, path, body)
+            latencies.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+            statuses.setdefault(kind, {}).setdefault(status, 0)
+            statuses[kind][status] += 1
+    finally:
+        client.close()
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def run(host, port, args):
+    latencies, statuses = {}, {}
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(host, port, args.seed + index, args.accounts, args.write_ratio, deadline, latencies, statuses)
+                           for index in range(args.connections)))
+    elapsed = time.perf_counter() - start
+    print(f"\n{'request':<18}{'count':>9}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}   statuses")
+    for kind in sorted(latencies):
+        values = latencies[kind]
+        codes = ", ".join(f"{status}: {count}" for status, count in sorted(statuses[kind].items()))
+        print(f"{kind:<18}{len(values):>9,}{len(values) / elapsed:>10,.0f}{percentile(values, 0.5):>9.2f}"
+              f"{percentile(values, 0.99):>9.2f}   {codes}")
+    every = [value for values in latencies.values() for value in values]
+    print(f"{'all':<18}{len(every):>9,}{len(every) / elapsed:>10,.0f}{percentile(every, 0.5):>9.2f}{percentile(every, 0.99):>9.2f}")
+    polls = [statuses.get(kind, {}) for kind in ("totals", "money over time")]
+    answered = sum(sum(codes.values()) for codes in polls)
+    if answered:
+        print(f"aggregate polls answered 304 Not Modified: {sum(codes.get(304, 0) for codes in polls) / answered:.0%}")
+
+def start_server(path, args):
+    # Port 0 lets the server pick; it prints the address it listens on once it does
+    process = subprocess.Popen([sys.executable, "-m", "portfolio", "--database", path, "serve", "--port", "0",
+                                "--workers", str(args.workers), "--max-batch", str(args.max_batch)],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving"):
+        process.kill()
+        raise SystemExit(f"The server did not start: {line}")
+    address = urlsplit(line.split(" on ")[1].split()[0])
+    return process, address.hostname, address.port
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the portfolio HTTP API")
+    generator.add_size_arguments(parser)
+    parser.set_defaults(accounts=10_000, outcomes=100_000, assets=1_000)
+    parser.add_argument("--url", help="Test a server that is already running, e.g. http://127.0.0.1:8765")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=4, help="Read threads of the started server")
+    parser.add_argument("--max-batch", type=int, default=256, help="Writes per commit of the started server")
+    args = parser.parse_args()
+
+    if args.url:
+        address = urlsplit(args.url)
+        print(f"{args.connections} connections against {args.url} for {args.duration:g} s")
+        asyncio.run(run(address.hostname, address.port, args))
+        return
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "load.db")
+        generator.generate(path, generator.sizes_from(args), args.seed)
+        process, host, port = start_server(path, args)
+        try:
+            print(f"{args.accounts:,} accounts, {args.outcomes:,} outcomes; {args.connections} connections, "
+                  f"{args.write_ratio:.0%} writes, {args.workers} read threads, up to {args.max_batch} writes per commit, "
+                  f"{args.duration:g} s")
+            asyncio.run(run(host, port, args))
+        finally:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Memory soak test for the dashboard pies, rendered off-screen with the Agg backend.
+# "reused" drives charts.PieChart the way ChartManager does; "legacy" rebuilds a pyplot figure per update
+# like the original update_charts did. RSS is sampled as the run goes; the reused path should stay flat.
+# Run from the repository root: python -m benchmarks.soak_charts --updates 10000
+import argparse
+import os
+import resource
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from charts import PieChart
+
+def rss_mb():
+    # Current resident set size; falls back to the peak where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def chart_data(i):
+    # Alternate between slice counts so both the in-place and the rebuild paths are exercised
+    count = 8 if (i // 50) % 2 else 12
+    sizes = [(i + k) % 17 + 1 for k in range(count)]
+    labels = [f"ID: {k}, Type: Checking" for k in range(count)]
+    return sizes, labels, "Total Money Distribution", f"Total Money: {sum(sizes)}"
+
+def reused(updates, samples):
+    chart = PieChart()
+    for i in range(updates):
+        chart.set_data(*chart_data(i))
+        chart.canvas.draw()
+        if i % samples == 0:
+            yield i, rss_mb()
+
+def legacy(updates, samples):
+    for i in range(updates):
+        sizes, labels, title, footer = chart_data(i)
+        fig, ax = plt.subplots(figsize=(6, 6))
+        ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
+        ax.set_title(title)
+        plt.figtext(0.5, 0.05, footer, ha="center", fontsize=12)
+        fig.canvas.draw()
+        if i % samples == 0:
+            yield i, rss_mb()
+    plt.close('all')
+
+def run(name, series):
+    start = time.perf_counter()
+    readings = list(series)
+    elapsed = time.perf_counter() - start
+    print(f"{name}:")
+    for i, rss in readings:
+        print(f"  after {i:>6} updates: {rss:8.1f} MB")
+    first, last = readings[1][1] if len(readings) > 1 else readings[0][1], readings[-1][1]
+    print(f"  growth after warm-up: {last - first:+.1f} MB, {elapsed / max(1, readings[-1][0]) * 1000:.2f} ms/update")
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS soak test for chart updates")
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--legacy-updates", type=int, default=300, help="Updates for the pyplot rebuild comparison (0 to skip)")
+    args = parser.parse_args()
+
+    run("reused PieChart", reused(args.updates + 1, max(1, args.updates // 10)))
+    if args.legacy_updates:
+        run("legacy pyplot rebuild", legacy(args.legacy_updates + 1, max(1, args.legacy_updates // 6)))
+
+if __name__ == "__main__":
+    main()
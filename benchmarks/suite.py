@@ -0,0 +1,175 @@
+# Regression suite: every data path timed against one deterministic synthetic portfolio (benchmarks/generator.py).
+# Results are written as JSON; --compare checks them against a saved baseline and exits non-zero on regressions.
+# Run from the repository root:
+#   python -m benchmarks.suite --output baseline.json
+#   python -m benchmarks.suite --compare baseline.json --threshold 0.2
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from portfolio import database, store, pages, ledger, search
+from portfolio.chart_data import money_breakdown, outcome_breakdown, decimated_labels, decimated_autopct
+from portfolio.models import BankAccount, CreditCardOutcome, Asset
+from portfolio.valuation import load_positions, value_portfolio
+from benchmarks import generator
+
+#MARK: - Scenarios
+# (name, kind, fn(i)); "op" scenarios run --ops times, "scan" scenarios --scans times. Order matters:
+# reads run before the writes, and the generated file has ids 1..N, so the i-th add gets id N + 1 + i
+# and the matching delete removes exactly that row, leaving the generated rows for every scenario.
+def scenarios(sizes):
+    account = BankAccount("Checking", "USD", 32.45, 1000.0, 2.5)
+    outcome = CreditCardOutcome(1, 250.0, "Benchmark", {"1": 150.0, "2": 100.0})
+    asset = Asset("Gold", 2.0, 2400.0)
+
+    chart = None
+    def render(slices):
+        nonlocal chart
+        if chart is None:
+            from charts import PieChart
+            chart = PieChart()
+        chart.set_data([s.value for s in slices], decimated_labels(slices, "Other"), "Benchmark", "", autopct=decimated_autopct)
+        chart.canvas.draw()
+
+    def id_of(i, count):
+        return i % count + 1
+
+    def added_id(i, count):
+        return count + 1 + i
+
+    return [
+        ("get_accounts", "scan", lambda i: store.get_accounts()),
+        ("get_credit_card_outcomes", "scan", lambda i: store.get_credit_card_outcomes()),
+        ("get_credit_card_outcome", "op", lambda i: store.get_credit_card_outcome(id_of(i, sizes.outcomes))),
+        ("get_account_outcome_total", "op", lambda i: store.get_account_outcome_total(id_of(i, sizes.accounts))),
+        ("get_assets", "scan", lambda i: store.get_assets()),
+        ("calculate_total_money", "op", lambda i: store.calculate_total_money()),
+        ("calculate_total_outcome", "op", lambda i: store.calculate_total_outcome()),
+        ("get_money_over_time", "scan", lambda i: store.get_money_over_time()),
+        ("get_money_over_time_month", "scan", lambda i: store.get_money_over_time(granularity='month')),
+        ("money_breakdown", "scan", lambda i: money_breakdown('account')),
+        ("outcome_breakdown", "scan", lambda i: outcome_breakdown('outcome')),
+        ("money_pie_render_agg", "scan", lambda i: render(money_breakdown('currency'))),
+        ("outcome_pie_render_agg", "scan", lambda i: render(outcome_breakdown('description'))),
+        ("load_positions", "scan", lambda i: load_positions()),
+        ("value_portfolio_usd", "scan", lambda i: value_portfolio(load_positions(), "USD")),
+        ("ledger_reconcile", "scan", lambda i: ledger.reconcile()),
+        ("search_outcomes", "op", lambda i: search.search_outcomes("fuel", limit=50)),
+        ("search_outcomes_prefix", "op", lambda i: search.search_outcomes("gro", prefix_last=True, limit=50)),
+        ("category_totals", "op", lambda i: search.get_category_totals()),
+        ("fetch_page_accounts", "op", lambda i: pages.fetch_page("accounts", after=(id_of(i, sizes.accounts), id_of(i, sizes.accounts)))),
+        ("fetch_page_outcomes_by_amount", "op", lambda i: pages.fetch_page("outcomes", sort="amount", descending=True)),
+        ("update_account", "op", lambda i: store.update_account(id_of(i, sizes.accounts), account)),
+        ("update_credit_card_outcome", "op", lambda i: store.update_credit_card_outcome(id_of(i, sizes.outcomes), outcome)),
+        ("update_asset", "op", lambda i: store.update_asset(id_of(i, sizes.assets), asset)),
+        ("add_account", "op", lambda i: store.add_account(account)),
+        ("add_credit_card_outcome", "op", lambda i: store.add_credit_card_outcome(outcome)),
+        ("add_asset", "op", lambda i: store.add_asset(asset)),
+        ("delete_credit_card_outcome", "op", lambda i: store.delete_credit_card_outcome(added_id(i, sizes.outcomes))),
+        ("delete_account", "op", lambda i: store.delete_account(added_id(i, sizes.accounts))),
+        ("delete_asset", "op", lambda i: store.delete_asset(added_id(i, sizes.assets))),
+    ]
+
+#MARK: - Runner
+def timed(fn, repetitions, warmup=1):
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    for i in range(warmup, warmup + repetitions):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"repetitions": repetitions, "median_ms": statistics.median(samples), "min_ms": min(samples), "max_ms": max(samples)}
+
+def run(sizes, seed, ops, scans, only=None):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "suite.db")
+        start = time.perf_counter()
+        generator.generate(path, sizes, seed)
+        generate_s = time.perf_counter() - start
+        database.configure(path)
+        results = {}
+        try:
+            for name, kind, fn in scenarios(sizes):
+                if only and name not in only:
+                    continue
+                results[name] = timed(fn, ops if kind == "op" else scans)
+        finally:
+            database.close()
+    meta = {
+        "sizes": sizes.as_dict(),
+        "seed": seed,
+        "generate_s": generate_s,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+    return {"meta": meta, "results": results}
+
+def compare(current, baseline, threshold):
+    # A scenario regresses when its median is more than threshold (0.2 = 20%) slower than the baseline's
+    if baseline["meta"]["sizes"] != current["meta"]["sizes"] or baseline["meta"]["seed"] != current["meta"]["seed"]:
+        print("Warning: baseline was generated with different sizes or seed; timings are not comparable")
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            rows.append((name, None, result["median_ms"], None, "new"))
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        status = "REGRESSION" if change > threshold else "faster" if change < -threshold else "ok"
+        rows.append((name, before["median_ms"], result["median_ms"], change, status))
+    return rows
+
+def print_results(document):
+    sizes = document["meta"]["sizes"]
+    print(f"{sizes['accounts']:,} accounts, {sizes['outcomes']:,} outcomes, {sizes['assets']:,} assets "
+          f"(seed {document['meta']['seed']}, generated in {document['meta']['generate_s']:.1f} s)")
+    print(f"{'scenario':<32}{'median ms':>12}{'min ms':>12}{'reps':>6}")
+    for name, r in document["results"].items():
+        print(f"{name:<32}{r['median_ms']:>12.3f}{r['min_ms']:>12.3f}{r['repetitions']:>6}")
+
+def print_comparison(rows):
+    print(f"{'scenario':<32}{'baseline ms':>12}{'current ms':>12}{'change':>9}  status")
+    for name, before, after, change, status in rows:
+        before_text = f"{before:>12.3f}" if before is not None else f"{'-':>12}"
+        change_text = f"{change:>+8.0%}" if change is not None else f"{'-':>8}"
+        print(f"{name:<32}{before_text}{after:>12.3f} {change_text}  {status}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite over a synthetic portfolio")
+    generator.add_size_arguments(parser)
+    parser.add_argument("--ops", type=int, default=200, help="Repetitions of each single-row scenario")
+    parser.add_argument("--scans", type=int, default=5, help="Repetitions of each full-table scenario")
+    parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+    parser.add_argument("--output", help="Write the results as JSON to this file (e.g. to save a baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Median slowdown flagged as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    document = run(generator.sizes_from(args), args.seed, args.ops, args.scans, args.only)
+    print_results(document)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(document, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        rows = compare(document, baseline, args.threshold)
+        print()
+        print_comparison(rows)
+        regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import math
+from collections import OrderedDict
+from matplotlib.figure import Figure
+from portfolio import metrics
+
+# Keyword arguments shared by the first draw and in-place updates so both lay wedges out identically
+PIE_STYLE = {"startangle": 140, "labeldistance": 1.1, "pctdistance": 0.6}
+UPDATE_DELAY = 50  # ms to wait for more updates before redrawing
+BITMAP_CACHE_SIZE = 24  # Rendered charts kept; a 600x600 pie is about 1.4 MB of RGBA
+
+#MARK: - Bitmap Cache
+# Rendered Agg pixels by (chart key, width, height, dpi). A chart's key names everything it shows (the
+# dashboard's is the cache data version, groupings and language), and its canvas looks the key up on
+# every draw: data drawn before, at a size drawn before, is copied back instead of rendered. That covers a
+# language switched back, a window resized back and a view repeated. Used from the UI thread only.
+class BitmapCache:
+    def __init__(self, limit=BITMAP_CACHE_SIZE):
+        self.limit = limit
+        self._regions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        region = self._regions.get(key)
+        if region is None:
+            self.misses += 1
+            metrics.increment("charts.bitmap_cache", "misses")
+            return None
+        self._regions.move_to_end(key)
+        self.hits += 1
+        metrics.increment("charts.bitmap_cache", "hits")
+        return region
+
+    def put(self, key, region):
+        self._regions[key] = region
+        self._regions.move_to_end(key)
+        while len(self._regions) > self.limit:
+            self._regions.popitem(last=False)
+
+    def stats(self):
+        # Keys end in (width, height, dpi); each region holds width * height RGBA pixels
+        return {"entries": len(self._regions), "hits": self.hits, "misses": self.misses,
+                "memory_mb": round(sum(key[-3] * key[-2] * 4 for key in self._regions) / 2**20, 1)}
+
+class _CachedDraw:
+    # Mixed into the Tk and Agg canvases. chart.bitmap_key() is None when the chart should always render.
+    chart = None
+
+    def draw(self):
+        key = self.chart.bitmap_key() if self.chart is not None else None
+        if key is not None:
+            key = key + self.get_width_height(physical=True) + (self.figure.dpi,)
+            region = self.chart.bitmaps.get(key)
+            if region is not None:
+                self.restore_region(region)
+                self.blit()
+                return
+            self.chart.before_render()
+        super().draw()
+        if key is not None:
+            self.chart.bitmaps.put(key, self.copy_from_bbox(self.figure.bbox))
+
+_canvas_classes = {}
+
+def _canvas(chart, master):
+    # A Tk canvas packed into master, or an off-screen Agg canvas; either way draw() goes through the chart's cache
+    if master is not None:
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg as base
+    else:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg as base
+    if base not in _canvas_classes:
+        _canvas_classes[base] = type(f"Cached{base.__name__}", (_CachedDraw, base), {})
+    canvas = _canvas_classes[base](chart.figure, master=master) if master is not None else _canvas_classes[base](chart.figure)
+    canvas.chart = chart
+    return canvas
+
+#MARK: - Pie Chart
+# One long-lived Figure/canvas per chart. Figures are created with matplotlib.figure.Figure rather
+# than pyplot, so they are never registered with pyplot and are freed with the chart.
+class PieChart:
+    def __init__(self, master=None, figsize=(6, 6), footer_y=0.05, bitmaps=None, name="pie"):
+        self.figure = Figure(figsize=figsize)
+        self.ax = self.figure.add_subplot()
+        self.bitmaps = bitmaps  # BitmapCache, possibly shared with other charts; None renders every time
+        self.name = name  # Tells this chart's bitmaps apart from the others' in a shared cache
+        self.key = None  # What the chart shows: set_data's key, or one switched back to with show()
+        self._drawn_key = None  # Key of the data the artists hold
+        self._data = OrderedDict()  # key -> set_data arguments, to re-render a key whose pixels were evicted
+        self.canvas = _canvas(self, master)
+        if master is not None:
+            self.canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+        self.footer = self.figure.text(0.5, footer_y, "", ha="center", fontsize=12)
+        self.wedges = []
+        self.labels = []
+        self.autotexts = []
+        self._autopct = None
+
+    @metrics.instrument("charts.pie_update")
+    def set_data(self, sizes, labels, title, footer, autopct='%1.1f%%', key=None):
+        if self.wedges and len(sizes) == len(self.wedges) and autopct == self._autopct and sum(sizes) > 0:
+            self._update_in_place(sizes, labels, autopct)
+        else:
+            self._redraw(sizes, labels, autopct)
+        self.ax.set_title(title)
+        self.footer.set_text(footer)
+        self.key = self._drawn_key = key
+        if key is not None and self.bitmaps is not None:
+            self._data[key] = (sizes, labels, title, footer, autopct)
+            self._data.move_to_end(key)
+            while len(self._data) > self.bitmaps.limit:
+                self._data.popitem(last=False)
+
+    def remembers(self, key):
+        return key in self._data
+
+    def show(self, key):
+        # Switches back to data set_data was given under key; the next draw copies its pixels when it can
+        self.key = key
+        self._data.move_to_end(key)
+
+    def bitmap_key(self):
+        return None if self.bitmaps is None or self.key is None else (self.name, self.key)
+
+    def before_render(self):
+        # A cache miss: after show() the artists may still hold another key's data
+        if self._drawn_key != self.key:
+            self.set_data(*self._data[self.key], key=self.key)
+
+    def _redraw(self, sizes, labels, autopct):
+        self.ax.clear()
+        # (wedges, labels[, autotexts]); newer matplotlib returns a container that unpacks the same way
+        parts = tuple(self.ax.pie(sizes, labels=labels, autopct=autopct, **PIE_STYLE))
+        self.wedges, self.labels = parts[0], parts[1]
+        self.autotexts = parts[2] if len(parts) > 2 else []
+        self._autopct = autopct
+
+    def _update_in_place(self, sizes, labels, autopct):
+        # Same geometry as Axes.pie: wedges run counter-clockwise from startangle, sized by fraction of the total
+        total = float(sum(sizes))
+        theta = PIE_STYLE["startangle"]
+        for index, size in enumerate(sizes):
+            fraction = size / total
+            theta1, theta2 = theta, theta + 360 * fraction
+            wedge = self.wedges[index]
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+            middle = math.radians((theta1 + theta2) / 2)
+            x, y = math.cos(middle), math.sin(middle)
+            label = self.labels[index]
+            label.set_text(labels[index])
+            label.set_position((PIE_STYLE["labeldistance"] * x, PIE_STYLE["labeldistance"] * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            if self.autotexts:
+                text = autopct(100 * fraction) if callable(autopct) else autopct % (100 * fraction)
+                self.autotexts[index].set_text(text)
+                self.autotexts[index].set_position((PIE_STYLE["pctdistance"] * x, PIE_STYLE["pctdistance"] * y))
+            theta = theta2
+
+    def draw_idle(self):
+        self.canvas.draw_idle()
+
+    @metrics.instrument("charts.pie_draw")
+    def draw(self):
+        # Renders now; the chart manager calls it once per debounced flush, so this is the time spent in matplotlib
+        self.canvas.draw()
+
+#MARK: - Time Series Chart
+# A single Line2D whose data is replaced as the view changes. The owner supplies the points for a
+# window (already downsampled to about one per pixel); panning or zooming asks it for the new window.
+MARKER_LIMIT = 200  # Points are only marked when there are few enough to tell apart
+
+class TimeSeriesChart:
+    def __init__(self, master=None, on_view_change=None, figsize=(8, 6), title="", xlabel="", ylabel="", bitmaps=None):
+        self.figure = Figure(figsize=figsize)
+        self.ax = self.figure.add_subplot()
+        self.ax.set_title(title)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.grid(True)
+        self.line, = self.ax.plot([], [])
+        self.on_view_change = on_view_change
+        self._updating = False
+        self.bitmaps = bitmaps
+        self.key = None  # Names the line's data (and the titles); the view limits are added per draw
+        self.canvas = _canvas(self, master)
+        if master is not None:
+            from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
+            self.toolbar = NavigationToolbar2Tk(self.canvas, master)
+            self.canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+        self.figure.autofmt_xdate()
+        self.ax.callbacks.connect('xlim_changed', self._xlim_changed)
+
+    @property
+    def width_pixels(self):
+        return self.canvas.get_width_height()[0]
+
+    @metrics.instrument("charts.series_update")
+    def set_data(self, dates, values, fit=False, key=None):
+        # fit=True frames the whole series (first load); otherwise the current x range is kept
+        self.key = key
+        self._updating = True
+        try:
+            self.line.set_data(dates, values)
+            self.line.set_marker('o' if len(dates) <= MARKER_LIMIT else '')
+            if fit and len(dates):
+                low, high = dates[0], dates[-1]
+                self.ax.set_xlim(low, high if high > low else low + 1)
+            if len(values):
+                low, high = float(values.min()), float(values.max())
+                margin = (high - low) * 0.05 or abs(high) * 0.05 or 1.0
+                self.ax.set_ylim(low - margin, high + margin)
+        finally:
+            self._updating = False
+        self.canvas.draw_idle()
+
+    def bitmap_key(self):
+        # The pixels depend on the data and the view: a pan keeps the old window's data until the new one arrives
+        if self.bitmaps is None or self.key is None:
+            return None
+        return ("series", self.key, tuple(self.ax.get_xlim()), tuple(self.ax.get_ylim()))
+
+    def before_render(self):
+        pass
+
+    def visible_range(self):
+        # Current x range as ISO dates
+        from matplotlib.dates import num2date
+        low, high = self.ax.get_xlim()
+        return num2date(low).date().isoformat(), num2date(high).date().isoformat()
+
+    def _xlim_changed(self, ax):
+        if not self._updating and self.on_view_change:
+            self.on_view_change(*self.visible_range())
+
+#MARK: - Fan Chart
+# Percentile bands of a projection: the outermost pair of quantiles is shaded lightest, each inner
+# pair darker, with the median as a line.
+class FanChart:
+    def __init__(self, master=None, figsize=(8, 6), title="", xlabel="", ylabel=""):
+        self.figure = Figure(figsize=figsize)
+        self.ax = self.figure.add_subplot()
+        self.ax.set_title(title)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.grid(True)
+        if master is not None:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+            self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+            self.toolbar = NavigationToolbar2Tk(self.canvas, master)
+            self.canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+        else:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.canvas = FigureCanvasAgg(self.figure)
+
+    @metrics.instrument("charts.fan_update")
+    def set_data(self, dates, quantiles, bands, title=None):
+        # bands[i] is the quantiles[i] percentile at each date; quantiles ascend and pair up from the outside in
+        for artist in list(self.ax.collections) + list(self.ax.lines):
+            artist.remove()
+        pairs = len(quantiles) // 2
+        for index in range(pairs):
+            low, high = quantiles[index], quantiles[-index - 1]
+            self.ax.fill_between(dates, bands[index], bands[-index - 1], color="tab:blue", alpha=0.15 + 0.2 * index,
+                                 linewidth=0, label=f"{low:g}–{high:g}%")
+        if len(quantiles) % 2:
+            self.ax.plot(dates, bands[pairs], color="tab:blue", label=f"{quantiles[pairs]:g}% (median)")
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.legend(loc="upper left")
+        if title:
+            self.ax.set_title(title)
+        self.figure.autofmt_xdate()
+        self.canvas.draw_idle()
+
+#MARK: - Chart Manager
+# Owns the dashboard pies; bursts of updates are debounced into a single draw_idle per chart
+class ChartManager:
+    def __init__(self, root, master, delay=UPDATE_DELAY, cache_size=BITMAP_CACHE_SIZE):
+        self.root = root
+        self.delay = delay
+        self.bitmaps = BitmapCache(cache_size)
+        self.money = PieChart(master, footer_y=0.05, bitmaps=self.bitmaps, name="money")
+        self.outcome = PieChart(master, footer_y=0.01, bitmaps=self.bitmaps, name="outcome")
+        self._pending = {}
+        self._after_id = None
+
+    def update(self, money=None, outcome=None, key=None):
+        # Each argument is (sizes, labels, title, footer, autopct); only the latest pending data is drawn.
+        # key names the data (see BitmapCache) so show() can bring it back without reloading it.
+        if money is not None:
+            self._pending[self.money] = (money, key)
+        if outcome is not None:
+            self._pending[self.outcome] = (outcome, key)
+        self._schedule()
+
+    def show(self, key):
+        # Both pies as they were drawn under key, from their pixels where the size matches; False when
+        # either has not been drawn with it (or has forgotten it) and the data has to be loaded
+        if not (self.money.remembers(key) and self.outcome.remembers(key)):
+            return False
+        self._pending[self.money] = self._pending[self.outcome] = (None, key)
+        self._schedule()
+        return True
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.delay, self._flush)
+
+    def _flush(self):
+        self._after_id = None
+        pending, self._pending = self._pending, {}
+        for chart, (data, key) in pending.items():
+            if data is None:
+                chart.show(key)
+            else:
+                chart.set_data(*data, key=key)
+            chart.draw()
+
+    def stats(self):
+        return self.bitmaps.stats()
+
+    def close(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
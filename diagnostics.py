@@ -0,0 +1,86 @@
+from tkinter import ttk, filedialog
+import customtkinter as ctk
+from portfolio import metrics
+
+REFRESH_INTERVAL = 1000  # ms between table refreshes while the panel is open
+COLUMNS = ("name", "calls", "errors", "mean_ms", "p50_ms", "p95_ms", "max_ms", "rows", "retries")
+
+#MARK: - Diagnostics Panel
+# Live view of portfolio.metrics: one row per instrumented call, with switches for recording and
+# cProfile capture and export to JSON or Prometheus text. extra() may return more {name: value}
+# lines to show above the table (e.g. event loop stalls, rate cache hits).
+class DiagnosticsPanel:
+    def __init__(self, master, extra=None, labels=None):
+        self.master = master
+        self.extra = extra
+        self._labels = labels = labels or {}
+
+        controls = ctk.CTkFrame(master)
+        controls.pack(side="top", fill="x")
+        self.recording = ctk.CTkSwitch(controls, text=labels.get("record_metrics", "Record metrics"), command=self._toggle_recording)
+        self.recording.pack(side="left", padx=5, pady=5)
+        if metrics.enabled():
+            self.recording.select()
+        self.profile_button = ctk.CTkButton(controls, width=140, command=self._toggle_profile)
+        self.profile_button.pack(side="left", padx=5, pady=5)
+        ctk.CTkButton(controls, text=labels.get("reset", "Reset"), width=80, command=self._reset).pack(side="right", padx=5, pady=5)
+        ctk.CTkButton(controls, text=labels.get("export", "Export..."), width=100, command=self._export).pack(side="right", padx=5, pady=5)
+        self.summary = ctk.CTkLabel(master, text="", justify="left", anchor="w")
+        self.summary.pack(side="top", fill="x", padx=10)
+
+        self.tree = ttk.Treeview(master, columns=COLUMNS, show="headings", height=15)
+        for column in COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=220 if column == "name" else 80, stretch=column == "name", anchor="w" if column == "name" else "e")
+        self.tree.pack(side="top", fill="both", expand=True)
+        self.profile_text = ctk.CTkTextbox(master, height=160)
+        self.profile_text.pack(side="top", fill="x", padx=5, pady=5)
+        self._update_profile_button()
+        self.refresh()
+
+    def refresh(self):
+        if not self.tree.winfo_exists():
+            return
+        self._fill()
+        self.master.after(REFRESH_INTERVAL, self.refresh)
+
+    def _fill(self):
+        self.tree.delete(*self.tree.get_children())
+        for name, m in metrics.snapshot().items():
+            self.tree.insert("", "end", values=(name, m["calls"], m["errors"], f"{m['mean_ms']:.2f}", f"{m['p50_ms']:.2f}",
+                                                f"{m['p95_ms']:.2f}", f"{m['max_ms']:.2f}", m["rows"], m.get("retries", 0)))
+        if self.extra:
+            self.summary.configure(text="\n".join(f"{name}: {value}" for name, value in self.extra().items()))
+
+    def _toggle_recording(self):
+        metrics.enable(bool(self.recording.get()))
+
+    def _toggle_profile(self):
+        if metrics.profiling():
+            path = filedialog.asksaveasfilename(parent=self.master, defaultextension=".prof", filetypes=[("cProfile stats", "*.prof")])
+            self.profile_text.delete("1.0", "end")
+            self.profile_text.insert("1.0", metrics.stop_profile(path or None))
+        else:
+            metrics.start_profile()
+            self.recording.select()
+        self._update_profile_button()
+
+    def _update_profile_button(self):
+        key, default = ("stop_profiling", "Stop profiling") if metrics.profiling() else ("start_profiling", "Start profiling")
+        self.profile_button.configure(text=self._labels.get(key, default))
+
+    def _reset(self):
+        metrics.reset()
+        self._fill()
+
+    def _export(self):
+        path = filedialog.asksaveasfilename(parent=self.master, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")])
+        if path:
+            metrics.dump(path)
+
+def open_diagnostics(root, title, extra=None, labels=None):
+    window = ctk.CTkToplevel(root)
+    window.title(title)
+    window.geometry("1000x600")
+    return DiagnosticsPanel(window, extra=extra, labels=labels)
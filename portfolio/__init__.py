@@ -0,0 +1,2 @@
+# Headless core of the Bank Portfolio Manager: models, SQLite storage, totals, valuation and import/export.
+# Nothing here imports Tk or matplotlib; NumPy and requests are only loaded by the modules that need them.
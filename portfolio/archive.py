@@ -0,0 +1,312 @@
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from . import database, metrics, search
+from .config import load_config
+
+# Archival of closed years. Outcomes dated in a year that has ended move out of the main database into
+# one SQLite file per year ({archive_directory}/{database name}.{year}.db), taking their distributions,
+# category and search index with them, so the hot tables every view, pie and total reads only hold the
+# open years. The main database keeps a monthly rollup per card account and category of everything
+# archived (outcome_rollups), so history totals need no archive at all.
+# An outcome's date is the day it was recorded (credit_card_outcomes.date); outcomes that debit no account,
+# and ones recorded before outcomes were dated, stay in the hot tables.
+# Queries that ask for history open history(): every archive is ATTACHed and the temp views
+# all_credit_card_outcomes and all_outcome_distributions read like the hot tables, archives included.
+#
+# A year is moved in two transactions, one per file: the outcomes are copied into the archive under a
+# new run id and committed, then deleted from the main database in the same transaction that records
+# the run. (With the main database in WAL mode a transaction over several files is only atomic per file.)
+# Archived rows are visible only once the main database has recorded their run, so a move cut short
+# leaves the outcomes in the hot tables and nothing visible twice; the next move clears what it left.
+# If another connection writes between the two commits, the year is copied again.
+ARCHIVE_DIRECTORY = "archive"
+MOVE_ATTEMPTS = 3
+# Maintenance: config key -> default interval in days (0 turns the task off)
+INTERVALS = {"vacuum": ("vacuum_interval_days", 7), "analyze": ("analyze_interval_days", 1)}
+VACUUM_FREE_FRACTION = 0.25  # A VACUUM is due early once this share of the file is free pages
+# Outcomes that have debited an account; the rest stay in the hot tables whatever their date
+ARCHIVABLE = "EXISTS (SELECT 1 FROM main.outcome_distributions d WHERE d.outcome_id = o.id)"
+
+def _archive_tables(schema):
+    # The tables of an archive file; run is the archive_runs id that copied the row
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {schema}.credit_card_outcomes (
+            id INTEGER PRIMARY KEY,
+            account_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT,
+            category TEXT NOT NULL,
+            date TEXT NOT NULL,
+            run INTEGER NOT NULL
+        )
+        ''',
+        f"CREATE INDEX IF NOT EXISTS {schema}.idx_archived_outcomes_run ON credit_card_outcomes (run)",
+        f'''
+        CREATE TABLE IF NOT EXISTS {schema}.outcome_distributions (
+            outcome_id INTEGER NOT NULL,
+            account_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            run INTEGER NOT NULL,
+            PRIMARY KEY (outcome_id, account_id)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.outcomes_fts USING fts5(
+            description, content='credit_card_outcomes', content_rowid='id', {search.FTS_OPTIONS}
+        )
+        ''',
+    ]
+
+class Run:
+    def __init__(self, year, outcomes, amount, seconds, path):
+        self.year = year
+        self.outcomes = outcomes
+        self.amount = amount
+        self.seconds = seconds
+        self.path = path
+
+#MARK: - Files
+def _database_directory():
+    path = database.get_pool().path
+    if path == ':memory:':
+        raise ValueError("An in-memory database has no archives")
+    return os.path.dirname(os.path.abspath(path))
+
+def archive_path(year, directory=None):
+    # directory defaults to archive_directory from config.json, relative to the database's own directory
+    directory = os.path.join(_database_directory(), directory or load_config().get("archive_directory", ARCHIVE_DIRECTORY))
+    name = os.path.splitext(os.path.basename(database.get_pool().path))[0]
+    return os.path.join(directory, f"{name}.{year}.db")
+
+def _resolve(path):
+    # outcome_archives keeps paths relative to the database, so the two can be moved together
+    return path if os.path.isabs(path) else os.path.join(_database_directory(), path)
+
+def visible(year):
+    # Rows of an archive that belong to a committed run
+    return f"run IN (SELECT id FROM main.archive_runs WHERE year = {int(year)})"
+
+def _attach(conn, year, path):
+    schema = f"archive_{int(year)}"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+    return schema
+
+def _detach(conn, schemas):
+    if conn.in_transaction:
+        conn.rollback()
+    for schema in schemas:
+        conn.execute(f"DETACH DATABASE {schema}")
+
+#MARK: - History
+HISTORY_VIEWS = {
+    "all_credit_card_outcomes": ("credit_card_outcomes", "id, account_id, amount, description"),
+    "all_outcome_distributions": ("outcome_distributions", "outcome_id, account_id, amount"),
+}
+_HOT_TABLE = re.compile(r'(?<![.\w])(credit_card_outcomes|outcome_distributions)\b')
+
+def history_sql(query):
+    # A query on the hot tables rewritten to read the history views, which have the same columns
+    return _HOT_TABLE.sub(lambda match: f"all_{match.group(1)}", query)
+
+def archives():
+    # [(year, outcomes, amount, path)], oldest first
+    with database.connection() as conn:
+        return [(year, outcomes, amount, _resolve(path)) for year, outcomes, amount, path in conn.execute(
+            'SELECT year, outcomes, amount, path FROM outcome_archives ORDER BY year')]
+
+def schemas(conn):
+    # [(year, schema)] of the archives attached to conn, newest first
+    return sorted(((int(name[len("archive_"):]), name) for _, name, _ in conn.execute("PRAGMA database_list")
+                   if name.startswith("archive_")), reverse=True)
+
+@contextmanager
+def history():
+    # A pooled connection with every archive attached and the history views over them. Not inside batch():
+    # SQLite cannot ATTACH within a transaction.
+    with database.connection() as conn:
+        years = conn.execute('SELECT year, path FROM outcome_archives ORDER BY year').fetchall()
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(years) > limit:
+            raise ValueError(f"{len(years)} archived years exceed SQLite's limit of {limit} attached databases")
+        attached = []
+        try:
+            for year, path in years:
+                path = _resolve(path)
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"The archive of {year} is missing: {path}")
+                attached.append((year, _attach(conn, year, path)))
+            for view, (table, columns) in HISTORY_VIEWS.items():
+                parts = [f"SELECT {columns} FROM main.{table}"]
+                parts += [f"SELECT {columns} FROM {schema}.{table} WHERE {visible(year)}" for year, schema in attached]
+                conn.execute(f"CREATE TEMP VIEW {view} AS {' UNION ALL '.join(parts)}")
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            for view in HISTORY_VIEWS:
+                conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+            _detach(conn, [schema for _, schema in attached])
+
+#MARK: - Moving
+def _stale(schema, year):
+    return f"SELECT id FROM {schema}.credit_card_outcomes WHERE NOT {visible(year)}"
+
+def _copy(conn, schema, year):
+    # First transaction: the year's outcomes into the archive under a new run id.
+    # Returns (main data_version, run, outcomes, amount).
+    start, end = f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+    conn.execute("BEGIN IMMEDIATE")  # Holds off other writers to the main database while the rows are read
+    version = conn.execute("PRAGMA main.data_version").fetchone()[0]
+    run = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM main.archive_runs").fetchone()[0]
+    # Rows of a move that never committed are invisible; clear them first
+    conn.execute(f'''
+        INSERT INTO {schema}.outcomes_fts (outcomes_fts, rowid, description)
+        SELECT 'delete', id, description FROM {schema}.credit_card_outcomes WHERE id IN ({_stale(schema, year)})
+    ''')
+    conn.execute(f"DELETE FROM {schema}.outcome_distributions WHERE outcome_id IN ({_stale(schema, year)})")
+    conn.execute(f"DELETE FROM {schema}.credit_card_outcomes WHERE id IN ({_stale(schema, year)})")
+    conn.execute(f'''
+        INSERT INTO {schema}.credit_card_outcomes (id, account_id, amount, description, category, date, run)
+        SELECT o.id, o.account_id, o.amount, o.description, COALESCE(c.category, '{search.UNCATEGORIZED}'), o.date, ?
+        FROM main.credit_card_outcomes o LEFT JOIN main.outcome_categories c ON c.outcome_id = o.id
+        WHERE o.date >= ? AND o.date < ? AND {ARCHIVABLE}
+    ''', (run, start, end))
+    conn.execute(f'''
+        INSERT INTO {schema}.outcome_distributions (outcome_id, account_id, amount, run)
+        SELECT d.outcome_id, d.account_id, d.amount, a.run
+        FROM {schema}.credit_card_outcomes a JOIN main.outcome_distributions d ON d.outcome_id = a.id WHERE a.run = ?
+    ''', (run,))
+    conn.execute(f'''
+        INSERT INTO {schema}.outcomes_fts (rowid, description)
+        SELECT id, description FROM {schema}.credit_card_outcomes WHERE run = ?
+    ''', (run,))
+    outcomes, amount = conn.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM {schema}.credit_card_outcomes WHERE run = ?
+    ''', (run,)).fetchone()
+    conn.commit()  # Only the archive has changed, so only the archive commits
+    return version, run, outcomes, amount
+
+def _remove(conn, schema, year, path, version, run, outcomes, amount):
+    # Second transaction: the copied outcomes out of the main database, their rollups in and the run recorded.
+    # False when another connection has written to the main database since the copy.
+    conn.execute("BEGIN IMMEDIATE")
+    if conn.execute("PRAGMA main.data_version").fetchone()[0] != version:
+        conn.rollback()
+        return False
+    moved = f"SELECT id FROM {schema}.credit_card_outcomes WHERE run = {int(run)}"
+    conn.execute(f'''
+        INSERT INTO main.outcome_rollups (month, account_id, category, amount, outcomes)
+        SELECT substr(date, 1, 7), account_id, category, SUM(amount), COUNT(*)
+        FROM {schema}.credit_card_outcomes WHERE run = ? GROUP BY 1, 2, 3
+        ON CONFLICT (month, account_id, category) DO UPDATE
+        SET amount = amount + excluded.amount, outcomes = outcomes + excluded.outcomes
+    ''', (run,))
+    conn.execute(f"DELETE FROM main.outcome_distributions WHERE outcome_id IN ({moved})")
+    conn.execute(f"DELETE FROM main.credit_card_outcomes WHERE id IN ({moved})")
+    relative = os.path.relpath(path, _database_directory())
+    conn.execute('''
+        INSERT INTO main.outcome_archives (year, path, outcomes, amount) VALUES (?, ?, ?, ?)
+        ON CONFLICT (year) DO UPDATE
+        SET path = excluded.path, outcomes = outcomes + excluded.outcomes, amount = amount + excluded.amount
+    ''', (year, relative, outcomes, amount))
+    conn.execute('INSERT INTO main.archive_runs (id, year, date, outcomes, amount) VALUES (?, ?, ?, ?, ?)',
+                 (run, year, datetime.now().isoformat(timespec="seconds"), outcomes, amount))
+    conn.commit()
+    return True
+
+def _move_year(conn, year, path):
+    new = not os.path.exists(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    schema = _attach(conn, year, path)
+    try:
+        if new:
+            # Written once a year and read now and then: a rollback journal keeps each archive a single file
+            conn.execute(f"PRAGMA {schema}.journal_mode=DELETE")
+            for statement in _archive_tables(schema):
+                conn.execute(statement)
+        for _ in range(MOVE_ATTEMPTS):
+            version, run, outcomes, amount = _copy(conn, schema, year)
+            if _remove(conn, schema, year, path, version, run, outcomes, amount):
+                conn.execute(f"ANALYZE {schema}")
+                return outcomes, amount
+        raise sqlite3.OperationalError(f"The outcomes of {year} kept changing while they were archived; try again")
+    finally:
+        _detach(conn, [schema])
+
+@metrics.instrument(rows=lambda runs: sum(run.outcomes for run in runs))
+def archive_outcomes(before_year, directory=None, log=None):
+    # Moves every outcome dated before January 1st of before_year into the archive of its year and returns
+    # a Run per year moved. Only years that have ended can be archived. Run it where no PortfolioCache
+    # holds the outcomes (the CLI, or the GUI on exit), as with imports.
+    if before_year > date.today().year:
+        raise ValueError(f"{before_year - 1} has not ended yet")
+    runs = []
+    with database.connection() as conn:
+        try:
+            years = [int(year) for year, in conn.execute(f'''
+                SELECT DISTINCT substr(o.date, 1, 4) FROM credit_card_outcomes o
+                WHERE o.date != '' AND o.date < ? AND {ARCHIVABLE} ORDER BY 1
+            ''', (f"{before_year:04d}-01-01",))]
+            for year in years:
+                start = time.perf_counter()
+                path = archive_path(year, directory)
+                outcomes, amount = _move_year(conn, year, path)
+                runs.append(Run(year, outcomes, amount, time.perf_counter() - start, path))
+                if log:
+                    log(f"{year}: {outcomes:,} outcomes ({amount:,.2f}) to {path} in {runs[-1].seconds:.2f} s")
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+    if runs:
+        search.sync_index()  # The search index drops the moved outcomes now rather than at the next search
+    return runs
+
+#MARK: - Maintenance
+def _due(conn, task, config, now):
+    key, default = INTERVALS[task]
+    days = config.get(key, default)
+    if not days:
+        return False
+    if task == "vacuum":
+        free, pages = conn.execute("SELECT * FROM pragma_freelist_count, pragma_page_count").fetchone()
+        if pages and free / pages >= VACUUM_FREE_FRACTION:
+            return True
+    last = conn.execute('SELECT last_run FROM maintenance WHERE task = ?', (task,)).fetchone()
+    return last is None or now - datetime.fromisoformat(last[0]) >= timedelta(days=days)
+
+@metrics.instrument(rows=len)
+def maintain(force=False, config=None):
+    # VACUUM, then ANALYZE, of the main database when due (see INTERVALS), or both with force; returns
+    # [(task, seconds)]. VACUUM rewrites the whole file and holds the write lock while it does.
+    config = config if config is not None else load_config()
+    done = []
+    with database.connection() as conn:
+        for task in INTERVALS:
+            now = datetime.now()
+            if not force and not _due(conn, task, config, now):
+                continue
+            start = time.perf_counter()
+            conn.execute(task.upper())
+            if task == "vacuum":
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # VACUUM writes every page through the WAL
+            seconds = time.perf_counter() - start
+            conn.execute('''
+                INSERT INTO maintenance (task, last_run, seconds) VALUES (?, ?, ?)
+                ON CONFLICT (task) DO UPDATE SET last_run = excluded.last_run, seconds = excluded.seconds
+            ''', (task, now.isoformat(timespec="seconds"), seconds))
+            conn.commit()
+            done.append((task, seconds))
+    return done
+
+def run_scheduled(config=None, log=None, force=False):
+    # Whatever is due: the years past archive_keep_years (when set; 1 keeps only the current year), then
+    # maintain(). For cron (python -m portfolio maintain) and the GUI on exit. Returns (runs, maintenance).
+    config = config if config is not None else load_config()
+    keep = config.get("archive_keep_years")
+    runs = archive_outcomes(date.today().year - keep + 1, log=log) if keep else []
+    return runs, maintain(force, config)
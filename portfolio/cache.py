@@ -0,0 +1,844 @@
+import array
+import atexit
+import bisect
+import json
+import math
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from . import database, ledger, metrics
+from .models import CreditCardOutcome
+
+# In-memory columnar copy of accounts, outcomes and assets. Each table is loaded once into array.array
+# columns (8 bytes per number, text dictionary-encoded to a 4-byte code per row), reads, totals, chart
+# data and valuation positions are served from memory, and writes land in memory first: changed ids are
+# tracked per table and written to SQLite in one transaction per flush (on a timer, before anything
+# reads the tables with SQL, and at exit); triggers, history and totals in SQLite catch up on flush.
+# Other programs (the HTTP API, the CLI) may write the same file meanwhile, so a flush merges rather than
+# overwrites: only the columns that changed are written, balances move by journal entries applied as
+# deltas (the outcome entries are worked out against the distributions SQLite has), new rows get their
+# ids from SQLite, and the tables are read again after a flush that finds someone else has committed.
+FLUSH_INTERVAL = 2.0  # Seconds between write-behind flushes
+FLUSH_ATTEMPTS = 3  # Failed flushes in a row after which edits are refused until one succeeds
+MAX_BACKOFF = 60.0  # Longest wait between flushes while they keep failing
+COMPACT_RATIO = 0.25  # Deleted fraction of a table's rows that triggers compaction
+TEXT = 's'  # Column kind for dictionary-encoded text
+NAN = float('nan')
+
+ACCOUNT_COLUMNS = (("account_type", TEXT), ("currency", TEXT), ("exchange_rate", 'd'), ("balance", 'd'),
+                   ("income_percentage", 'd'), ("date", TEXT))
+# dist_start/dist_count locate an outcome's distributions in the shared distribution arrays; they are not stored as columns in SQLite
+OUTCOME_COLUMNS = (("account_id", 'q'), ("amount", 'd'), ("description", TEXT), ("dist_start", 'q'), ("dist_count", 'I'))
+ASSET_COLUMNS = (("name", TEXT), ("quantity", 'd'), ("price_per_unit", 'd'))
+# Columns a flush inserts, besides a new account's opening balance
+INSERT_COLUMNS = {
+    "accounts": ("account_type", "currency", "exchange_rate", "income_percentage", "date"),
+    "credit_card_outcomes": ("account_id", "amount", "description"),
+    "assets": ("name", "quantity", "price_per_unit"),
+}
+
+#MARK: - Columns
+class Strings:
+    # Dictionary encoding: every distinct value is stored once and rows hold its code
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class Table:
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+        self.ids = array.array('q')  # Increasing, so rows are found by binary search
+        self.alive = bytearray()
+        self.kinds = dict(columns)
+        self.data = {column: array.array('I' if kind == TEXT else kind) for column, kind in columns}
+        self.strings = {column: Strings() for column, kind in columns if kind == TEXT}
+        self.dead = 0
+        # Ids up to stored are rows SQLite has. Rows added since are numbered on from stored + 1 until a
+        # flush inserts them in that order and SQLite hands out consecutive ids, so they all move by the
+        # same amount (shift).
+        self.stored = 0
+        self.next_id = 1
+        self.dirty = {}  # id -> 'insert' | 'delete' | set of changed columns, since the last flush
+
+    def __len__(self):
+        return len(self.ids) - self.dead
+
+    def find(self, row_id):
+        index = self.position(row_id)
+        return index if index is not None and self.alive[index] else None
+
+    def position(self, row_id):
+        # Index of the row, deleted or not
+        index = bisect.bisect_left(self.ids, row_id)
+        return index if index < len(self.ids) and self.ids[index] == row_id else None
+
+    def append(self, row_id, values):
+        self.ids.append(row_id)
+        self.alive.append(1)
+        for (column, kind), value in zip(self.columns, values):
+            self.data[column].append(self._encode(column, kind, value))
+        self.next_id = max(self.next_id, row_id + 1)
+        return len(self.ids) - 1
+
+    def set(self, index, **values):
+        # Returns the columns whose value changed
+        changed = set()
+        for column, value in values.items():
+            value, current = self._encode(column, self.kinds[column], value), self.data[column][index]
+            if value != current and not (value != value and current != current):  # NaN is None
+                changed.add(column)
+            self.data[column][index] = value
+        return changed
+
+    def get(self, index, column):
+        value = self.data[column][index]
+        if column in self.strings:
+            return self.strings[column].values[value]
+        return None if isinstance(value, float) and math.isnan(value) else value
+
+    def row(self, index, columns=None):
+        return tuple(self.get(index, column) for column in columns or self.data)
+
+    def kill(self, index):
+        self.alive[index] = 0
+        self.dead += 1
+
+    def indices(self):
+        return (index for index, alive in enumerate(self.alive) if alive)
+
+    def mark(self, row_id, change):
+        # Folds a new change into the pending one: an insert stays an insert until flushed (a row deleted
+        # before then is still inserted and deleted, so every provisional id is written), a delete replaces
+        # an update, and updates add up their columns
+        pending = self.dirty.get(row_id)
+        if pending == 'insert' or not change:
+            return
+        if isinstance(pending, set) and isinstance(change, set):
+            change = pending | change
+        self.dirty[row_id] = change
+
+    def shift(self, delta, inserted):
+        # Moves the provisional ids by delta once the first inserted of them are in SQLite
+        start = bisect.bisect_right(self.ids, self.stored)
+        if delta:
+            for index in range(start, len(self.ids)):
+                self.ids[index] += delta
+            self.dirty = {row_id + delta if row_id > self.stored else row_id: change for row_id, change in self.dirty.items()}
+            self.next_id += delta
+        self.stored += inserted + delta
+
+    def _encode(self, column, kind, value):
+        if kind == TEXT:
+            return self.strings[column].encode(value)
+        if value is None:
+            return NAN
+        return value
+
+    def compact(self):
+        if self.dead <= COMPACT_RATIO * len(self.ids):
+            return
+        # Provisional rows are kept until they are written, deleted or not
+        keep = [index for index, alive in enumerate(self.alive) if alive or self.ids[index] > self.stored]
+        self.ids = array.array('q', (self.ids[index] for index in keep))
+        for column, values in self.data.items():
+            self.data[column] = array.array(values.typecode, (values[index] for index in keep))
+        self.alive = bytearray(self.alive[index] for index in keep)
+        self.dead = len(keep) - sum(self.alive)
+
+    def memory_bytes(self):
+        total = len(self.ids) * self.ids.itemsize + len(self.alive)
+        total += sum(len(values) * values.itemsize for values in self.data.values())
+        for strings in self.strings.values():
+            total += sum(sys.getsizeof(value) for value in strings.values) + sys.getsizeof(strings._codes)
+        return total
+
+    def as_numpy(self, column):
+        # A column (codes for text) as a NumPy array of the live rows. Always a copy: an array.array
+        # cannot grow while a buffer view of it is alive.
+        return self._numpy(self.data[column])
+
+    def as_numpy_ids(self):
+        return self._numpy(self.ids)
+
+    def _numpy(self, values):
+        import numpy as np
+        view = np.frombuffer(values, dtype=values.typecode)
+        return view[np.frombuffer(self.alive, dtype=bool)] if self.dead else view.copy()
+
+#MARK: - Portfolio Cache
+class PortfolioCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._conn_lock = threading.Lock()  # Taken last, for the connection below
+        self._conn = None
+        self._data_version = None  # PRAGMA data_version when the tables were read
+        self._loaded = False
+        self._failures = 0  # Flushes in a row that failed
+        self._timer = None
+        self._stop = threading.Event()
+        self.version = 0  # Bumped by every write and reload, so a chart drawn at one version is still current while it holds
+        self.last_error = None  # Of the last flush, while they are failing
+
+    @contextmanager
+    def _connection(self):
+        # A connection of the cache's own: its PRAGMA data_version moves only when another connection
+        # commits, so a flush can tell whether anyone else has written since the tables were read
+        with self._conn_lock:
+            if self._conn is None:
+                path = database.get_pool().path
+                if path == ':memory:':
+                    raise ValueError("The cache needs a database file; every :memory: connection is a separate database")
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                for pragma in database.PRAGMAS:
+                    self._conn.execute(pragma)
+            yield self._conn
+
+    def _changed_outside(self, conn):
+        return conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version
+
+    def _load(self):
+        # Called with the lock held; the tables are read on first use so startup never waits on them
+        if self._loaded:
+            return
+        self.accounts = Table("accounts", ACCOUNT_COLUMNS)
+        self.outcomes = Table("credit_card_outcomes", OUTCOME_COLUMNS)
+        self.assets = Table("assets", ASSET_COLUMNS)
+        self.dist_accounts = array.array('q')
+        self.dist_amounts = array.array('d')
+        self.dist_live = 0  # Entries still referenced by a live outcome
+        self.paid_by_account = {}  # account id -> total it has paid toward outcomes
+        self.journal = []  # ledger.Entry for every opening and adjustment since the last flush
+        with self._connection() as conn:
+            conn.execute('BEGIN')  # One snapshot for every table
+            try:
+                self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+                for row in conn.execute('''
+                    SELECT id, account_type, currency, exchange_rate, balance, income_percentage, date FROM accounts ORDER BY id
+                '''):
+                    self.accounts.append(row[0], row[1:])
+                for row in conn.execute('SELECT id, account_id, amount, description FROM credit_card_outcomes ORDER BY id'):
+                    self.outcomes.append(row[0], row[1:] + (0, 0))
+                # Distributions arrive grouped by outcome, so each outcome's run is contiguous
+                previous, index = None, None
+                for outcome_id, account_id, amount in conn.execute('''
+                    SELECT outcome_id, account_id, amount FROM outcome_distributions ORDER BY outcome_id, account_id
+                '''):
+                    if outcome_id != previous:
+                        previous, index = outcome_id, self.outcomes.find(outcome_id)
+                        if index is not None:
+                            self.outcomes.set(index, dist_start=len(self.dist_accounts), dist_count=0)
+                    if index is None:
+                        continue
+                    self.outcomes.data["dist_count"][index] += 1
+                    self.dist_accounts.append(account_id)
+                    self.dist_amounts.append(amount)
+                    self.dist_live += 1
+                    self.paid_by_account[account_id] = self.paid_by_account.get(account_id, 0.0) + amount
+                for row in conn.execute('SELECT id, name, quantity, price_per_unit FROM assets ORDER BY id'):
+                    self.assets.append(row[0], row[1:])
+            finally:
+                conn.rollback()
+        for table in (self.accounts, self.outcomes, self.assets):
+            table.stored = table.next_id - 1
+        self.total_money = math.fsum(self.accounts.data["balance"])
+        self.total_outcome = math.fsum(self.outcomes.data["amount"])
+        self._loaded = True
+
+    def _ready(self):
+        self._load()
+        return self
+
+    def _writable(self):
+        # Called with the lock held by every edit. Once flushes keep failing, edits are refused until one
+        # succeeds, rather than accepted and never saved.
+        if self._failures >= FLUSH_ATTEMPTS:
+            raise RuntimeError(f"Changes cannot be saved right now, so editing is paused: {self.last_error}")
+        return self._ready()
+
+    def write_error(self):
+        # The error that has paused editing, None while flushes succeed
+        with self._lock:
+            return self.last_error if self._failures >= FLUSH_ATTEMPTS else None
+
+    #MARK: Accounts
+    @metrics.instrument("cache.add_account")
+    def add_account(self, account):
+        with self._lock:
+            self._writable()
+            row_id = self.accounts.next_id
+            self.accounts.append(row_id, (account.account_type, account.currency, account.exchange_rate, account.balance,
+                                          account.income_percentage, datetime.now().strftime("%Y-%m-%d")))
+            self.accounts.mark(row_id, 'insert')
+            self.version += 1
+            self.journal.append(ledger.opening(row_id, account.balance))
+            self.total_money += account.balance
+            return row_id
+
+    @metrics.instrument("cache.get_accounts", rows=len)
+    def get_accounts(self):
+        # Same (id, account_type, currency, exchange_rate, balance, income_percentage, date) rows as store.get_accounts
+        with self._lock:
+            table = self._ready().accounts
+            return [(table.ids[index],) + table.row(index) for index in table.indices()]
+
+    @metrics.instrument("cache.update_account")
+    def update_account(self, account_id, account):
+        with self._lock:
+            table = self._writable().accounts
+            index = table.find(account_id)
+            if index is None:
+                return
+            change = account.balance - table.get(index, "balance")
+            self.journal.append(ledger.adjustment(account_id, change))
+            self.total_money += change
+            changed = table.set(index, account_type=account.account_type, currency=account.currency, exchange_rate=account.exchange_rate,
+                                balance=account.balance, income_percentage=account.income_percentage)
+            # The balance reaches SQLite as the adjustment, on top of whatever else has moved it
+            table.mark(account_id, changed)
+            self.version += 1
+
+    @metrics.instrument("cache.delete_account")
+    def delete_account(self, account_id):
+        with self._lock:
+            table = self._writable().accounts
+            index = table.find(account_id)
+            if index is None:
+                return
+            # The closing entry is posted on flush, for the balance SQLite has then
+            self.total_money -= table.get(index, "balance")
+            table.kill(index)
+            table.mark(account_id, 'delete')
+            self.version += 1
+
+    #MARK: Credit Card Outcomes
+    def _distributions(self, index):
+        start, count = self.outcomes.data["dist_start"][index], self.outcomes.data["dist_count"][index]
+        return dict(zip(self.dist_accounts[start:start + count], self.dist_amounts[start:start + count]))
+
+    def _set_distributions(self, index, distributions):
+        # Distributions are append-only; a rewritten outcome points at its new run and the old one is dropped at compaction
+        previous = self._distributions(index)
+        for account_id, amount in previous.items():
+            self.paid_by_account[account_id] -= amount
+        self.dist_live += len(distributions) - len(previous)
+        self.outcomes.set(index, dist_start=len(self.dist_accounts), dist_count=len(distributions))
+        for account_id, amount in distributions.items():
+            self.dist_accounts.append(int(account_id))
+            self.dist_amounts.append(amount)
+            self.paid_by_account[int(account_id)] = self.paid_by_account.get(int(account_id), 0.0) + amount
+
+    def _pay(self, old, new):
+        # Moves the paying accounts' balances as store does. The journal entry is worked out on flush,
+        # from the distributions SQLite has then to the ones the outcome has.
+        for account_id, amount in ledger.outcome_postings(old, new).items():
+            index = self.accounts.find(account_id) if account_id > 0 else None
+            if index is not None and amount:
+                self.accounts.set(index, balance=self.accounts.get(index, "balance") + amount)
+                self.total_money += amount
+
+    @metrics.instrument("cache.add_credit_card_outcome")
+    def add_credit_card_outcome(self, outcome):
+        with self._lock:
+            table = self._writable().outcomes
+            row_id = table.next_id
+            index = table.append(row_id, (outcome.account_id, outcome.amount, outcome.description, 0, 0))
+            self._set_distributions(index, outcome.account_distributions)
+            self._pay({}, outcome.account_distributions)
+            table.mark(row_id, 'insert')
+            self.version += 1
+            self.total_outcome += outcome.amount
+            return row_id
+
+    @metrics.instrument("cache.get_credit_card_outcomes", rows=len)
+    def get_credit_card_outcomes(self):
+        # Same rows as store.get_credit_card_outcomes, distributions as a JSON object
+        with self._lock:
+            table = self._ready().outcomes
+            return [(table.ids[index], table.get(index, "account_id"), table.get(index, "amount"), table.get(index, "description"),
+                     json.dumps(self._distributions(index), separators=(',', ':')))
+                    for index in table.indices()]
+
+    @metrics.instrument("cache.get_credit_card_outcome")
+    def get_credit_card_outcome(self, outcome_id):
+        with self._lock:
+            table = self._ready().outcomes
+            index = table.find(outcome_id)
+            if index is None:
+                return None
+            return CreditCardOutcome(table.get(index, "account_id"), table.get(index, "amount"), table.get(index, "description"),
+                                     self._distributions(index))
+
+    def get_account_outcome_total(self, account_id):
+        with self._lock:
+            return self._ready().paid_by_account.get(account_id, 0.0)
+
+    @metrics.instrument("cache.update_credit_card_outcome")
+    def update_credit_card_outcome(self, outcome_id, outcome):
+        with self._lock:
+            table = self._writable().outcomes
+            index = table.find(outcome_id)
+            if index is None:
+                return
+            self.total_outcome += outcome.amount - table.get(index, "amount")
+            changed = table.set(index, account_id=outcome.account_id, amount=outcome.amount, description=outcome.description)
+            distributions = {int(account_id): amount for account_id, amount in outcome.account_distributions.items()}
+            if distributions != self._distributions(index):
+                self._pay(self._distributions(index), distributions)
+                self._set_distributions(index, distributions)
+                changed.add("distributions")
+            table.mark(outcome_id, changed)
+            self.version += 1
+
+    @metrics.instrument("cache.delete_credit_card_outcome")
+    def delete_credit_card_outcome(self, outcome_id):
+        with self._lock:
+            table = self._writable().outcomes
+            index = table.find(outcome_id)
+            if index is None:
+                return
+            # Credit every paying account back, as store.delete_credit_card_outcome does
+            self._pay(self._distributions(index), {})
+            self._set_distributions(index, {})
+            self.total_outcome -= table.get(index, "amount")
+            table.kill(index)
+            table.mark(outcome_id, 'delete')
+            self.version += 1
+
+    #MARK: Assets
+    @metrics.instrument("cache.add_asset")
+    def add_asset(self, asset):
+        with self._lock:
+            table = self._writable().assets
+            row_id = table.next_id
+            table.append(row_id, (asset.name, asset.quantity, asset.price_per_unit))
+            table.mark(row_id, 'insert')
+            self.version += 1
+            return row_id
+
+    @metrics.instrument("cache.get_assets", rows=len)
+    def get_assets(self):
+        with self._lock:
+            table = self._ready().assets
+            return [(table.ids[index],) + table.row(index) for index in table.indices()]
+
+    @metrics.instrument("cache.update_asset")
+    def update_asset(self, asset_id, asset):
+        with self._lock:
+            table = self._writable().assets
+            index = table.find(asset_id)
+            if index is None:
+                return
+            table.mark(asset_id, table.set(index, name=asset.name, quantity=asset.quantity, price_per_unit=asset.price_per_unit))
+            self.version += 1
+
+    @metrics.instrument("cache.delete_asset")
+    def delete_asset(self, asset_id):
+        with self._lock:
+            table = self._writable().assets
+            index = table.find(asset_id)
+            if index is None:
+                return
+            table.kill(index)
+            table.mark(asset_id, 'delete')
+            self.version += 1
+
+    #MARK: Totals, Positions and Chart Data
+    def calculate_total_money(self):
+        with self._lock:
+            return self._ready().total_money
+
+    def calculate_total_outcome(self):
+        with self._lock:
+            return self._ready().total_outcome
+
+    def _account_rates(self, account_ids):
+        # Stored exchange rate of each given account id, 1.0 where the account no longer exists (as the SQL LEFT JOIN)
+        import numpy as np
+        ids, rates = self.accounts.as_numpy_ids(), self.accounts.as_numpy("exchange_rate")
+        if not len(ids):
+            return np.ones(len(account_ids))
+        positions = np.searchsorted(ids, account_ids).clip(0, len(ids) - 1)
+        return np.where(ids[positions] == account_ids, rates[positions], 1.0)
+
+    def _paid(self, table):
+        # Sum of each live outcome's distributions, from the shared distribution arrays
+        import numpy as np
+        amounts = np.frombuffer(self.dist_amounts, dtype='d') if len(self.dist_amounts) else np.zeros(1)
+        cumulative = np.concatenate(([0.0], np.cumsum(amounts)))
+        starts, counts = table.as_numpy("dist_start"), table.as_numpy("dist_count").astype(np.int64)
+        return cumulative[starts + counts] - cumulative[starts]
+
+    @metrics.instrument("cache.positions")
+    def positions(self):
+        # valuation.Positions built from the columns, for value_portfolio and the projection
+        import numpy as np
+        from .valuation import Positions, ACCOUNT_DTYPE, ASSET_DTYPE, OUTCOME_DTYPE
+        with self._lock:
+            accounts_table, outcomes_table, assets_table = self._ready().accounts, self.outcomes, self.assets
+            currency_codes = accounts_table.as_numpy("currency")
+            currency_names = np.array([str(value).upper() for value in accounts_table.strings["currency"].values] or [''],
+                                      dtype=ACCOUNT_DTYPE['currency'])
+            accounts = np.empty(len(accounts_table), dtype=ACCOUNT_DTYPE)
+            accounts['id'] = accounts_table.as_numpy_ids()
+            accounts['balance'] = accounts_table.as_numpy("balance")
+            accounts['exchange_rate'] = accounts_table.as_numpy("exchange_rate")
+            accounts['income_percentage'] = np.nan_to_num(accounts_table.as_numpy("income_percentage"))
+            accounts['currency'] = currency_names[currency_codes]
+            assets = np.empty(len(assets_table), dtype=ASSET_DTYPE)
+            assets['id'] = assets_table.as_numpy_ids()
+            assets['quantity'] = assets_table.as_numpy("quantity")
+            assets['price_per_unit'] = assets_table.as_numpy("price_per_unit")
+            outcomes = np.empty(len(outcomes_table), dtype=OUTCOME_DTYPE)
+            outcomes['id'] = outcomes_table.as_numpy_ids()
+            outcomes['amount'] = outcomes_table.as_numpy("amount")
+            outcomes['unpaid'] = np.maximum(outcomes['amount'] - self._paid(outcomes_table), 0)
+            outcomes['exchange_rate'] = self._account_rates(outcomes_table.as_numpy("account_id"))
+        return Positions(accounts, assets, outcomes, np.unique(accounts['currency']))
+
+    @metrics.instrument("cache.money_breakdown", rows=len)
+    def money_breakdown(self, group='account', top_n=None, scale=1.0):
+        # Same slices as chart_data.money_breakdown, grouped in NumPy instead of SQL
+        from .chart_data import MONEY_GROUPS, TOP_N
+        if group not in MONEY_GROUPS:
+            raise ValueError(f"Unknown grouping: {group}. Expected one of {', '.join(MONEY_GROUPS)}")
+        with self._lock:
+            table = self._ready().accounts
+            values = table.as_numpy("balance") * table.as_numpy("exchange_rate")
+            if group == 'account':
+                return _top_slices(table.as_numpy_ids(), values,
+                                   lambda key: f"ID: {key}, Type: {table.get(table.find(key), 'account_type')}", top_n or TOP_N, scale)
+            column = 'account_type' if group == 'account_type' else 'currency'
+            names = table.strings[column].values
+            if group == 'currency':
+                names = [str(name).upper() for name in names]
+            keys, labels = _merge_codes(table.as_numpy(column), names)
+            return _top_slices(keys, values, labels.__getitem__, top_n or TOP_N, scale)
+
+    @metrics.instrument("cache.outcome_breakdown", rows=len)
+    def outcome_breakdown(self, group='outcome', top_n=None, scale=1.0):
+        from .chart_data import OUTCOME_GROUPS, TOP_N
+        if group not in OUTCOME_GROUPS:
+            raise ValueError(f"Unknown grouping: {group}. Expected one of {', '.join(OUTCOME_GROUPS)}")
+        with self._lock:
+            table = self._ready().outcomes
+            account_ids = table.as_numpy("account_id")
+            values = table.as_numpy("amount") * self._account_rates(account_ids)
+            if group == 'outcome':
+                return _top_slices(table.as_numpy_ids(), values,
+                                   lambda key: f"ID: {key}, Desc: {table.get(table.find(key), 'description') or ''}", top_n or TOP_N, scale)
+            if group == 'account':
+                def label(key):
+                    index = self.accounts.find(int(key))
+                    return f"Card: {key}" + (f", {self.accounts.get(index, 'account_type')}" if index is not None else "")
+                return _top_slices(account_ids, values, label, top_n or TOP_N, scale)
+            descriptions = table.strings["description"].values
+            normalized = [(description or '').strip().lower() for description in descriptions]
+            keys, groups = _merge_codes(table.as_numpy("description"), normalized)
+            # Label each group with its smallest original spelling, like MIN(o.description)
+            spellings = {}
+            for name, norm in zip(descriptions, normalized):
+                if name is not None and (norm not in spellings or name < spellings[norm]):
+                    spellings[norm] = name
+            return _top_slices(keys, values, lambda key: spellings.get(groups[key], ''), top_n or TOP_N, scale)
+
+    #MARK: Write-Behind
+    @metrics.instrument("cache.flush", rows=lambda count: count)
+    def flush(self):
+        # Writes every change since the last flush in one transaction; returns the number of rows written
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if not self._loaded:
+                return 0
+            tables = (self.accounts, self.outcomes, self.assets)
+            pending = [list(table.dirty.items()) for table in tables]
+            if not any(pending) and not self.journal:
+                # Nothing to write, but someone else may have
+                with self._connection() as conn:
+                    if self._changed_outside(conn):
+                        self._unload()
+                return 0
+            writes = [[(row_id, change, self._snapshot(table, row_id, change)) for row_id, change in changes]
+                      + [(row_id, 'delete', None) for row_id, change in changes if change == 'insert' and table.find(row_id) is None]
+                      for table, changes in zip(tables, pending)]
+            provisional = [(table.stored, table.next_id) for table in tables]
+            journal, self.journal = self.journal, []
+            for table in tables:
+                table.dirty.clear()
+        try:
+            with self._connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                with conn:
+                    outside = self._changed_outside(conn)
+                    shifts = _write(conn, provisional, writes, journal)
+        except Exception as error:
+            with self._lock:
+                # Nothing was written: the changes go back ahead of anything newer and are tried again,
+                # however long that takes, since every edit has already been reported as done
+                self.journal = journal + self.journal
+                for table, changes in zip(tables, pending):
+                    newer, table.dirty = table.dirty, {}
+                    for row_id, change in changes + list(newer.items()):
+                        table.mark(row_id, change)
+                self._failures += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+            raise
+        with self._lock:
+            self._failures = 0
+            self.last_error = None
+            if shifts[0][0]:
+                self._move_accounts(self.accounts.stored, self.accounts.next_id, shifts[0][0])
+            for table, (shift, inserted) in zip(tables, shifts):
+                table.shift(shift, inserted)
+                table.compact()
+            if any(shift for shift, _ in shifts):
+                self.version += 1
+            self._compact_distributions()
+            if outside and not any(table.dirty for table in tables) and not self.journal:
+                self._unload()
+        return sum(len(changes) for changes in pending)
+
+    def _move_accounts(self, stored, end, shift):
+        # Called with the lock held once SQLite has given the provisional accounts (ids stored + 1 to end - 1)
+        # their ids: every reference to one moves with it. Ids of accounts that never existed stay as they are.
+        def moved(account_id):
+            return account_id + shift if stored < account_id < end else account_id
+        for values in (self.dist_accounts, self.outcomes.data["account_id"]):
+            for index, account_id in enumerate(values):
+                if stored < account_id < end:
+                    values[index] = account_id + shift
+        self.paid_by_account = {moved(account_id): amount for account_id, amount in self.paid_by_account.items()}
+        for entry in self.journal:
+            entry.postings = {moved(account_id): amount for account_id, amount in entry.postings.items()}
+
+    def _compact_distributions(self):
+        # Rewritten and deleted outcomes leave their old runs behind; copy the live runs once enough have piled up
+        if len(self.dist_accounts) - self.dist_live <= COMPACT_RATIO * len(self.dist_accounts):
+            return
+        accounts, amounts = array.array('q'), array.array('d')
+        starts, counts = self.outcomes.data["dist_start"], self.outcomes.data["dist_count"]
+        for index in self.outcomes.indices():
+            start, count = starts[index], counts[index]
+            starts[index] = len(accounts)
+            accounts.extend(self.dist_accounts[start:start + count])
+            amounts.extend(self.dist_amounts[start:start + count])
+        self.dist_accounts, self.dist_amounts = accounts, amounts
+
+    def _snapshot(self, table, row_id, change):
+        # Column values to write for one change, read under the lock. Balances are not among them: they
+        # reach SQLite as journal entries.
+        if change == 'delete':
+            return None
+        index = table.position(row_id)
+        columns = INSERT_COLUMNS[table.name] if change == 'insert' else change - {"balance", "distributions"}
+        values = {column: table.get(index, column) for column in columns}
+        if table is self.outcomes and (change == 'insert' or "distributions" in change):
+            values["distributions"] = self._distributions(index) if table.alive[index] else {}
+        return values
+
+    def _unload(self):
+        # Called with the lock held; the tables are read again on next use
+        self._loaded = False
+        self.version += 1
+
+    def invalidate(self):
+        # Pending changes are written first; the tables are re-read on next use (after an import, say)
+        with self._flush_lock:
+            self._flush()
+            with self._lock:
+                self._unload()
+
+    def start(self, interval=FLUSH_INTERVAL):
+        if self._timer is None:
+            self._stop.clear()
+            self._timer = threading.Thread(target=self._run, args=(interval,), name="cache-flush", daemon=True)
+            self._timer.start()
+        return self
+
+    def _run(self, interval):
+        # The wait doubles after every failed flush, up to MAX_BACKOFF, and is back to interval after a success
+        delay = interval
+        while not self._stop.wait(delay):
+            try:
+                self.flush()
+                delay = interval
+            except Exception as e:
+                delay = min(delay * 2, MAX_BACKOFF)
+                print(f"Write-behind flush failed, retrying in {delay:.0f} s: {e}")
+
+    def close(self):
+        # The final flush is tried FLUSH_ATTEMPTS times with the same backoff. If it still fails the error is
+        # raised with the changes kept, so the caller can try again or tell the user.
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        delay = FLUSH_INTERVAL
+        for attempt in range(FLUSH_ATTEMPTS):
+            try:
+                self.invalidate()
+                break
+            except Exception:
+                if attempt == FLUSH_ATTEMPTS - 1:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        with self._lock:
+            failures = {"failed_flushes": self._failures, "last_error": self.last_error}
+            if not self._loaded:
+                return {"loaded": False, **failures}
+            tables = (self.accounts, self.outcomes, self.assets)
+            return {
+                "rows": {table.name: len(table) for table in tables},
+                "dirty": {table.name: len(table.dirty) for table in tables},
+                "memory_mb": round(self.memory_bytes() / 2**20, 1),
+                **failures,
+            }
+
+    def memory_bytes(self):
+        with self._lock:
+            self._ready()
+            distributions = len(self.dist_accounts) * 8 + len(self.dist_amounts) * 8
+            return sum(table.memory_bytes() for table in (self.accounts, self.outcomes, self.assets)) + distributions
+
+#MARK: - Helpers
+def _merge_codes(codes, names):
+    # Dictionary codes -> dense group ids for codes whose names collide (e.g. 'usd' and 'USD'); returns (keys, group names)
+    import numpy as np
+    groups = sorted(set(names))
+    position = {name: index for index, name in enumerate(groups)}
+    mapping = np.array([position[name] for name in names] or [0], dtype=np.intp)
+    return mapping[codes], groups
+
+def _top_slices(keys, values, label, top_n, scale):
+    import numpy as np
+    from .chart_data import Slice
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse.reshape(-1), weights=values, minlength=len(unique))
+    positive = np.flatnonzero(totals > 0)
+    order = positive[np.argsort(-totals[positive], kind='stable')]
+    top, rest = order[:top_n], order[top_n:]
+    slices = [Slice(label(unique[index].item()), float(totals[index]) * scale, 1) for index in top]
+    if len(rest):
+        slices.append(Slice(None, float(totals[rest].sum()) * scale, len(rest)))
+    return slices
+
+def _insert(conn, table, stored, changes):
+    # New rows in id order with their ids left to SQLite; returns (how far the provisional ids move, rows inserted)
+    columns = INSERT_COLUMNS[table] + (("balance",) if table == "accounts" else ())
+    rows = sorted((row_id, values) for row_id, change, values in changes if change == 'insert')
+    if not rows:
+        return 0, 0
+    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                     [tuple(values.get(column, 0.0) for column in columns) for _, values in rows])
+    # SQLite hands out the ids consecutively while the transaction holds the write lock
+    first = conn.execute('SELECT last_insert_rowid()').fetchone()[0] - len(rows) + 1
+    return first - (stored + 1), len(rows)
+
+def _update(conn, table, changes):
+    # Only the columns that changed, one statement per set of them. A row someone else deleted meanwhile stays deleted.
+    statements = {}
+    for row_id, change, values in changes:
+        columns = tuple(sorted(column for column in values or () if column != "distributions")) if isinstance(change, set) else ()
+        if columns:
+            statements.setdefault(columns, []).append(tuple(values[column] for column in columns) + (row_id,))
+    for columns, rows in statements.items():
+        conn.executemany(f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?", rows)
+
+def _existing(conn, table, ids):
+    return {row[0] for row in conn.execute(f'SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?))',
+                                           (json.dumps(sorted(ids)),))}
+
+def _write(conn, provisional, writes, journal):
+    # One flush in the caller's transaction, merged with whatever others have committed since the tables
+    # were read. provisional is (stored, next_id) per table; returns (shift, inserted) per table for Table.shift.
+    ((stored_accounts, end), (stored_outcomes, _), (stored_assets, _)), (accounts, outcomes, assets) = provisional, writes
+    # The cache only opens the accounts it adds, so each is inserted with its opening balance, as store
+    # does; every other entry moves balances on flush
+    balances = {}
+    for entry in journal:
+        if entry.kind == 'opening':
+            balances.update((account_id, amount) for account_id, amount in entry.postings.items() if account_id > 0)
+    for row_id, change, values in accounts:
+        if change == 'insert':
+            values["balance"] = balances.get(row_id, 0.0)
+    account_shift = _insert(conn, "accounts", stored_accounts, accounts)
+    def account(account_id):
+        return account_id + account_shift[0] if stored_accounts < account_id < end else account_id
+    _update(conn, "accounts", accounts)
+
+    for _, _, values in outcomes:
+        if values and "account_id" in values:
+            values["account_id"] = account(values["account_id"])
+        if values and "distributions" in values:
+            values["distributions"] = {account(int(account_id)): amount for account_id, amount in values["distributions"].items()}
+    outcome_shift = _insert(conn, "credit_card_outcomes", stored_outcomes, outcomes)
+    def outcome(outcome_id):
+        return outcome_id + outcome_shift[0] if outcome_id > stored_outcomes else outcome_id
+    _update(conn, "credit_card_outcomes", outcomes)
+    # The journal entry of an outcome goes from the distributions SQLite has to the cache's, as store does
+    distributions = {outcome(row_id): values["distributions"] if values else {} for row_id, change, values in outcomes
+                     if change == 'delete' or "distributions" in values}
+    existing = _existing(conn, "credit_card_outcomes", distributions)
+    distributions = {outcome_id: new for outcome_id, new in distributions.items() if outcome_id in existing}
+    old = {}
+    for outcome_id, account_id, amount in conn.execute('''
+        SELECT outcome_id, account_id, amount FROM outcome_distributions WHERE outcome_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(sorted(distributions)),)):
+        old.setdefault(outcome_id, {})[account_id] = amount
+    distributions = {outcome_id: new for outcome_id, new in distributions.items() if new != old.get(outcome_id, {})}
+    conn.executemany("DELETE FROM outcome_distributions WHERE outcome_id = ?", [(outcome_id,) for outcome_id in distributions])
+    conn.executemany("INSERT INTO outcome_distributions (outcome_id, account_id, amount) VALUES (?, ?, ?)",
+                     [(outcome_id, account_id, amount) for outcome_id, new in distributions.items() for account_id, amount in new.items()])
+    entries = [ledger.Entry(entry.kind, {account(account_id): amount for account_id, amount in entry.postings.items()}, date=entry.date)
+               for entry in journal]
+    ledger.post(conn, [entry for entry in entries if entry.kind == 'opening'], apply=False)
+    entries = [entry for entry in entries if entry.kind != 'opening']
+    entries += [ledger.outcome_entry(outcome_id, old.get(outcome_id, {}), new) for outcome_id, new in distributions.items()]
+    # Applied as deltas, so a balance someone else has moved meanwhile keeps that change too
+    ledger.post(conn, entries)
+    conn.executemany("DELETE FROM credit_card_outcomes WHERE id = ?", [(outcome(row_id),) for row_id, change, _ in outcomes if change == 'delete'])
+
+    # A deleted account closes with the balance SQLite has, posted while the account still exists
+    deleted = [account(row_id) for row_id, change, _ in accounts if change == 'delete']
+    closings = conn.execute('SELECT id, balance FROM accounts WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(deleted),)).fetchall()
+    ledger.post(conn, [ledger.closing(account_id, balance) for account_id, balance in closings], apply=False)
+    conn.executemany("DELETE FROM accounts WHERE id = ?", [(account_id,) for account_id in deleted])
+
+    asset_shift = _insert(conn, "assets", stored_assets, assets)
+    _update(conn, "assets", assets)
+    conn.executemany("DELETE FROM assets WHERE id = ?", [(row_id + asset_shift[0] if row_id > stored_assets else row_id,)
+                                                         for row_id, change, _ in assets if change == 'delete'])
+    return account_shift, outcome_shift, asset_shift
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PortfolioCache()
+                atexit.register(_cache.close)
+    return _cache
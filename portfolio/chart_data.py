@@ -0,0 +1,105 @@
+from . import database, metrics
+
+# Pie data is aggregated in SQL and cut down to the largest groups, so the number of wedges and
+# labels drawn stays bounded however many accounts or outcomes there are.
+TOP_N = 10
+MIN_LABEL_PERCENT = 2.0  # Smaller wedges are drawn without a label or percentage
+
+# Grouping dimension -> (SQL key, SQL label). Values are converted to BASE_CURRENCY with the stored account rates.
+MONEY_GROUPS = {
+    'account': ('id', "'ID: ' || id || ', Type: ' || account_type"),
+    'account_type': ('account_type', 'account_type'),
+    'currency': ('UPPER(currency)', 'UPPER(currency)'),
+}
+OUTCOME_GROUPS = {
+    'outcome': ('o.id', "'ID: ' || o.id || ', Desc: ' || o.description"),
+    'account': ('o.account_id', "'Card: ' || o.account_id || COALESCE(', ' || a.account_type, '')"),
+    'description': ('LOWER(TRIM(o.description))', 'MIN(o.description)'),
+}
+
+MONEY_SOURCE = 'FROM accounts'
+OUTCOME_SOURCE = 'FROM credit_card_outcomes o LEFT JOIN accounts a ON a.id = o.account_id'
+MONEY_VALUE = 'balance * exchange_rate'
+OUTCOME_VALUE = 'o.amount * COALESCE(a.exchange_rate, 1.0)'
+
+# The top_n largest groups come from a LIMIT sort; everything else collapses into one row with a NULL label.
+# Groups that net to zero or less have no wedge to draw and are left out, as before.
+TOP_N_SQL = '''
+    WITH grouped AS MATERIALIZED (
+        SELECT {label} AS label, SUM({value}) AS total {source} GROUP BY {key} HAVING total > 0
+    ), top AS (
+        SELECT label, total FROM grouped ORDER BY total DESC LIMIT :top_n
+    )
+    SELECT label, total, 1 FROM top
+    UNION ALL
+    SELECT NULL, (SELECT SUM(total) FROM grouped) - (SELECT SUM(total) FROM top),
+           (SELECT COUNT(*) FROM grouped) - (SELECT COUNT(*) FROM top)
+'''
+
+class Slice:
+    def __init__(self, label, value, count):
+        self.label = label  # None for the "Other" bucket
+        self.value = value
+        self.count = count  # Groups merged into this slice
+
+    @property
+    def is_other(self):
+        return self.label is None
+
+def _breakdown(groups, group, source, value, top_n, scale):
+    if group not in groups:
+        raise ValueError(f"Unknown grouping: {group}. Expected one of {', '.join(groups)}")
+    key, label = groups[group]
+    query = TOP_N_SQL.format(label=label, value=value, source=source, key=key)
+    with database.connection() as conn:
+        rows = conn.execute(query, {'top_n': top_n}).fetchall()
+    slices = [Slice(label, total * scale, count) for label, total, count in rows if count]
+    # Largest first, with "Other" last whatever its size
+    return sorted(slices, key=lambda s: (s.is_other, -s.value))
+
+@metrics.instrument(rows=len)
+def money_breakdown(group='account', top_n=TOP_N, scale=1.0):
+    # scale converts BASE_CURRENCY into the reporting currency (1 / valuation.rate)
+    return _breakdown(MONEY_GROUPS, group, MONEY_SOURCE, MONEY_VALUE, top_n, scale)
+
+@metrics.instrument(rows=len)
+def outcome_breakdown(group='outcome', top_n=TOP_N, scale=1.0):
+    return _breakdown(OUTCOME_GROUPS, group, OUTCOME_SOURCE, OUTCOME_VALUE, top_n, scale)
+
+#MARK: - Label Decimation
+def decimated_labels(slices, other_label):
+    total = sum(s.value for s in slices)
+    labels = []
+    for s in slices:
+        if total and 100 * s.value / total < MIN_LABEL_PERCENT:
+            labels.append('')
+        elif s.is_other:
+            labels.append(f"{other_label} ({s.count})")
+        else:
+            labels.append(str(s.label))
+    return labels
+
+def decimated_autopct(percent):
+    # Module-level so PieChart sees the same autopct between updates and can move wedges in place
+    return f'{percent:1.1f}%' if percent >= MIN_LABEL_PERCENT else ''
+
+#MARK: - Pie Data
+def no_data_autopct(percent):
+    return '0.0%' if percent == 100 else ''
+
+def pie_data(slices, texts):
+    # (sizes, labels, autopct); texts is one language of translations.LANG_DICT
+    if not slices:
+        return [1], [texts["no_data"]], no_data_autopct
+    return [s.value for s in slices], decimated_labels(slices, texts["other"]), decimated_autopct
+
+def money_pie(slices, valuation, texts):
+    # PieChart.set_data arguments; wedges are balances converted into the reporting currency
+    sizes, labels, autopct = pie_data(slices, texts)
+    return (sizes, labels, texts["total_money_distribution"],
+            f"{texts['total_money']}: {valuation.accounts_total:,.2f} {valuation.reporting_currency}", autopct)
+
+def outcome_pie(slices, valuation, texts):
+    sizes, labels, autopct = pie_data(slices, texts)
+    return (sizes, labels, texts["total_outcome_distribution"],
+            f"{texts['total_debt']}: {valuation.debt_total:,.2f} {valuation.reporting_currency}", autopct)
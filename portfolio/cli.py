@@ -0,0 +1,253 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import date
+from . import archive, database, history, importer, exporter, metrics, search, store, summary
+from .config import BASE_CURRENCY
+
+# python -m portfolio <command>: the same data as the GUI without Tk, matplotlib or a display
+LISTS = {
+    "accounts": (store.get_accounts, ("id", "account_type", "currency", "exchange_rate", "balance", "income_percentage", "date")),
+    "outcomes": (store.get_credit_card_outcomes, ("id", "account_id", "amount", "description", "account_distributions")),
+    "assets": (store.get_assets, ("id", "name", "quantity", "price_per_unit")),
+}
+
+def list_command(args):
+    fetch, header = LISTS[args.kind]
+    rows = fetch()
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerow(header)
+    writer.writerows(rows if args.limit is None else rows[:args.limit])
+
+def totals_command(args):
+    # Balances are kept per currency, so the total is converted into one before they are added up
+    money_currency = (args.reporting_currency or BASE_CURRENCY).upper()
+    print(f"Total money: {history.total_money(money_currency):,.2f} {money_currency}")
+    print(f"Total outcome: {store.calculate_total_outcome():,.2f}")
+    for dimension in ("currency", "account_type"):
+        for key, total in sorted(summary.get_totals(dimension).items()):
+            print(f"  {dimension} {key}: {total:,.2f}")
+    if args.reporting_currency:
+        from .valuation import load_positions, value_portfolio
+        valuation = value_portfolio(load_positions(), args.reporting_currency)
+        currency = valuation.reporting_currency
+        print(f"Net worth: {valuation.net_worth:,.2f} {currency}")
+        print(f"Monthly income: {valuation.monthly_income_total:,.2f} {currency}")
+    if args.history:
+        # From the main database alone: each archive's totals are kept next to its rollups
+        for year, outcomes, amount, _ in archive.archives():
+            print(f"  archived {year}: {amount:,.2f} ({outcomes:,} outcomes)")
+
+def project_command(args):
+    from .valuation import load_positions
+    from .projection import project
+    projection = project(load_positions(), args.months, args.paths, args.workers, args.seed,
+                         reporting_currency=args.reporting_currency)
+    currency = projection.reporting_currency
+    print(f"{projection.paths:,} paths over {args.months} months in {projection.seconds:.2f} s "
+          f"({projection.paths_per_second:,.0f} paths/s, {projection.workers} process(es))")
+    print("month\t" + "\t".join(f"p{q:g} ({currency})" for q in projection.quantiles))
+    for month in range(0, args.months + 1, 12):
+        print(f"{projection.dates[month].astype('datetime64[M]')}\t" + "\t".join(f"{value:,.2f}" for value in projection.bands[:, month]))
+
+def search_command(args):
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerow(search.RESULT_COLUMNS)
+    results = search.search_outcomes(args.query, args.category, args.limit, history=args.history)
+    writer.writerows(results.rows)
+    if args.query:
+        order = "best first" if results.ranked else "newest first"
+        print(f"{len(results.rows)} of {results.matches} matches, {order}", file=sys.stderr)
+
+def categories_command(args):
+    if args.add:
+        rule_id, moved = search.add_rule(*args.add, priority=args.priority)
+        print(f"Rule {rule_id} added, {moved} outcomes re-categorized")
+    if args.delete is not None:
+        print(f"Rule {args.delete} deleted, {search.delete_rule(args.delete)} outcomes re-categorized")
+    if args.rules:
+        for rule_id, category, pattern, priority in search.get_rules():
+            print(f"{rule_id}\t{category}\t{pattern}\t{priority}")
+        return
+    for category, total, count in search.get_category_totals(args.history):
+        print(f"{category}: {total:,.2f} ({count} outcomes)")
+
+def rates_command(args):
+    from . import rate_history
+    if args.path:
+        print(f"Loaded {rate_history.load_rates_file(args.path)} rates from {args.path}")
+    else:
+        rates = rate_history.fetch_latest()
+        rate_history.record_rates(rates, args.date, source="api")
+        for currency, rate in sorted(rates.items()):
+            print(f"{currency}\t{rate:,.6f}")
+    if args.revalue:
+        revalue_command(args)
+
+def revalue_command(args):
+    from . import rate_history
+    updated = rate_history.revalue(args.date)
+    for currency, count in sorted(updated.items()):
+        print(f"{currency}: {count} accounts re-priced")
+    print(f"{sum(updated.values())} accounts re-priced at the rates of {args.date or 'today'}")
+
+def networth_command(args):
+    from . import rate_history
+    valuation = rate_history.value_on(args.date, args.reporting_currency)
+    currency = valuation.reporting_currency
+    print(f"Net worth on {args.date}: {valuation.net_worth:,.2f} {currency}")
+    for held, value in valuation.exposure_by_currency().items():
+        print(f"  {held}: {value:,.2f} {currency}")
+
+def export_command(args):
+    start = time.perf_counter()
+    count = exporter.export_file(args.path, args.kind, args.format, history=args.history)
+    seconds = time.perf_counter() - start
+    print(f"Exported {count} {args.kind} to {args.path} in {seconds:.2f} s ({count / max(seconds, 1e-9):,.0f} rows/s)")
+
+def snapshot_command(args):
+    from . import snapshot
+    if args.info:
+        loaded = snapshot.load_snapshot(args.path)
+        print(f"Snapshot of {loaded.manifest['database']} taken {loaded.manifest['created']}")
+        for name, table in loaded.tables.items():
+            print(f"  {name}: {len(table):,} rows ({', '.join(table.columns)})")
+        return
+    manifest = snapshot.write_snapshot(args.path)
+    rows = sum(table["rows"] for table in manifest["tables"].values())
+    for name, table in manifest["tables"].items():
+        print(f"  {name}: {table['rows']:,} rows")
+    print(f"Wrote {rows:,} rows to {args.path} in {manifest['seconds']:.2f} s ({rows / max(manifest['seconds'], 1e-9):,.0f} rows/s)")
+
+def archive_command(args):
+    if args.list:
+        for year, outcomes, amount, path in archive.archives():
+            size = os.path.getsize(path) / 2**20 if os.path.exists(path) else float("nan")
+            print(f"{year}\t{outcomes:,} outcomes\t{amount:,.2f}\t{size:,.1f} MB\t{path}")
+        return
+    before = args.before_year or date.today().year - args.keep_years + 1
+    runs = archive.archive_outcomes(before, args.directory, log=print)
+    print(f"Archived {sum(run.outcomes for run in runs):,} outcomes dated before {before}")
+    maintain_command(args)
+
+def maintain_command(args):
+    if getattr(args, "scheduled", False):
+        _, done = archive.run_scheduled(log=print, force=args.force)
+    else:
+        done = archive.maintain(force=args.force)
+    for task, seconds in done:
+        print(f"{task.upper()} in {seconds:.2f} s")
+
+def serve_command(args):
+    from . import server
+    server.serve(args.host, args.port, args.workers, args.max_batch)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m portfolio", description="Bank Portfolio Manager without the GUI")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    parser.add_argument("--metrics", help="Record call metrics and write them here when done (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--profile", help="Profile the instrumented calls with cProfile and save the stats here")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="Print accounts, outcomes or assets as tab-separated rows")
+    list_parser.add_argument("kind", choices=LISTS)
+    list_parser.add_argument("--limit", type=int)
+    list_parser.set_defaults(handler=list_command)
+
+    totals_parser = commands.add_parser("totals", help="Print the maintained portfolio totals")
+    totals_parser.add_argument("--reporting-currency", help="Currency of the total money; also values the portfolio in it (loads NumPy)")
+    totals_parser.add_argument("--history", action="store_true", help="Also print the archived years")
+    totals_parser.set_defaults(handler=totals_command)
+
+    import_parser = commands.add_parser("import", help="Bulk import a CSV, QIF or OFX file")
+    importer.add_arguments(import_parser)
+    import_parser.set_defaults(handler=importer.run)
+
+    project_parser = commands.add_parser("project", help="Monte Carlo projection of net worth, printed yearly (loads NumPy)")
+    project_parser.add_argument("--months", type=int, default=120)
+    project_parser.add_argument("--paths", type=int, default=20_000)
+    project_parser.add_argument("--workers", type=int, help="Processes to use (default: every core)")
+    project_parser.add_argument("--seed", type=int)
+    project_parser.add_argument("--reporting-currency", default="TRY")
+    project_parser.set_defaults(handler=project_command)
+
+    search_parser = commands.add_parser("search", help="Full-text search of outcome descriptions, best matches first")
+    search_parser.add_argument("query", nargs="?", default="", help='Words to match; "a phrase" and prefix* work too')
+    search_parser.add_argument("--category", help="Only outcomes in this category (all of them when there is no query)")
+    search_parser.add_argument("--limit", type=int, default=100)
+    search_parser.add_argument("--history", action="store_true", help="Search the archived years too, after the open ones")
+    search_parser.set_defaults(handler=search_command)
+
+    categories_parser = commands.add_parser("categories", help="Print outcome totals per category, or edit the rules")
+    categories_parser.add_argument("--add", nargs=2, metavar=("CATEGORY", "PATTERN"), help="Add a rule; PATTERN is a LIKE pattern such as %%market%%")
+    categories_parser.add_argument("--priority", type=int, default=0, help="Rules with a higher priority are tried first")
+    categories_parser.add_argument("--delete", type=int, metavar="RULE_ID")
+    categories_parser.add_argument("--rules", action="store_true", help="List the rules instead of the totals")
+    categories_parser.add_argument("--history", action="store_true", help="Include the archived years")
+    categories_parser.set_defaults(handler=categories_command)
+
+    rates_parser = commands.add_parser("rates", help="Record exchange rates from a CSV/JSON file, or fetch today's")
+    rates_parser.add_argument("path", nargs="?", help="CSV (date,currency,rate) or JSON {date: {currency: rate}}; fetch when omitted")
+    rates_parser.add_argument("--date", help="Date to record fetched rates under (default: today)")
+    rates_parser.add_argument("--revalue", action="store_true", help="Re-price every account afterwards")
+    rates_parser.set_defaults(handler=rates_command)
+
+    revalue_parser = commands.add_parser("revalue", help="Re-price every account at the recorded rates in effect on a date")
+    revalue_parser.add_argument("--date", help="YYYY-MM-DD (default: today)")
+    revalue_parser.set_defaults(handler=revalue_command)
+
+    networth_parser = commands.add_parser("networth", help="Net worth on a past date from the balance history and rates (loads NumPy)")
+    networth_parser.add_argument("date", help="YYYY-MM-DD")
+    networth_parser.add_argument("--reporting-currency", default="TRY")
+    networth_parser.set_defaults(handler=networth_command)
+
+    export_parser = commands.add_parser("export", help="Write accounts, outcomes or assets to CSV (the import format) or JSON Lines")
+    export_parser.add_argument("kind", choices=exporter.KINDS)
+    export_parser.add_argument("path", help=".jsonl or .ndjson for JSON Lines, CSV otherwise")
+    export_parser.add_argument("--format", choices=exporter.FORMATS, help="Overrides the extension")
+    export_parser.add_argument("--history", action="store_true", help="Include the archived outcomes")
+    export_parser.set_defaults(handler=export_command)
+
+    snapshot_parser = commands.add_parser("snapshot", help="Write every table to a memory-mappable columnar snapshot (loads NumPy)")
+    snapshot_parser.add_argument("path", help="Directory to write, replaced if it exists")
+    snapshot_parser.add_argument("--info", action="store_true", help="Describe an existing snapshot instead")
+    snapshot_parser.set_defaults(handler=snapshot_command)
+
+    archive_parser = commands.add_parser("archive", help="Move the outcomes of closed years into per-year archive files")
+    archive_parser.add_argument("--keep-years", type=int, default=1, help="Years kept in the main database, this one included")
+    archive_parser.add_argument("--before-year", type=int, help="Archive every year before this one instead")
+    archive_parser.add_argument("--directory", help="Where the archives go (default: archive_directory from config.json)")
+    archive_parser.add_argument("--list", action="store_true", help="List the archives instead")
+    archive_parser.add_argument("--force", action="store_true", help="VACUUM and ANALYZE afterwards even if not due")
+    archive_parser.set_defaults(handler=archive_command)
+
+    maintain_parser = commands.add_parser("maintain", help="Run VACUUM and ANALYZE when due (for cron)")
+    maintain_parser.add_argument("--force", action="store_true", help="Run both now")
+    maintain_parser.add_argument("--scheduled", action="store_true",
+                                 help="Also archive the years past archive_keep_years from config.json, as the GUI does on exit")
+    maintain_parser.set_defaults(handler=maintain_command)
+
+    serve_parser = commands.add_parser("serve", help="Serve the portfolio as a local HTTP/JSON API")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    serve_parser.add_argument("--workers", type=int, default=4, help="Threads answering reads")
+    serve_parser.add_argument("--max-batch", type=int, default=256, help="Most writes committed together (1 commits each alone)")
+    serve_parser.set_defaults(handler=serve_command)
+
+    args = parser.parse_args(argv)
+    if args.database:
+        database.configure(args.database)
+    if args.metrics:
+        metrics.enable()
+    if args.profile:
+        metrics.start_profile()
+    try:
+        store.create_database()
+        args.handler(args)
+    finally:
+        if args.profile:
+            print(metrics.stop_profile(args.profile), file=sys.stderr)
+        if args.metrics:
+            metrics.dump(args.metrics)
@@ -0,0 +1,24 @@
+import json
+
+CONFIG_FILE = 'config.json'
+# Currency that accounts.exchange_rate and recorded exchange rates are prices in
+BASE_CURRENCY = "TRY"
+
+def load_config():
+    try:
+        with open(CONFIG_FILE, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_config(config):
+    with open(CONFIG_FILE, 'w') as file:
+        json.dump(config, file)
+
+def get_exchange_rate(currency, quote=BASE_CURRENCY):
+    # Served from the shared rate cache; returns None when no rate could be fetched
+    from .rates import get_rate_cache
+    rate = get_rate_cache().get(currency, quote)
+    if rate is None:
+        print(f"Failed to fetch exchange rate for {currency}.")
+    return rate
@@ -0,0 +1,144 @@
+import atexit
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from .config import load_config
+
+DEFAULT_DATABASE_PATH = 'bank_portfolio.db'
+DEFAULT_POOL_SIZE = 4
+CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+
+# Applied once to every pooled connection
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # WAL stays consistent, commits no longer fsync
+    "PRAGMA cache_size=-16000",  # ~16 MB page cache
+    "PRAGMA busy_timeout=5000",
+)
+
+#MARK: - Connection Pool
+class ConnectionPool:
+    def __init__(self, path, size=DEFAULT_POOL_SIZE):
+        self.path = path
+        # Every ":memory:" connection is a separate database, so never hand out more than one
+        self.size = 1 if path == ':memory:' else max(1, size)
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
+
+_pool = None
+_pool_lock = threading.Lock()
+_batch = threading.local()  # The connection of the batch() open on this thread, if any
+
+def _new_pool(path=None, pool_size=None):
+    config = load_config()
+    return ConnectionPool(path or config.get("database_path", DEFAULT_DATABASE_PATH),
+                          pool_size or config.get("database_pool_size", DEFAULT_POOL_SIZE))
+
+def configure(path=None, pool_size=None):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = _new_pool(path, pool_size)
+    return _pool
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _new_pool()
+    return _pool
+
+def close():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+atexit.register(close)
+
+#MARK: - Connection Helpers
+@contextmanager
+def connection():
+    conn = getattr(_batch, 'conn', None)
+    if conn is not None:
+        yield conn
+        return
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def transaction():
+    # Commits on success and rolls back on error, returning the connection to the pool either way.
+    # Inside batch() it is a savepoint instead, undone on error without touching the rest of the batch.
+    # The write lock is taken up front, so what the caller reads before writing (an old balance, say)
+    # cannot change under it before it commits.
+    conn = getattr(_batch, 'conn', None)
+    if conn is not None:
+        conn.execute('SAVEPOINT batch_item')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK TO batch_item')
+            raise
+        finally:
+            conn.execute('RELEASE batch_item')
+        return
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            yield conn
+
+@contextmanager
+def batch():
+    # One write transaction for every connection() and transaction() on this thread until it exits,
+    # so many small writes share one commit
+    if getattr(_batch, 'conn', None) is not None:
+        yield _batch.conn
+        return
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _batch.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            _batch.conn = None
@@ -0,0 +1,91 @@
+import csv
+import os
+from . import archive, database, metrics
+
+# Rows are read off the cursor CHUNK_SIZE at a time and written before the next chunk is fetched, so
+# memory stays the same whatever the size of the table. See snapshot.py for the columnar format.
+CHUNK_SIZE = 10_000
+
+# Same columns the CSV importer reads, so an export can be imported back as is
+EXPORT_SQL = {
+    "accounts": ('''
+        SELECT account_type, currency, exchange_rate, balance, income_percentage, date FROM accounts ORDER BY id
+    ''', ("account_type", "currency", "exchange_rate", "balance", "income_percentage", "date")),
+    "outcomes": ('''
+        SELECT o.account_id, o.amount, o.description,
+               (SELECT group_concat(d.account_id || ':' || d.amount, ';')
+                FROM outcome_distributions d WHERE d.outcome_id = o.id)
+        FROM credit_card_outcomes o ORDER BY o.id
+    ''', ("account_id", "amount", "description", "account_distributions")),
+    "assets": ('''
+        SELECT name, quantity, price_per_unit FROM assets ORDER BY id
+    ''', ("name", "quantity", "price_per_unit")),
+}
+KINDS = tuple(EXPORT_SQL)
+
+# JSON Lines: one object per row with its id, built by SQLite; distributions become {"account id": amount}
+JSONL_SQL = {
+    "accounts": '''
+        SELECT json_object('id', id, 'account_type', account_type, 'currency', currency, 'exchange_rate', exchange_rate,
+                           'balance', balance, 'income_percentage', income_percentage, 'date', date)
+        FROM accounts ORDER BY id
+    ''',
+    "outcomes": '''
+        SELECT json_object('id', o.id, 'account_id', o.account_id, 'amount', o.amount, 'description', o.description,
+                           'account_distributions', json((SELECT json_group_object(d.account_id, d.amount)
+                                                          FROM outcome_distributions d WHERE d.outcome_id = o.id)))
+        FROM credit_card_outcomes o ORDER BY o.id
+    ''',
+    "assets": '''
+        SELECT json_object('id', id, 'name', name, 'quantity', quantity, 'price_per_unit', price_per_unit)
+        FROM assets ORDER BY id
+    ''',
+}
+FORMATS = ("csv", "jsonl")
+
+def _chunks(query, chunk_size, history=False):
+    # With history the archived years are read too (see archive.py), oldest ids first as ever
+    with archive.history() if history else database.connection() as conn:
+        cursor = conn.execute(archive.history_sql(query) if history else query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+def export_rows(kind):
+    # Header, then rows straight from the cursor without materializing the table
+    if kind not in EXPORT_SQL:
+        raise ValueError(f"Unknown export kind: {kind}")
+    query, header = EXPORT_SQL[kind]
+    yield header
+    for rows in _chunks(query, CHUNK_SIZE):
+        yield from rows
+
+def detect_format(path):
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson") else "csv"
+
+@metrics.instrument(rows=lambda count: count)
+def export_file(path, kind, fmt=None, chunk_size=CHUNK_SIZE, history=False):
+    # Returns the number of rows written; the format follows the extension unless given.
+    # history adds the archived outcomes (it only changes what "outcomes" exports).
+    if kind not in EXPORT_SQL:
+        raise ValueError(f"Unknown export kind: {kind}")
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        if fmt == "jsonl":
+            for rows in _chunks(JSONL_SQL[kind], chunk_size, history):
+                file.write("\n".join(row[0] for row in rows))
+                file.write("\n")
+                count += len(rows)
+            return count
+        query, header = EXPORT_SQL[kind]
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for rows in _chunks(query, chunk_size, history):
+            writer.writerows(rows)
+            count += len(rows)
+    return count
@@ -0,0 +1,142 @@
+import json
+from . import database, metrics
+from .config import BASE_CURRENCY, get_exchange_rate
+
+# Balance history. Every change to an account balance appends a row to balance_snapshots
+# (closing balance, the change and the account's currency); triggers fold the change into per-day and
+# per-month rollups kept per currency, so the total money on any day is a running sum over balance_daily.
+# Each currency's changes are converted at its current rate (the one stored on its accounts, else the
+# latest recorded) into the reporting currency, so the last point is today's total of the accounts as
+# valuation prices them. Snapshots written before currencies were recorded, of accounts deleted since,
+# count in BASE_CURRENCY.
+
+def rebuild_rollups(conn):
+    conn.execute('DELETE FROM balance_daily')
+    conn.execute('DELETE FROM balance_monthly')
+    conn.execute('''
+        INSERT INTO balance_daily (date, currency, change, snapshots)
+        SELECT date, currency, SUM(change), COUNT(*) FROM balance_snapshots GROUP BY date, currency
+    ''')
+    conn.execute('''
+        INSERT INTO balance_monthly (month, currency, change, snapshots)
+        SELECT substr(date, 1, 7), currency, SUM(change), SUM(snapshots) FROM balance_daily GROUP BY 1, 2
+    ''')
+
+#MARK: - Reads
+# A rollup row's change in BASE_CURRENCY, with the rates ({currency: price in BASE_CURRENCY}) bound as JSON
+RATES_JOIN = "LEFT JOIN json_each(?) r ON r.key = currency"
+VALUE = "change * COALESCE(r.value, 1.0)"
+
+def currency_rates(conn, reporting_currency=BASE_CURRENCY):
+    # ({currency: price in BASE_CURRENCY} for every currency in the history, price of the reporting currency)
+    reporting_currency = reporting_currency.upper()
+    rates = {currency: rate for currency, rate in conn.execute('''
+        SELECT c.currency, COALESCE(
+            (SELECT AVG(exchange_rate) FROM accounts WHERE UPPER(currency) = c.currency),
+            (SELECT rate FROM exchange_rates WHERE currency = c.currency ORDER BY date DESC LIMIT 1))
+        FROM (SELECT DISTINCT currency FROM balance_monthly UNION SELECT ?) c
+    ''', (reporting_currency,)) if rate}
+    rates[BASE_CURRENCY] = 1.0
+    rate = rates.get(reporting_currency) or get_exchange_rate(reporting_currency, BASE_CURRENCY)
+    if not rate:
+        raise ValueError(f"No exchange rate available for {reporting_currency}")
+    return rates, rate
+
+def _opening_total(conn, start, rates):
+    # Total before start: whole months from balance_monthly, then the days of start's month
+    month = start[:7]
+    return conn.execute(f'''
+        SELECT (SELECT COALESCE(SUM({VALUE}), 0) FROM balance_monthly {RATES_JOIN} WHERE month < ?)
+             + (SELECT COALESCE(SUM({VALUE}), 0) FROM balance_daily {RATES_JOIN} WHERE date >= ? AND date < ?)
+    ''', (rates, month, rates, f"{month}-01", start)).fetchone()[0]
+
+def money_over_time(start=None, end=None, granularity='day', reporting_currency=BASE_CURRENCY):
+    # [(date or month, total money at its close in reporting_currency)] for days/months with at least one balance change
+    if granularity not in ('day', 'month'):
+        raise ValueError(f"Unknown granularity: {granularity}")
+    table, column = ('balance_daily', 'date') if granularity == 'day' else ('balance_monthly', 'month')
+    if granularity == 'month':
+        start, end = start and start[:7], end and end[:7]
+    with database.connection() as conn:
+        rates, rate = currency_rates(conn, reporting_currency)
+        rates = json.dumps(rates)
+        opening = 0.0
+        if start:
+            opening = (_opening_total(conn, start, rates) if granularity == 'day' else conn.execute(
+                f'SELECT COALESCE(SUM({VALUE}), 0) FROM balance_monthly {RATES_JOIN} WHERE month < ?', (rates, start)).fetchone()[0])
+        return conn.execute(f'''
+            SELECT {column}, (? + SUM(SUM({VALUE})) OVER (ORDER BY {column})) / ? FROM {table} {RATES_JOIN}
+            WHERE {column} >= ? AND {column} <= ? GROUP BY {column} ORDER BY {column}
+        ''', (opening, rate, rates, start or '', end or '9999')).fetchall()
+
+@metrics.instrument()
+def total_money(reporting_currency=BASE_CURRENCY):
+    # Today's total money in reporting_currency: the balances kept per currency in portfolio_totals, each
+    # converted at the rate money_over_time uses, so it is the series' last point
+    with database.connection() as conn:
+        rates, rate = currency_rates(conn, reporting_currency)
+        totals = conn.execute('''
+            SELECT UPPER(key), SUM(total) FROM portfolio_totals WHERE dimension = 'currency' GROUP BY 1
+        ''').fetchall()
+    return sum(total * rates.get(currency, 1.0) for currency, total in totals) / rate
+
+@metrics.instrument(rows=len)
+def account_history(account_id, start=None, end=None):
+    # [(date, closing balance)] for one account, one row per day it changed
+    with database.connection() as conn:
+        return conn.execute('''
+            SELECT date, balance FROM balance_snapshots
+            WHERE id IN (
+                SELECT MAX(id) FROM balance_snapshots
+                WHERE account_id = ? AND date >= ? AND date <= ? GROUP BY date
+            )
+            ORDER BY date
+        ''', (account_id, start or '', end or '9999')).fetchall()
+
+#MARK: - Consistency Check
+def check_history(tolerance=1e-6):
+    # Returns a list of problems: rollups that disagree with the snapshots, or history that
+    # does not add up to the current balances, currency by currency
+    problems = []
+
+    def differs(a, b):
+        return abs(a - b) > tolerance * max(1.0, abs(b))
+    with database.connection() as conn:
+        daily = {(day, currency): change for day, currency, change in conn.execute('SELECT date, currency, change FROM balance_daily')}
+        for day, currency, change in conn.execute('SELECT date, currency, SUM(change) FROM balance_snapshots GROUP BY date, currency'):
+            if differs(daily.pop((day, currency), 0), change):
+                problems.append(f"balance_daily {day} {currency} does not match its snapshots")
+        problems.extend(f"balance_daily {day} {currency} has no snapshots" for (day, currency), change in daily.items() if abs(change) > tolerance)
+        totals = conn.execute('''
+            SELECT currency, SUM(daily), SUM(monthly), SUM(current) FROM (
+                SELECT currency, change AS daily, 0 AS monthly, 0 AS current FROM balance_daily
+                UNION ALL SELECT currency, 0, change, 0 FROM balance_monthly
+                UNION ALL SELECT UPPER(currency), 0, 0, balance FROM accounts
+            ) GROUP BY currency
+        ''').fetchall()
+    for currency, history_total, monthly_total, current in totals:
+        if differs(monthly_total, history_total):
+            problems.append(f"balance_monthly adds up to {monthly_total} {currency}, balance_daily to {history_total}")
+        if differs(history_total, current):
+            problems.append(f"history adds up to {history_total} {currency}, current balances to {current}")
+    return problems
+
+def repair_rollups():
+    with database.transaction() as conn:
+        rebuild_rollups(conn)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the balance history rollups against the snapshots")
+    parser.add_argument("--repair", action="store_true", help="Rebuild the rollups from balance_snapshots")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    args = parser.parse_args()
+    if args.database:
+        database.configure(args.database)
+    problems = check_history()
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problems")
+    if problems and args.repair:
+        repair_rollups()
+        print("Rollups rebuilt")
@@ -0,0 +1,283 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from datetime import datetime
+from . import database, ledger
+from .models import BankAccount, CreditCardOutcome, Asset
+from .store import create_database
+
+BATCH_SIZE = 5000  # Rows written per transaction
+MAX_REPORTED_ERRORS = 50
+
+KINDS = ("accounts", "outcomes", "assets")
+FORMATS = ("csv", "qif", "ofx")
+
+INSERT_SQL = {
+    "accounts": '''
+        INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+    "outcomes": '''
+        INSERT INTO credit_card_outcomes (account_id, amount, description)
+        VALUES (?, ?, ?)
+    ''',
+    "assets": '''
+        INSERT INTO assets (name, quantity, price_per_unit)
+        VALUES (?, ?, ?)
+    ''',
+}
+DISTRIBUTION_SQL = '''
+    INSERT INTO outcome_distributions (outcome_id, account_id, amount)
+    VALUES (?, ?, ?)
+'''
+
+class ImportRowError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+
+class ImportResult:
+    def __init__(self, kind, rows, errors, seconds):
+        self.kind = kind
+        self.rows = rows
+        self.errors = errors
+        self.seconds = seconds
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        text = f"Imported {self.rows} {self.kind} in {self.seconds:.2f} s ({self.rows_per_second:,.0f} rows/s)"
+        if self.errors:
+            text += f", skipped {len(self.errors)} rows"
+        return text
+
+#MARK: - Readers
+# Every reader yields (line number, dict of raw string fields) without loading the whole file
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+def read_qif(path):
+    record, start = {}, None
+    with open(path, encoding='utf-8-sig') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('!'):
+                continue
+            if line == '^':
+                if record:
+                    yield start, record
+                record, start = {}, None
+                continue
+            start = start or line_number
+            code, value = line[0], line[1:].strip()
+            if code in ('T', 'U'):
+                record['amount'] = value
+            elif code == 'P':
+                record['description'] = value
+            elif code == 'M':
+                record.setdefault('description', value)
+            elif code == 'D':
+                record['date'] = value
+    if record:
+        yield start, record
+
+OFX_TAG = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+def read_ofx(path):
+    # Handles both SGML (unclosed tags) and XML flavoured OFX, one <STMTTRN> block per transaction
+    record, start = None, None
+    with open(path, encoding='utf-8-sig', errors='replace') as file:
+        for line_number, line in enumerate(file, 1):
+            for closing, tag, value in OFX_TAG.findall(line):
+                tag = tag.upper()
+                if tag == 'STMTTRN':
+                    if closing and record is not None:
+                        yield start, record
+                        record = None
+                    elif not closing:
+                        record, start = {}, line_number
+                elif record is not None and not closing:
+                    value = value.strip()
+                    if tag == 'TRNAMT':
+                        record['amount'] = value
+                    elif tag == 'NAME':
+                        record['description'] = value
+                    elif tag == 'MEMO':
+                        record.setdefault('description', value)
+                    elif tag == 'DTPOSTED':
+                        record['date'] = value
+
+READERS = {"csv": read_csv, "qif": read_qif, "ofx": read_ofx}
+
+#MARK: - Validation
+def _number(row, field, line, required=True):
+    value = row.get(field, '')
+    if not value:
+        if required:
+            raise ImportRowError(line, f"missing {field}")
+        return None
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        raise ImportRowError(line, f"invalid {field} {value!r}")
+
+def _text(row, field, line):
+    value = row.get(field, '')
+    if not value:
+        raise ImportRowError(line, f"missing {field}")
+    return value
+
+def _distributions(value, line):
+    # Accepts JSON ({"2": 100}) or "account_id:amount" pairs separated by ';'
+    if not value:
+        return {}
+    try:
+        if value.startswith('{'):
+            return {int(k): float(v) for k, v in json.loads(value).items()}
+        pairs = (pair.split(':') for pair in value.split(';') if pair.strip())
+        return {int(k): float(v) for k, v in pairs}
+    except (ValueError, TypeError, AttributeError):
+        raise ImportRowError(line, f"invalid account_distributions {value!r}")
+
+def parse_account(row, line):
+    account = BankAccount(_text(row, 'account_type', line), _text(row, 'currency', line).upper(),
+                          _number(row, 'exchange_rate', line), _number(row, 'balance', line),
+                          _number(row, 'income_percentage', line, required=False))
+    return account, row.get('date') or datetime.now().strftime("%Y-%m-%d")
+
+def parse_outcome(row, line, account_id=None, statement=False):
+    if row.get('account_id'):
+        try:
+            account_id = int(row['account_id'])
+        except ValueError:
+            raise ImportRowError(line, f"invalid account_id {row['account_id']!r}")
+    if account_id is None:
+        raise ImportRowError(line, "missing account_id")
+    amount = _number(row, 'amount', line)
+    if statement:
+        # QIF and OFX statements record charges as negative amounts; payments and refunds are positive
+        # and are not outcomes, so they are reported with the invalid rows instead of debiting anyone
+        if amount >= 0:
+            raise ImportRowError(line, f"amount {amount:,.2f} is a payment or refund, not a charge")
+        amount = -amount
+    else:
+        amount = abs(amount)
+    return CreditCardOutcome(account_id, amount, row.get('description', ''),
+                             _distributions(row.get('account_distributions', ''), line))
+
+def parse_asset(row, line):
+    return Asset(_text(row, 'name', line), _number(row, 'quantity', line), _number(row, 'price_per_unit', line))
+
+def to_params(kind, record):
+    if kind == "accounts":
+        account, date = record
+        return (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, date)
+    if kind == "outcomes":
+        return (record.account_id, record.amount, record.description)
+    return (record.name, record.quantity, record.price_per_unit)
+
+def write_batch(conn, kind, batch):
+    conn.executemany(INSERT_SQL[kind], [to_params(kind, record) for record in batch])
+    if kind == "assets":
+        return
+    # Rowids are handed out consecutively after the current maximum while this
+    # transaction holds the write lock, so the new ids can be derived
+    table = "accounts" if kind == "accounts" else "credit_card_outcomes"
+    first_id = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] - len(batch) + 1
+    if kind == "accounts":
+        ledger.post(conn, [ledger.opening(first_id + offset, account.balance, date)
+                           for offset, (account, date) in enumerate(batch)], apply=False)
+        return
+    conn.executemany(DISTRIBUTION_SQL, [
+        (first_id + offset, account_id, amount)
+        for offset, outcome in enumerate(batch)
+        for account_id, amount in outcome.account_distributions.items()
+    ])
+    # The whole batch debits its paying accounts in one set-based update
+    ledger.post(conn, [ledger.outcome_entry(first_id + offset, {}, outcome.account_distributions)
+                       for offset, outcome in enumerate(batch)])
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type: {path}")
+    return extension
+
+def records(path, kind, fmt=None, account_id=None, errors=None):
+    fmt = fmt or detect_format(path)
+    if fmt != "csv" and kind != "outcomes":
+        raise ValueError(f"{fmt.upper()} files only contain credit card outcomes")
+    for line, row in READERS[fmt](path):
+        try:
+            if kind == "accounts":
+                yield parse_account(row, line)
+            elif kind == "outcomes":
+                yield parse_outcome(row, line, account_id, statement=fmt != "csv")
+            else:
+                yield parse_asset(row, line)
+        except ImportRowError as e:
+            if errors is None:
+                raise
+            errors.append(e)
+
+#MARK: - Import
+def import_file(path, kind, fmt=None, account_id=None, batch_size=BATCH_SIZE, progress=None):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    errors = []
+    rows = 0
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal rows
+        with database.transaction() as conn:
+            write_batch(conn, kind, batch)
+        rows += len(batch)
+        batch.clear()
+        if progress:
+            progress(rows)
+
+    for record in records(path, kind, fmt, account_id, errors):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return ImportResult(kind, rows, errors, time.perf_counter() - start)
+
+def add_arguments(parser):
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path", help="CSV, QIF or OFX file")
+    parser.add_argument("--format", choices=FORMATS, help="File format (default: from the file extension)")
+    parser.add_argument("--account-id", type=int, help="Card account for QIF/OFX statements or CSV rows without account_id")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+def run(args):
+    create_database()
+    result = import_file(args.path, args.kind, args.format, args.account_id, args.batch_size,
+                         progress=lambda rows: print(f"\r{rows} rows", end='', flush=True))
+    print()
+    for error in result.errors[:MAX_REPORTED_ERRORS]:
+        print(error)
+    print(result.summary())
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import accounts, credit card outcomes or assets")
+    add_arguments(parser)
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    args = parser.parse_args()
+    if args.database:
+        database.configure(args.database)
+    run(args)
+
+if __name__ == "__main__":
+    main()
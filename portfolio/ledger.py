@@ -0,0 +1,205 @@
+import json
+from datetime import datetime
+from . import archive, database, metrics
+
+# Double-entry journal behind account balances. Every change to a balance is an entry whose postings
+# sum to zero: the bank accounts involved on one side, EQUITY or CARD_PAYMENTS on the other. A bank
+# account's balance is the sum of its postings; accounts.balance caches it for every other reader.
+# Entries are written in the caller's transaction together with the change they record:
+#   opening      a new account's balance (EQUITY)
+#   adjustment   a balance edited by hand (EQUITY)
+#   closing      what was left in a deleted account (EQUITY)
+#   outcome      the paying accounts of a new credit card outcome are debited (CARD_PAYMENTS)
+#   outcome_update, reversal   the difference when an outcome's distributions change or it is deleted
+EQUITY = 0
+CARD_PAYMENTS = -1
+
+# Applies the net change of a range of entries to the cached balances in one statement. The unary +
+# keeps the planner on the entry_id range rather than scanning idx_journal_postings_account.
+APPLY_SQL = '''
+    UPDATE accounts SET balance = balance + p.amount
+    FROM (SELECT account_id, SUM(amount) AS amount FROM journal_postings
+          WHERE entry_id BETWEEN ? AND ? AND +account_id > 0 GROUP BY account_id) p
+    WHERE accounts.id = p.account_id
+'''
+
+class Entry:
+    def __init__(self, kind, postings, outcome_id=None, date=None):
+        self.kind = kind
+        self.postings = postings  # {account_id: amount}, summing to zero
+        self.outcome_id = outcome_id
+        self.date = date  # Today when None
+
+def opening(account_id, balance, date=None):
+    return Entry('opening', {account_id: balance, EQUITY: -balance}, date=date)
+
+def adjustment(account_id, change):
+    return Entry('adjustment', {account_id: change, EQUITY: -change})
+
+def closing(account_id, balance):
+    return Entry('closing', {account_id: -balance, EQUITY: balance})
+
+def outcome_postings(old, new):
+    # Change to the journal when an outcome's distributions ({account_id: amount}) go from old to new
+    postings = {}
+    for account_id, amount in old.items():
+        postings[int(account_id)] = postings.get(int(account_id), 0.0) + amount
+    for account_id, amount in new.items():
+        postings[int(account_id)] = postings.get(int(account_id), 0.0) - amount
+    postings[CARD_PAYMENTS] = sum(new.values()) - sum(old.values())
+    return postings
+
+def outcome_entry(outcome_id, old, new):
+    kind = 'outcome' if not old else 'reversal' if not new else 'outcome_update'
+    return Entry(kind, outcome_postings(old, new), outcome_id)
+
+#MARK: - Posting
+def _existing_accounts(conn, account_ids):
+    if not account_ids:
+        return set()
+    return {row[0] for row in conn.execute('SELECT id FROM accounts WHERE id IN (SELECT value FROM json_each(?))',
+                                           (json.dumps(sorted(account_ids)),))}
+
+@metrics.instrument(rows=lambda count: count)
+def post(conn, entries, apply=True):
+    # Writes the entries in the caller's transaction and returns how many were written. With apply the
+    # balances of the accounts they touch move by their net change, in one UPDATE for the whole batch;
+    # openings, adjustments and closings are posted with apply=False next to the write that sets the
+    # balance. Postings to accounts that no longer exist go to EQUITY; zero postings are dropped.
+    entries = [entry for entry in entries if any(entry.postings.values())]
+    if not entries:
+        return 0
+    existing = _existing_accounts(conn, {account_id for entry in entries for account_id in entry.postings if account_id > 0})
+    today = datetime.now().strftime("%Y-%m-%d")
+    conn.executemany('INSERT INTO journal_entries (date, kind, outcome_id) VALUES (?, ?, ?)',
+                     [(entry.date or today, entry.kind, entry.outcome_id) for entry in entries])
+    # SQLite hands out the ids consecutively while the caller's transaction holds the write lock
+    first = conn.execute('SELECT last_insert_rowid()').fetchone()[0] - len(entries) + 1
+    postings = []
+    for offset, entry in enumerate(entries):
+        merged = {}
+        for account_id, amount in entry.postings.items():
+            account_id = account_id if account_id <= 0 or account_id in existing else EQUITY
+            merged[account_id] = merged.get(account_id, 0.0) + amount
+        postings.extend((first + offset, account_id, amount) for account_id, amount in merged.items() if amount)
+    conn.executemany('INSERT INTO journal_postings (entry_id, account_id, amount) VALUES (?, ?, ?)', postings)
+    if apply:
+        conn.execute(APPLY_SQL, (first, first + len(entries) - 1))
+    return len(entries)
+
+def outcome_distributions(conn, outcome_id):
+    return dict(conn.execute('SELECT account_id, amount FROM outcome_distributions WHERE outcome_id = ?', (outcome_id,)).fetchall())
+
+def rebuild_journal(conn):
+    # Journal for a file written without one (or bulk-loaded past it): an opening entry per account for its
+    # balance plus what it has paid toward outcomes, then one entry per outcome debiting those payments,
+    # so every balance stays as it is. Entry ids: account id for openings, after the last account for outcomes.
+    today = datetime.now().strftime("%Y-%m-%d")
+    conn.execute('DELETE FROM journal_postings')
+    conn.execute('DELETE FROM journal_entries')
+    base = conn.execute('SELECT COALESCE(MAX(id), 0) FROM accounts').fetchone()[0]
+    conn.execute('''
+        INSERT INTO journal_entries (id, date, kind, outcome_id)
+        SELECT id, COALESCE(NULLIF(date, ''), ?), 'opening', NULL FROM accounts
+    ''', (today,))
+    conn.execute('''
+        INSERT INTO journal_entries (id, date, kind, outcome_id)
+        SELECT ? + outcome_id, ?, 'outcome', outcome_id FROM outcome_distributions GROUP BY outcome_id
+    ''', (base, today))
+    conn.execute(f'''
+        WITH opened AS (
+            SELECT a.id, a.balance + COALESCE(SUM(d.amount), 0) AS amount
+            FROM accounts a LEFT JOIN outcome_distributions d ON d.account_id = a.id GROUP BY a.id
+        )
+        INSERT INTO journal_postings (entry_id, account_id, amount)
+        SELECT id, id, amount FROM opened WHERE amount != 0
+        UNION ALL SELECT id, {EQUITY}, -amount FROM opened WHERE amount != 0
+    ''')
+    conn.execute(f'''
+        INSERT INTO journal_postings (entry_id, account_id, amount)
+        SELECT ? + d.outcome_id, COALESCE(a.id, {EQUITY}), -SUM(d.amount)
+        FROM outcome_distributions d LEFT JOIN accounts a ON a.id = d.account_id GROUP BY 1, 2
+        UNION ALL SELECT ? + outcome_id, {CARD_PAYMENTS}, SUM(amount) FROM outcome_distributions GROUP BY outcome_id
+    ''', (base, base))
+
+#MARK: - Reconciliation
+def _merge(left, right):
+    # Outer merge of two cursors of (key, value) ordered by key; yields (key, left value, right value), 0 when missing
+    left, right = iter(left), iter(right)
+    a, b = next(left, None), next(right, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield a[0], a[1], 0.0
+            a = next(left, None)
+        elif a is None or b[0] < a[0]:
+            yield b[0], 0.0, b[1]
+            b = next(right, None)
+        else:
+            yield a[0], a[1], b[1]
+            a, b = next(left, None), next(right, None)
+
+def _drifted(ledger, actual, tolerance):
+    return abs(ledger - actual) > tolerance * max(1.0, abs(actual))
+
+@metrics.instrument(rows=len)
+def reconcile(tolerance=1e-6):
+    # One streaming pass over the journal, returning what does not add up as (check, key, ledger, actual):
+    #   balance   an account whose cached balance differs from its postings (actual 0 for a deleted account)
+    #   entry     an entry whose postings do not sum to zero
+    #   outcome   an outcome whose CARD_PAYMENTS postings differ from its distributions
+    # Each query is read in key order straight off an index, so memory does not grow with the journal.
+    # The journal covers every year, so archived outcomes are checked against their archived distributions.
+    problems = []
+    with archive.history() as conn:
+        postings = conn.execute('''
+            SELECT account_id, SUM(amount) FROM journal_postings WHERE account_id > 0 GROUP BY account_id ORDER BY account_id
+        ''')
+        balances = conn.execute('SELECT id, balance FROM accounts ORDER BY id')
+        for account_id, ledger, actual in _merge(postings, balances):
+            if _drifted(ledger, actual, tolerance):
+                problems.append(('balance', account_id, ledger, actual))
+        for entry_id, total, scale in conn.execute('''
+            SELECT entry_id, SUM(amount), MAX(ABS(amount)) FROM journal_postings GROUP BY entry_id
+        '''):
+            if abs(total) > tolerance * max(1.0, scale):
+                problems.append(('entry', entry_id, total, 0.0))
+        payments = conn.execute(f'''
+            SELECT e.outcome_id, SUM(p.amount) FROM journal_entries e
+            JOIN journal_postings p ON p.entry_id = e.id AND p.account_id = {CARD_PAYMENTS}
+            WHERE e.outcome_id IS NOT NULL GROUP BY e.outcome_id ORDER BY e.outcome_id
+        ''')
+        distributions = conn.execute(archive.history_sql('''
+            SELECT outcome_id, SUM(amount) FROM outcome_distributions GROUP BY outcome_id ORDER BY outcome_id
+        '''))
+        for outcome_id, ledger, actual in _merge(payments, distributions):
+            if _drifted(ledger, actual, tolerance):
+                problems.append(('outcome', outcome_id, ledger, actual))
+    return problems
+
+def repair_balances(account_ids=None):
+    # Resets cached balances to the sum of their postings (every account when account_ids is None)
+    with database.transaction() as conn:
+        where = '' if account_ids is None else 'WHERE id IN (SELECT value FROM json_each(?))'
+        conn.execute(f'''
+            UPDATE accounts SET balance = COALESCE((SELECT SUM(amount) FROM journal_postings WHERE account_id = accounts.id), 0)
+            {where}
+        ''', () if account_ids is None else (json.dumps(list(account_ids)),))
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Reconcile the journal against account balances and outcome distributions")
+    parser.add_argument("--repair", action="store_true", help="Reset drifted balances to the sum of their postings")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    args = parser.parse_args()
+    if args.database:
+        database.configure(args.database)
+    start = time.perf_counter()
+    problems = reconcile()
+    for check, key, ledger, actual in problems:
+        print(f"{check} {key}: ledger {ledger}, actual {actual}")
+    print(f"{len(problems)} discrepancies in {time.perf_counter() - start:.2f} s")
+    balances = [key for check, key, _, _ in problems if check == 'balance']
+    if balances and args.repair:
+        repair_balances(balances)
+        print(f"Reset {len(balances)} balances from the journal")
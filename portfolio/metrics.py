@@ -0,0 +1,229 @@
+import cProfile
+import functools
+import io
+import json
+import math
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Call counts, latency histograms, rows returned and retries for the hot paths (database functions,
+# the exchange-rate fetcher, chart rendering). Instrumented functions check one module flag per call
+# and otherwise run untouched, so leaving the decorators in place costs next to nothing when disabled.
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+
+_enabled = False
+_profiler_active = False
+_lock = threading.Lock()
+_metrics = {}
+_local = threading.local()
+_profilers = []  # One cProfile.Profile per thread that ran instrumented code while profiling
+
+class Metric:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.counters = {}  # Extra counts such as retries
+
+    def observe(self, elapsed_ms, rows=None, error=False):
+        self.calls += 1
+        self.errors += error
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if rows is not None:
+            self.rows += rows
+        for index, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th call (the max for the open-ended bucket)
+        if not self.calls:
+            return 0.0
+        target, seen = q * self.calls, 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": self.max_ms,
+            "rows": self.rows,
+            "buckets": dict(zip(("+Inf" if b == math.inf else str(b) for b in BUCKETS_MS), self.buckets)),
+            **self.counters,
+        }
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+def enabled():
+    return _enabled
+
+def _metric(name):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics.setdefault(name, Metric(name))
+    return metric
+
+def record(name, elapsed_ms, rows=None, error=False):
+    with _lock:
+        _metric(name).observe(elapsed_ms, rows, error)
+
+def increment(name, counter, value=1):
+    # e.g. increment("rates.fetch", "retries"); a no-op while disabled
+    if not _enabled:
+        return
+    with _lock:
+        counters = _metric(name).counters
+        counters[counter] = counters.get(counter, 0) + value
+
+#MARK: - Instrumentation
+def instrument(name=None, rows=None):
+    # Decorator. rows maps the result to a row count: len for lists, or e.g. lambda page: len(page.rows)
+    def decorate(fn):
+        metric_name = name or f"{fn.__module__.rpartition('.')[2]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = _call(fn, args, kwargs)
+            except BaseException:
+                record(metric_name, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            record(metric_name, (time.perf_counter() - start) * 1000, rows(result) if rows else None)
+            return result
+        return wrapper
+    return decorate
+
+class Span:
+    def __init__(self):
+        self.rows = None
+
+@contextmanager
+def span(name):
+    # Context manager form of instrument for code that is not a whole function; set span.rows to count rows
+    current = Span()
+    if not _enabled:
+        yield current
+        return
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        record(name, (time.perf_counter() - start) * 1000, error=True)
+        raise
+    record(name, (time.perf_counter() - start) * 1000, current.rows)
+
+def snapshot():
+    with _lock:
+        return {name: metric.as_dict() for name, metric in sorted(_metrics.items())}
+
+def reset():
+    with _lock:
+        _metrics.clear()
+
+#MARK: - Profiling
+# cProfile only sees the thread that enabled it, and the work runs on executor threads, so while
+# profiling is on each thread profiles the outermost instrumented call it makes and the per-thread
+# profiles are merged when it stops.
+def _call(fn, args, kwargs):
+    if not _profiler_active or getattr(_local, "profiling", False):
+        return fn(*args, **kwargs)
+    profiler = getattr(_local, "profiler", None)
+    if profiler is None:
+        profiler = _local.profiler = cProfile.Profile()
+        with _lock:
+            _profilers.append(profiler)
+    _local.profiling = True
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        _local.profiling = False
+
+def start_profile():
+    # Profiling records through the instrumented calls, so it turns metrics on as well
+    global _profiler_active, _local
+    enable()
+    with _lock:
+        _profilers.clear()
+    _local = threading.local()
+    _profiler_active = True
+
+def profiling():
+    return _profiler_active
+
+def stop_profile(path=None, limit=30):
+    # Returns the top entries by cumulative time as text; path also saves the merged profile (.prof, for snakeviz/pstats)
+    global _profiler_active, _local
+    _profiler_active = False
+    with _lock:
+        profilers, _profilers[:] = list(_profilers), []
+    _local = threading.local()
+    if not profilers:
+        return "No instrumented calls were profiled."
+    stream = io.StringIO()
+    stats = pstats.Stats(profilers[0], stream=stream)
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    if path:
+        stats.dump_stats(path)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+#MARK: - Export
+def to_json(path):
+    with open(path, 'w') as file:
+        json.dump({"timestamp": time.time(), "metrics": snapshot()}, file, indent=2)
+
+def prometheus_text(prefix="portfolio"):
+    lines = []
+    metrics = snapshot()
+    def family(suffix, kind, help_text):
+        lines.append(f"# HELP {prefix}_{suffix} {help_text}")
+        lines.append(f"# TYPE {prefix}_{suffix} {kind}")
+
+    family("call_duration_ms", "histogram", "Latency of instrumented calls in milliseconds")
+    for name, m in metrics.items():
+        cumulative = 0
+        for bound, count in m["buckets"].items():
+            cumulative += count
+            lines.append(f'{prefix}_call_duration_ms_bucket{{name="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_call_duration_ms_sum{{name="{name}"}} {m["total_ms"]}')
+        lines.append(f'{prefix}_call_duration_ms_count{{name="{name}"}} {m["calls"]}')
+    for key, kind, help_text in (("errors", "counter", "Instrumented calls that raised"),
+                                 ("rows", "counter", "Rows returned by instrumented calls"),
+                                 ("retries", "counter", "Retried attempts inside instrumented calls")):
+        family(f"{key}_total", kind, help_text)
+        for name, m in metrics.items():
+            lines.append(f'{prefix}_{key}_total{{name="{name}"}} {m.get(key, 0)}')
+    return "\n".join(lines) + "\n"
+
+def to_prometheus(path):
+    with open(path, 'w') as file:
+        file.write(prometheus_text())
+
+def dump(path):
+    # .prom/.txt get the Prometheus text format, anything else JSON
+    if path.endswith((".prom", ".txt")):
+        to_prometheus(path)
+    else:
+        to_json(path)
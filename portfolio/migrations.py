@@ -0,0 +1,680 @@
+from datetime import datetime
+from . import database, metrics
+
+# Numbered schema migrations. PRAGMA user_version records the last one applied, so an up-to-date
+# file costs a single header read at startup. Append new migrations; never edit or reorder applied ones.
+# Files created before versioning start at 0; every step is written to also work on those.
+# Each step holds its SQL as it was released rather than calling the modules that use the tables, so
+# changing those modules later cannot change what an old migration does.
+
+def _base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY,
+            account_type TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            exchange_rate REAL NOT NULL,
+            balance REAL NOT NULL,
+            income_percentage REAL,
+            date TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS credit_card_outcomes (
+            id INTEGER PRIMARY KEY,
+            account_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT,
+            account_distributions TEXT,
+            FOREIGN KEY (account_id) REFERENCES accounts (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS assets (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            price_per_unit REAL NOT NULL
+        )
+    ''')
+    # The first releases created accounts without the balance and date columns
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(accounts)")]
+    if 'balance' not in columns:
+        conn.execute("ALTER TABLE accounts ADD COLUMN balance REAL NOT NULL DEFAULT 0")
+    if 'date' not in columns:
+        conn.execute("ALTER TABLE accounts ADD COLUMN date TEXT NOT NULL DEFAULT ''")
+
+def _outcome_distributions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outcome_distributions (
+            outcome_id INTEGER NOT NULL,
+            account_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (outcome_id, account_id),
+            FOREIGN KEY (outcome_id) REFERENCES credit_card_outcomes (id),
+            FOREIGN KEY (account_id) REFERENCES accounts (id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outcome_distributions_account
+        ON outcome_distributions (account_id, amount)
+    ''')
+    # Move distributions still stored as JSON in credit_card_outcomes into the join table
+    conn.execute('''
+        INSERT OR REPLACE INTO outcome_distributions (outcome_id, account_id, amount)
+        SELECT o.id, CAST(d.key AS INTEGER), d.value
+        FROM credit_card_outcomes o, json_each(o.account_distributions) d
+        WHERE o.account_distributions IS NOT NULL AND o.account_distributions NOT IN ('', '{}')
+    ''')
+    conn.execute('''
+        UPDATE credit_card_outcomes SET account_distributions = NULL
+        WHERE account_distributions IS NOT NULL
+    ''')
+
+def _portfolio_totals(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'portfolio_totals'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_totals (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_totals_insert AFTER INSERT ON accounts BEGIN
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('accounts', 'all', NEW.balance, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('currency', NEW.currency, NEW.balance, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('account_type', NEW.account_type, NEW.balance, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_totals_delete AFTER DELETE ON accounts BEGIN
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('accounts', 'all', -OLD.balance, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('currency', OLD.currency, -OLD.balance, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('account_type', OLD.account_type, -OLD.balance, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_totals_update AFTER UPDATE OF balance, currency, account_type ON accounts BEGIN
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('accounts', 'all', -OLD.balance, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('currency', OLD.currency, -OLD.balance, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('account_type', OLD.account_type, -OLD.balance, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('accounts', 'all', NEW.balance, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('currency', NEW.currency, NEW.balance, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('account_type', NEW.account_type, NEW.balance, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_totals_insert AFTER INSERT ON credit_card_outcomes BEGIN
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcomes', 'all', NEW.amount, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcome_account', CAST(NEW.account_id AS TEXT), NEW.amount, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_totals_delete AFTER DELETE ON credit_card_outcomes BEGIN
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcomes', 'all', -OLD.amount, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcome_account', CAST(OLD.account_id AS TEXT), -OLD.amount, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_totals_update AFTER UPDATE OF account_id, amount ON credit_card_outcomes BEGIN
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcomes', 'all', -OLD.amount, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcome_account', CAST(OLD.account_id AS TEXT), -OLD.amount, -1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcomes', 'all', NEW.amount, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('outcome_account', CAST(NEW.account_id AS TEXT), NEW.amount, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    if not exists:
+        conn.execute('''
+            INSERT INTO portfolio_totals (dimension, key, total, row_count)
+            SELECT 'accounts', 'all', COALESCE(SUM(balance), 0), COUNT(*) FROM accounts
+            UNION ALL SELECT 'currency', currency, SUM(balance), COUNT(*) FROM accounts GROUP BY currency
+            UNION ALL SELECT 'account_type', account_type, SUM(balance), COUNT(*) FROM accounts GROUP BY account_type
+            UNION ALL SELECT 'outcomes', 'all', COALESCE(SUM(amount), 0), COUNT(*) FROM credit_card_outcomes
+            UNION ALL SELECT 'outcome_account', CAST(account_id AS TEXT), SUM(amount), COUNT(*) FROM credit_card_outcomes GROUP BY account_id
+        ''')
+
+def _query_indexes(conn):
+    # Grouping and filtering accounts by opening date; covering the balance avoids reading the rows
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_date ON accounts (date, balance)")
+    # Per-card outcome lookups, the valuation/chart joins and account deletes
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outcomes_account ON credit_card_outcomes (account_id, amount)")
+    conn.execute("ANALYZE")
+
+def _balance_history(conn):
+    # Seeds one snapshot per existing account: its current balance on its opening date
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'balance_snapshots'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            account_id INTEGER NOT NULL,
+            balance REAL NOT NULL,
+            change REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_balance_snapshots_date ON balance_snapshots (date, account_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_balance_snapshots_account ON balance_snapshots (account_id, date)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS balance_daily (
+            date TEXT PRIMARY KEY,
+            change REAL NOT NULL DEFAULT 0,
+            snapshots INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS balance_monthly (
+            month TEXT PRIMARY KEY,
+            change REAL NOT NULL DEFAULT 0,
+            snapshots INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_history_insert AFTER INSERT ON accounts BEGIN
+            INSERT INTO balance_snapshots (date, account_id, balance, change)
+            VALUES (COALESCE(NULLIF(NEW.date, ''), date('now', 'localtime')), NEW.id, NEW.balance, NEW.balance);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_history_update AFTER UPDATE OF balance ON accounts
+        WHEN NEW.balance IS NOT OLD.balance BEGIN
+            INSERT INTO balance_snapshots (date, account_id, balance, change)
+            VALUES (date('now', 'localtime'), NEW.id, NEW.balance, NEW.balance - OLD.balance);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS accounts_history_delete AFTER DELETE ON accounts BEGIN
+            INSERT INTO balance_snapshots (date, account_id, balance, change)
+            VALUES (date('now', 'localtime'), OLD.id, 0, -OLD.balance);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS balance_snapshots_rollup AFTER INSERT ON balance_snapshots BEGIN
+            INSERT INTO balance_daily (date, change, snapshots) VALUES (NEW.date, NEW.change, 1)
+            ON CONFLICT (date) DO UPDATE SET change = change + excluded.change, snapshots = snapshots + 1;
+            INSERT INTO balance_monthly (month, change, snapshots) VALUES (substr(NEW.date, 1, 7), NEW.change, 1)
+            ON CONFLICT (month) DO UPDATE SET change = change + excluded.change, snapshots = snapshots + 1;
+        END
+    ''')
+    if not exists:
+        conn.execute('''
+            INSERT INTO balance_snapshots (date, account_id, balance, change)
+            SELECT COALESCE(NULLIF(date, ''), date('now', 'localtime')), id, balance, balance FROM accounts ORDER BY id
+        ''')
+
+def _sort_indexes(conn):
+    # Table views page through accounts by balance and outcomes by amount off these, id breaking ties
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_balance ON accounts (balance)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outcomes_amount ON credit_card_outcomes (amount)")
+
+def _ledger(conn):
+    # A file written without a journal gets one that keeps every balance as it is: an opening entry per
+    # account for its balance plus what it has paid toward outcomes (EQUITY = 0), then one entry per outcome
+    # debiting those payments (CARD_PAYMENTS = -1). Entry ids: account id for openings, after the last
+    # account for outcomes.
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_entries'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS journal_entries (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            outcome_id INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_entries_outcome ON journal_entries (outcome_id) WHERE outcome_id IS NOT NULL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS journal_postings (
+            entry_id INTEGER NOT NULL,
+            account_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (entry_id, account_id),
+            FOREIGN KEY (entry_id) REFERENCES journal_entries (id)
+        ) WITHOUT ROWID
+    ''')
+    # Covers the per-account sums, so reconciliation reads balances in account order without a sort
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_postings_account ON journal_postings (account_id, amount)")
+    if exists:
+        return
+    today = datetime.now().strftime("%Y-%m-%d")
+    base = conn.execute('SELECT COALESCE(MAX(id), 0) FROM accounts').fetchone()[0]
+    conn.execute('''
+        INSERT INTO journal_entries (id, date, kind, outcome_id)
+        SELECT id, COALESCE(NULLIF(date, ''), ?), 'opening', NULL FROM accounts
+    ''', (today,))
+    conn.execute('''
+        INSERT INTO journal_entries (id, date, kind, outcome_id)
+        SELECT ? + outcome_id, ?, 'outcome', outcome_id FROM outcome_distributions GROUP BY outcome_id
+    ''', (base, today))
+    conn.execute('''
+        WITH opened AS (
+            SELECT a.id, a.balance + COALESCE(SUM(d.amount), 0) AS amount
+            FROM accounts a LEFT JOIN outcome_distributions d ON d.account_id = a.id GROUP BY a.id
+        )
+        INSERT INTO journal_postings (entry_id, account_id, amount)
+        SELECT id, id, amount FROM opened WHERE amount != 0
+        UNION ALL SELECT id, 0, -amount FROM opened WHERE amount != 0
+    ''')
+    conn.execute('''
+        INSERT INTO journal_postings (entry_id, account_id, amount)
+        SELECT ? + d.outcome_id, COALESCE(a.id, 0), -SUM(d.amount)
+        FROM outcome_distributions d LEFT JOIN accounts a ON a.id = d.account_id GROUP BY 1, 2
+        UNION ALL SELECT ? + outcome_id, -1, SUM(amount) FROM outcome_distributions GROUP BY outcome_id
+    ''', (base, base))
+
+def _rate_history(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS exchange_rates (
+            currency TEXT NOT NULL,
+            date TEXT NOT NULL,
+            rate REAL NOT NULL,
+            source TEXT,
+            PRIMARY KEY (currency, date)
+        ) WITHOUT ROWID
+    ''')
+    # Revaluation selects accounts by currency as stored in any case
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_currency ON accounts (UPPER(currency))")
+
+# (category, LIKE pattern), matched case-insensitively against the description; seeded into a new file
+DEFAULT_RULES = [
+    ("Groceries", "%grocer%"), ("Groceries", "%market%"), ("Groceries", "%bakery%"),
+    ("Dining", "%restaurant%"), ("Dining", "%cafe%"), ("Dining", "%coffee%"),
+    ("Transport", "%fuel%"), ("Transport", "%taxi%"), ("Transport", "%parking%"),
+    ("Travel", "%travel%"), ("Travel", "%flight%"), ("Travel", "%hotel%"),
+    ("Housing", "rent%"), ("Housing", "% rent%"), ("Utilities", "%utilit%"), ("Utilities", "%electric%"),
+    ("Shopping", "%electronics%"), ("Shopping", "%cloth%"),
+    ("Health", "%health%"), ("Health", "%pharmac%"), ("Subscriptions", "%subscription%"),
+]
+
+def _search(conn):
+    # A new index is built over the existing outcomes in bulk before the triggers go in
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outcome_categories'").fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS outcomes_fts USING fts5(
+            description, content='credit_card_outcomes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS category_rules (
+            id INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            pattern TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outcome_categories (
+            outcome_id INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outcome_categories_category ON outcome_categories (category, amount)")
+    # Rules are tried in this order and the first match stops the scan
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_category_rules_order ON category_rules (priority DESC, id)")
+    # command is 'delete' (with the description that was indexed) or NULL to index the description
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outcomes_fts_pending (
+            seq INTEGER PRIMARY KEY,
+            outcome_id INTEGER NOT NULL,
+            description TEXT,
+            command TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS category_totals (
+            category TEXT PRIMARY KEY,
+            total REAL NOT NULL DEFAULT 0,
+            row_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    if not exists:
+        conn.executemany('INSERT INTO category_rules (category, pattern) VALUES (?, ?)', DEFAULT_RULES)
+        conn.execute("INSERT INTO outcomes_fts (outcomes_fts) VALUES ('rebuild')")
+        conn.execute('DELETE FROM outcomes_fts_pending')
+        conn.execute('DELETE FROM outcome_categories')
+        conn.execute('''
+            INSERT INTO outcome_categories (outcome_id, category, amount)
+            SELECT id, COALESCE((SELECT category FROM category_rules WHERE description LIKE pattern
+                                 ORDER BY priority DESC, id LIMIT 1), 'Uncategorized'), amount
+            FROM credit_card_outcomes
+        ''')
+        conn.execute('DELETE FROM category_totals')
+        conn.execute('''
+            INSERT INTO category_totals (category, total, row_count)
+            SELECT category, SUM(amount), COUNT(*) FROM outcome_categories GROUP BY category
+        ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_search_insert AFTER INSERT ON credit_card_outcomes BEGIN
+            INSERT INTO outcomes_fts_pending (outcome_id, description, command) VALUES (NEW.id, NEW.description, NULL);
+            INSERT INTO outcome_categories (outcome_id, category, amount)
+            VALUES (NEW.id, COALESCE((SELECT category FROM category_rules WHERE NEW.description LIKE pattern
+                                      ORDER BY priority DESC, id LIMIT 1), 'Uncategorized'), NEW.amount);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_search_delete AFTER DELETE ON credit_card_outcomes BEGIN
+            INSERT INTO outcomes_fts_pending (outcome_id, description, command) VALUES (OLD.id, OLD.description, 'delete');
+            DELETE FROM outcome_categories WHERE outcome_id = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_search_update AFTER UPDATE OF description ON credit_card_outcomes
+        WHEN NEW.description IS NOT OLD.description BEGIN
+            INSERT INTO outcomes_fts_pending (outcome_id, description, command) VALUES (OLD.id, OLD.description, 'delete');
+            INSERT INTO outcomes_fts_pending (outcome_id, description, command) VALUES (NEW.id, NEW.description, NULL);
+            UPDATE outcome_categories SET category = COALESCE((SELECT category FROM category_rules WHERE NEW.description LIKE pattern
+                                                               ORDER BY priority DESC, id LIMIT 1), 'Uncategorized')
+            WHERE outcome_id = NEW.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS outcomes_category_amount AFTER UPDATE OF amount ON credit_card_outcomes
+        WHEN NEW.amount IS NOT OLD.amount BEGIN
+            UPDATE outcome_categories SET amount = NEW.amount WHERE outcome_id = NEW.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS category_totals_insert AFTER INSERT ON outcome_categories BEGIN
+            INSERT INTO category_totals (category, total, row_count) VALUES (NEW.category, NEW.amount, 1)
+            ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS category_totals_delete AFTER DELETE ON outcome_categories BEGIN
+            INSERT INTO category_totals (category, total, row_count) VALUES (OLD.category, -OLD.amount, -1)
+            ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS category_totals_update AFTER UPDATE OF category, amount ON outcome_categories BEGIN
+            INSERT INTO category_totals (category, total, row_count) VALUES (OLD.category, -OLD.amount, -1)
+            ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+            INSERT INTO category_totals (category, total, row_count) VALUES (NEW.category, NEW.amount, 1)
+            ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;
+        END
+    ''')
+
+def _archive(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outcome_archives (
+            year INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            outcomes INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    # One row per committed move of a year's outcomes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_runs (
+            id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            outcomes INTEGER NOT NULL,
+            amount REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outcome_rollups (
+            month TEXT NOT NULL,
+            account_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            outcomes INTEGER NOT NULL,
+            PRIMARY KEY (month, account_id, category)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance (
+            task TEXT PRIMARY KEY,
+            last_run TEXT NOT NULL,
+            seconds REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+def _balance_currency(conn):
+    # Snapshots record the account's currency so the history can be converted; the rollups are kept per
+    # currency. Existing snapshots take their account's current currency ('' for deleted accounts).
+    conn.execute("ALTER TABLE balance_snapshots ADD COLUMN currency TEXT NOT NULL DEFAULT ''")
+    conn.execute("UPDATE balance_snapshots SET currency = COALESCE((SELECT UPPER(currency) FROM accounts WHERE id = account_id), '')")
+    for trigger in ('accounts_history_insert', 'accounts_history_update', 'accounts_history_delete', 'balance_snapshots_rollup'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE balance_daily")
+    conn.execute("DROP TABLE balance_monthly")
+    conn.execute('''
+        CREATE TABLE balance_daily (
+            date TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            change REAL NOT NULL DEFAULT 0,
+            snapshots INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, currency)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE balance_monthly (
+            month TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            change REAL NOT NULL DEFAULT 0,
+            snapshots INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, currency)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER accounts_history_insert AFTER INSERT ON accounts BEGIN
+            INSERT INTO balance_snapshots (date, account_id, currency, balance, change)
+            VALUES (COALESCE(NULLIF(NEW.date, ''), date('now', 'localtime')), NEW.id, UPPER(NEW.currency), NEW.balance, NEW.balance);
+        END
+    ''')
+    # A change of currency moves the whole balance: out of the old currency, into the new one
+    conn.execute('''
+        CREATE TRIGGER accounts_history_update AFTER UPDATE OF balance, currency ON accounts
+        WHEN NEW.balance IS NOT OLD.balance OR UPPER(NEW.currency) IS NOT UPPER(OLD.currency) BEGIN
+            INSERT INTO balance_snapshots (date, account_id, currency, balance, change)
+            SELECT date('now', 'localtime'), NEW.id, UPPER(NEW.currency), NEW.balance, NEW.balance - OLD.balance
+            WHERE UPPER(NEW.currency) IS UPPER(OLD.currency);
+            INSERT INTO balance_snapshots (date, account_id, currency, balance, change)
+            SELECT date('now', 'localtime'), OLD.id, UPPER(OLD.currency), 0, -OLD.balance
+            WHERE UPPER(NEW.currency) IS NOT UPPER(OLD.currency);
+            INSERT INTO balance_snapshots (date, account_id, currency, balance, change)
+            SELECT date('now', 'localtime'), NEW.id, UPPER(NEW.currency), NEW.balance, NEW.balance
+            WHERE UPPER(NEW.currency) IS NOT UPPER(OLD.currency);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER accounts_history_delete AFTER DELETE ON accounts BEGIN
+            INSERT INTO balance_snapshots (date, account_id, currency, balance, change)
+            VALUES (date('now', 'localtime'), OLD.id, UPPER(OLD.currency), 0, -OLD.balance);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER balance_snapshots_rollup AFTER INSERT ON balance_snapshots BEGIN
+            INSERT INTO balance_daily (date, currency, change, snapshots) VALUES (NEW.date, NEW.currency, NEW.change, 1)
+            ON CONFLICT (date, currency) DO UPDATE SET change = change + excluded.change, snapshots = snapshots + 1;
+            INSERT INTO balance_monthly (month, currency, change, snapshots) VALUES (substr(NEW.date, 1, 7), NEW.currency, NEW.change, 1)
+            ON CONFLICT (month, currency) DO UPDATE SET change = change + excluded.change, snapshots = snapshots + 1;
+        END
+    ''')
+    conn.execute('''
+        INSERT INTO balance_daily (date, currency, change, snapshots)
+        SELECT date, currency, SUM(change), COUNT(*) FROM balance_snapshots GROUP BY date, currency
+    ''')
+    conn.execute('''
+        INSERT INTO balance_monthly (month, currency, change, snapshots)
+        SELECT substr(date, 1, 7), currency, SUM(change), SUM(snapshots) FROM balance_daily GROUP BY 1, 2
+    ''')
+
+def _rebuild(conn, table, create, columns, select):
+    # SQLite cannot add AUTOINCREMENT to a table: the rows move into a new one (create makes {table}_new),
+    # and the indexes and triggers, which go with the old table, are recreated from their stored SQL
+    dependents = [sql for sql, in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL", (table,))]
+    conn.execute(create)
+    conn.execute(f"INSERT INTO {table}_new ({columns}) {select}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in dependents:
+        conn.execute(sql)
+
+def _high_water(conn, table, query):
+    # The largest id the table has ever handed out, as far as the rows that refer to it remember
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+    conn.execute(f"INSERT INTO sqlite_sequence (name, seq) SELECT ?, MAX(0, {query})", (table,))
+
+def _monotonic_ids(conn):
+    # Accounts, outcomes and assets get AUTOINCREMENT ids, so a deleted or archived row's id is never handed
+    # out again: the journal, the balance history and the archives key on these ids. The high water mark
+    # counts the ids only the journal, history, categories and search queue still remember (every archived
+    # outcome has a journal entry). Outcomes also get the date they were recorded, which archiving and
+    # point-in-time valuation use instead of looking an outcome's first journal entry up by its id. An
+    # existing outcome takes the first entry after its id was last reversed, leaving out years already
+    # archived, where an id still in the hot tables can only be a reused one; '' when it has none.
+    _rebuild(conn, 'accounts', '''
+        CREATE TABLE accounts_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_type TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            exchange_rate REAL NOT NULL,
+            balance REAL NOT NULL,
+            income_percentage REAL,
+            date TEXT NOT NULL
+        )
+    ''', "id, account_type, currency, exchange_rate, balance, income_percentage, date",
+        "SELECT id, account_type, currency, exchange_rate, balance, income_percentage, date FROM accounts")
+    _rebuild(conn, 'credit_card_outcomes', '''
+        CREATE TABLE credit_card_outcomes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT,
+            account_distributions TEXT,
+            date TEXT NOT NULL DEFAULT (date('now', 'localtime')),
+            FOREIGN KEY (account_id) REFERENCES accounts (id)
+        )
+    ''', "id, account_id, amount, description, account_distributions, date", '''
+        SELECT o.id, o.account_id, o.amount, o.description, o.account_distributions, COALESCE((
+            SELECT MIN(e.date) FROM journal_entries e
+            WHERE e.outcome_id = o.id
+              AND e.id > COALESCE((SELECT MAX(r.id) FROM journal_entries r WHERE r.outcome_id = o.id AND r.kind = 'reversal'), 0)
+              AND CAST(substr(e.date, 1, 4) AS INTEGER) NOT IN (SELECT year FROM outcome_archives)
+        ), '')
+        FROM credit_card_outcomes o
+    ''')
+    _rebuild(conn, 'assets', '''
+        CREATE TABLE assets_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            price_per_unit REAL NOT NULL
+        )
+    ''', "id, name, quantity, price_per_unit", "SELECT id, name, quantity, price_per_unit FROM assets")
+    _high_water(conn, 'accounts', '''MAX(
+        (SELECT COALESCE(MAX(id), 0) FROM accounts),
+        (SELECT COALESCE(MAX(account_id), 0) FROM journal_postings),
+        (SELECT COALESCE(MAX(account_id), 0) FROM balance_snapshots),
+        (SELECT COALESCE(MAX(account_id), 0) FROM outcome_distributions))''')
+    _high_water(conn, 'credit_card_outcomes', '''MAX(
+        (SELECT COALESCE(MAX(id), 0) FROM credit_card_outcomes),
+        (SELECT COALESCE(MAX(outcome_id), 0) FROM journal_entries),
+        (SELECT COALESCE(MAX(outcome_id), 0) FROM outcome_distributions),
+        (SELECT COALESCE(MAX(outcome_id), 0) FROM outcome_categories),
+        (SELECT COALESCE(MAX(outcome_id), 0) FROM outcomes_fts_pending))''')
+    _high_water(conn, 'assets', "(SELECT COALESCE(MAX(id), 0) FROM assets)")
+    # Archiving picks a closed year's outcomes by date
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outcomes_date ON credit_card_outcomes (date)")
+
+def _rate_cache(conn):
+    # Fetched rates persisted by rates.RateCache, so a restart starts warm; it used to create the table itself
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS exchange_rate_cache (
+            base TEXT NOT NULL,
+            quote TEXT NOT NULL,
+            rate REAL NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (base, quote)
+        )
+    ''')
+
+MIGRATIONS = [
+    (1, "base tables and the balance/date columns", _base_tables),
+    (2, "outcome_distributions join table", _outcome_distributions),
+    (3, "trigger-maintained portfolio_totals", _portfolio_totals),
+    (4, "indexes for accounts.date and credit_card_outcomes.account_id", _query_indexes),
+    (5, "balance_snapshots with daily and monthly rollups", _balance_history),
+    (6, "indexes for sorting accounts by balance and outcomes by amount", _sort_indexes),
+    (7, "double-entry journal behind account balances", _ledger),
+    (8, "exchange_rates by currency and date", _rate_history),
+    (9, "full-text search and categories for outcomes", _search),
+    (10, "archived years, their monthly rollups and maintenance times", _archive),
+    (11, "currency on balance snapshots, rollups per currency", _balance_currency),
+    (12, "ids never reused, and the date each outcome was recorded", _monotonic_ids),
+    (13, "exchange_rate_cache for fetched rates", _rate_cache),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending(conn):
+    version = schema_version(conn)
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+@metrics.instrument()
+def migrate(log=None):
+    # Applies every pending migration in one transaction and returns the versions applied
+    with database.connection() as conn:
+        if schema_version(conn) >= LATEST_VERSION:
+            return []
+        # IMMEDIATE takes the write lock up front, so two processes opening an old file migrate it once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            steps = pending(conn)
+            for version, description, apply in steps:
+                if log:
+                    log(f"Migrating to schema version {version}: {description}")
+                apply(conn)
+            if steps:
+                conn.execute(f"PRAGMA user_version = {steps[-1][0]}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return [version for version, _, _ in steps]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show or apply pending schema migrations")
+    parser.add_argument("--check", action="store_true", help="Only list pending migrations")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    args = parser.parse_args()
+    if args.database:
+        database.configure(args.database)
+    if args.check:
+        with database.connection() as conn:
+            print(f"Schema version {schema_version(conn)} of {LATEST_VERSION}")
+            for version, description, _ in pending(conn):
+                print(f"  pending {version}: {description}")
+    else:
+        applied = migrate(log=print)
+        print(f"Applied {len(applied)} migrations, schema version {LATEST_VERSION}")
@@ -0,0 +1,26 @@
+#MARK: - Classes
+class BankAccount:
+    def __init__(self, account_type, currency, exchange_rate, balance, income_percentage=None):
+        self.account_type = account_type
+        self.currency = currency
+        self.exchange_rate = exchange_rate
+        self.balance = balance
+        self.income_percentage = income_percentage
+
+    def calculate_monthly_income(self):
+        if self.income_percentage:
+            return self.balance * (self.income_percentage / 100)
+        return 0
+
+class CreditCardOutcome:
+    def __init__(self, account_id, amount, description, account_distributions=None):
+        self.account_id = account_id
+        self.amount = amount
+        self.description = description
+        self.account_distributions = account_distributions or {}
+
+class Asset:
+    def __init__(self, name, quantity, price_per_unit):
+        self.name = name
+        self.quantity = quantity
+        self.price_per_unit = price_per_unit
@@ -0,0 +1,105 @@
+from . import database, metrics
+
+# Keyset pagination for the table views. A page is fetched relative to the first or last row of the
+# current one ((sort value, id) > or < the boundary), so every page costs the same however far in
+# it is and nothing beyond one page is ever held in memory.
+# Each column is (name, SQL expression); expressions are never NULL so row-value comparisons hold.
+TABLES = {
+    "accounts": ("FROM accounts", [
+        ("id", "id"),
+        ("account_type", "account_type"),
+        ("currency", "currency"),
+        ("exchange_rate", "exchange_rate"),
+        ("balance", "balance"),
+        ("income_percentage", "COALESCE(income_percentage, 0)"),
+        ("date", "date"),
+    ]),
+    "outcomes": ("FROM credit_card_outcomes o", [
+        ("id", "o.id"),
+        ("account_id", "o.account_id"),
+        ("amount", "o.amount"),
+        ("description", "COALESCE(o.description, '')"),
+        ("account_distributions", '''COALESCE((SELECT group_concat(d.account_id || ':' || d.amount, ';')
+                                    FROM outcome_distributions d WHERE d.outcome_id = o.id), '')'''),
+    ]),
+    "assets": ("FROM assets", [
+        ("id", "id"),
+        ("name", "name"),
+        ("quantity", "quantity"),
+        ("price_per_unit", "price_per_unit"),
+    ]),
+    # Accounts valued in the reporting currency; :scale is 1 / valuation.rate
+    "distribution": ("FROM accounts", [
+        ("id", "id"),
+        ("account_type", "account_type"),
+        ("currency", "currency"),
+        ("exchange_rate", "exchange_rate"),
+        ("value", "balance * exchange_rate * :scale"),
+        ("monthly_income", "balance * exchange_rate * :scale * COALESCE(income_percentage, 0) / 100"),
+    ]),
+}
+DEFAULT_PAGE_SIZE = 100
+
+class Page:
+    def __init__(self, columns, rows, has_previous, has_next):
+        self.columns = columns
+        self.rows = rows
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    def boundary(self, last=True):
+        # (sort value, id) of the last (or first) row, the keyset for the next (or previous) page
+        return self.rows[-1][-2:] if last else self.rows[0][-2:]
+
+def columns(table):
+    return [name for name, _ in TABLES[table][1]]
+
+def _expression(table, column):
+    for name, expression in TABLES[table][1]:
+        if name == column:
+            return expression
+    raise ValueError(f"Unknown column {column} for {table}")
+
+@metrics.instrument(rows=lambda page: len(page.rows))
+def fetch_page(table, after=None, before=None, limit=DEFAULT_PAGE_SIZE, sort="id", descending=False,
+               filters=None, params=None):
+    # after/before are boundaries from Page.boundary(); filters map column -> substring (case-insensitive)
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    source, column_list = TABLES[table]
+    key, sort_expression = column_list[0][1], _expression(table, sort)
+    arguments = dict(params or {})
+    conditions = []
+    for index, (column, text) in enumerate((filters or {}).items()):
+        if text:
+            conditions.append(f"CAST({_expression(table, column)} AS TEXT) LIKE :filter{index}")
+            arguments[f"filter{index}"] = f"%{text}%"
+    # Walking backwards flips both the comparison and the order, and the rows are reversed afterwards
+    backwards = before is not None
+    if after is not None or backwards:
+        forward = '<' if descending else '>'
+        operator = {'>': '<', '<': '>'}[forward] if backwards else forward
+        conditions.append(f"({sort_expression}, {key}) {operator} (:boundary_sort, :boundary_id)")
+        arguments["boundary_sort"], arguments["boundary_id"] = after if after is not None else before
+    direction = 'DESC' if descending != backwards else 'ASC'
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # The sort value and key ride along at the end of each row to serve as the next boundary
+    query = f'''
+        SELECT {', '.join(expression for _, expression in column_list)}, {sort_expression}, {key}
+        {source} {where}
+        ORDER BY {sort_expression} {direction}, {key} {direction}
+        LIMIT :limit
+    '''
+    arguments["limit"] = limit + 1
+    with database.connection() as conn:
+        rows = conn.execute(query, arguments).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        return Page(columns(table), rows, more, True)
+    return Page(columns(table), rows, after is not None, more)
+
+def display_rows(page):
+    # Rows without the trailing keyset values
+    return [row[:len(page.columns)] for row in page.rows]
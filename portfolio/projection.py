@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from . import metrics
+from .config import get_exchange_rate
+from .valuation import BASE_CURRENCY, reporting_rate
+
+# Monte Carlo projection of net worth. Each month every account compounds at its income_percentage
+# (BankAccount.calculate_monthly_income, reinvested), each foreign currency's exchange rate follows a
+# driftless geometric Brownian motion and each asset's price a GBM with drift. Outcomes are held at
+# today's value. Paths are simulated in fixed blocks, each seeded from its index, so results for a seed
+# do not depend on how many processes share the blocks.
+DEFAULT_MONTHS = 120
+DEFAULT_PATHS = 20_000
+BLOCK_PATHS = 2_000  # Paths per task; also bounds memory per worker
+QUANTILES = (5, 25, 50, 75, 95)
+FX_VOLATILITY = 0.10  # Annualized, for every currency other than BASE_CURRENCY
+ASSET_DRIFT = 0.05  # Annualized expected price growth
+ASSET_VOLATILITY = 0.20
+STEPS_PER_YEAR = 12
+
+#MARK: - Model
+class ProjectionModel:
+    # Positions reduced to what the simulation needs; small enough to ship to every worker
+    def __init__(self, positions, months=DEFAULT_MONTHS, reporting_currency=BASE_CURRENCY, fx_volatility=FX_VOLATILITY,
+                 asset_drift=ASSET_DRIFT, asset_volatility=ASSET_VOLATILITY, rate_lookup=get_exchange_rate):
+        accounts = positions.accounts
+        self.months = months
+        self.currencies = positions.currencies
+        steps = np.arange(months + 1)
+        # Accounts sharing a currency and rate compound identically, so grow each (currency, rate) group once
+        rates, rate_codes = np.unique(accounts['income_percentage'], return_inverse=True)
+        groups = positions.currency_codes * len(rates) + rate_codes.reshape(-1)
+        weights = np.bincount(groups, weights=accounts['balance'] * accounts['exchange_rate'],
+                              minlength=len(self.currencies) * len(rates)).reshape(len(self.currencies), len(rates))
+        growth = (1 + rates / 100)[:, None] ** steps  # (rates, months + 1)
+        self.account_growth = weights @ growth  # (currencies, months + 1) value in BASE_CURRENCY at today's exchange rates
+        self.fx_volatility = np.where(self.currencies == BASE_CURRENCY, 0.0, fx_volatility)
+        self.asset_values = positions.assets['quantity'] * positions.assets['price_per_unit']
+        self.asset_drift = asset_drift
+        self.asset_volatility = asset_volatility
+        self.debt_total = float((positions.outcomes['unpaid'] * positions.outcomes['exchange_rate']).sum())
+        # Net worth is reported in this currency; its own exchange rate moves along with the others
+        self.reporting_currency = reporting_currency.upper()
+        self.reporting_rate = reporting_rate(positions, self.reporting_currency, rate_lookup)
+        matches = np.flatnonzero(self.currencies == self.reporting_currency)
+        self.reporting_index = int(matches[0]) if len(matches) else None
+
+def simulate_block(model, seed, paths):
+    # (paths, months + 1) net worth in the reporting currency for one block of paths
+    rng = np.random.default_rng(seed)
+    dt = 1 / STEPS_PER_YEAR
+    months = model.months
+
+    # Exchange-rate multipliers relative to today: (paths, currencies, months + 1)
+    sigma = model.fx_volatility[None, :, None]
+    shocks = rng.standard_normal((paths, len(model.currencies), months)) * (sigma * np.sqrt(dt)) - 0.5 * sigma ** 2 * dt
+    fx = np.ones((paths, len(model.currencies), months + 1))
+    np.exp(np.cumsum(shocks, axis=2), out=fx[:, :, 1:])
+    net = np.einsum('pct,ct->pt', fx, model.account_growth)
+
+    # One price path per asset, stepped a month at a time so memory stays (paths, assets)
+    if len(model.asset_values):
+        drift = (model.asset_drift - 0.5 * model.asset_volatility ** 2) * dt
+        scale = model.asset_volatility * np.sqrt(dt)
+        # float32 halves the memory traffic of the per-asset work, which dominates when there are many assets
+        values = model.asset_values.astype(np.float32)
+        log_prices = np.zeros((paths, len(values)), dtype=np.float32)
+        step = np.empty_like(log_prices)
+        net[:, 0] += model.asset_values.sum()
+        for month in range(1, months + 1):
+            rng.standard_normal(out=step, dtype=np.float32)
+            step *= scale
+            step += drift
+            log_prices += step
+            np.exp(log_prices, out=step)
+            net[:, month] += step @ values
+
+    net -= model.debt_total
+    if model.reporting_index is not None:
+        net /= model.reporting_rate * fx[:, model.reporting_index, :]
+    else:
+        net /= model.reporting_rate
+    return net.astype(np.float32)
+
+def _run_block(args):
+    return simulate_block(*args)
+
+#MARK: - Projection
+class Projection:
+    def __init__(self, dates, quantiles, bands, paths, workers, seconds, reporting_currency):
+        self.dates = dates  # datetime64[D], the first of each month starting with the current one
+        self.quantiles = quantiles
+        self.bands = bands  # (len(quantiles), months + 1) net worth percentiles
+        self.paths = paths
+        self.workers = workers
+        self.seconds = seconds
+        self.reporting_currency = reporting_currency
+
+    @property
+    def paths_per_second(self):
+        return self.paths / self.seconds if self.seconds else 0.0
+
+    def band(self, quantile):
+        return self.bands[self.quantiles.index(quantile)]
+
+def _blocks(paths, seed):
+    children = np.random.SeedSequence(seed).spawn((paths + BLOCK_PATHS - 1) // BLOCK_PATHS)
+    for index, child in enumerate(children):
+        yield child, min(BLOCK_PATHS, paths - index * BLOCK_PATHS)
+
+@metrics.instrument()
+def project(positions, months=DEFAULT_MONTHS, paths=DEFAULT_PATHS, workers=None, seed=None, quantiles=QUANTILES,
+            reporting_currency=BASE_CURRENCY, **model_options):
+    # workers=None uses every core; 1 runs in this process. Worker processes are spawned rather than
+    # forked, so this is safe to call from a GUI worker thread.
+    workers = max(1, min(workers or os.cpu_count() or 1, (paths + BLOCK_PATHS - 1) // BLOCK_PATHS))
+    start = time.perf_counter()
+    model = ProjectionModel(positions, months, reporting_currency, **model_options)
+    tasks = [(model, child, count) for child, count in _blocks(paths, seed)]
+    if workers == 1:
+        results = [_run_block(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_run_block, tasks))
+    net = np.concatenate(results)
+    bands = np.percentile(net, quantiles, axis=0)
+    seconds = time.perf_counter() - start
+    dates = (np.datetime64('today', 'M') + np.arange(months + 1)).astype('datetime64[D]')
+    return Projection(dates, list(quantiles), bands, paths, workers, seconds, model.reporting_currency)
@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+from datetime import datetime
+from . import database, metrics
+from .config import BASE_CURRENCY
+from .rates import get_rate_cache
+
+# Exchange rates by day. exchange_rates holds the price of one unit of a currency in BASE_CURRENCY on a
+# date, the same quantity as accounts.exchange_rate; the rate in effect on a day is the latest one on or
+# before it. revalue() copies the rates in effect into accounts.exchange_rate, one UPDATE per currency,
+# and value_on() values the portfolio as it stood on a past date.
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+#MARK: - Loading
+def record_rates(rates, date=None, source=None, conn=None):
+    # rates: {currency: price in BASE_CURRENCY}; replaces what was recorded for those currencies on that date
+    rows = [(currency.upper(), date or _today(), float(rate), source) for currency, rate in rates.items()
+            if currency.upper() != BASE_CURRENCY and rate]
+    if conn is None:
+        with database.transaction() as conn:
+            return record_rates(rates, date, source, conn)
+    conn.executemany('INSERT OR REPLACE INTO exchange_rates (currency, date, rate, source) VALUES (?, ?, ?, ?)', rows)
+    return len(rows)
+
+def read_rates_file(path):
+    # Yields (date, currency, rate). CSV with date, currency and rate columns, or JSON {date: {currency: rate}};
+    # rates are prices in BASE_CURRENCY, like accounts.exchange_rate
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r') as file:
+            for date, rates in json.load(file).items():
+                for currency, rate in rates.items():
+                    yield date, currency, float(rate)
+        return
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+            yield row['date'], row['currency'], float(row['rate'])
+
+@metrics.instrument(rows=lambda count: count)
+def load_rates_file(path):
+    source = os.path.basename(path)
+    with database.transaction() as conn:
+        rows = [(currency.upper(), date, rate, source) for date, currency, rate in read_rates_file(path)
+                if currency.upper() != BASE_CURRENCY]
+        conn.executemany('INSERT OR REPLACE INTO exchange_rates (currency, date, rate, source) VALUES (?, ?, ?, ?)', rows)
+    return len(rows)
+
+def held_currencies():
+    with database.connection() as conn:
+        return sorted(row[0] for row in conn.execute('SELECT DISTINCT UPPER(currency) FROM accounts'))
+
+@metrics.instrument(rows=len)
+def fetch_latest(currencies=None, fetcher=None):
+    # Today's rates for every held currency from the rate cache's fetcher (the API, or the configured fixture).
+    # One request for the BASE_CURRENCY table, then one per currency it does not quote.
+    cache = get_rate_cache()
+    fetcher = fetcher or cache.fetcher
+    table = fetcher(BASE_CURRENCY) or {}
+    if table:
+        cache.store(BASE_CURRENCY, table)
+    rates = {}
+    for currency in currencies if currencies is not None else held_currencies():
+        if currency == BASE_CURRENCY:
+            continue
+        if table.get(currency):
+            rates[currency] = 1.0 / float(table[currency])
+            continue
+        direct = fetcher(currency) or {}
+        if direct.get(BASE_CURRENCY):
+            cache.store(currency, direct)
+            rates[currency] = float(direct[BASE_CURRENCY])
+    return rates
+
+#MARK: - Queries
+def rates_on(date=None, conn=None):
+    # {currency: rate in effect on date} for every currency with a rate on or before it, BASE_CURRENCY included
+    if conn is None:
+        with database.connection() as conn:
+            return rates_on(date, conn)
+    rates = dict(conn.execute('''
+        SELECT currency, (SELECT rate FROM exchange_rates WHERE currency = c.currency AND date <= :date ORDER BY date DESC LIMIT 1)
+        FROM (SELECT DISTINCT currency FROM exchange_rates) c
+    ''', {'date': date or _today()}).fetchall())
+    rates = {currency: rate for currency, rate in rates.items() if rate is not None}
+    rates[BASE_CURRENCY] = 1.0
+    return rates
+
+def rate_series(currency, start=None, end=None):
+    with database.connection() as conn:
+        return conn.execute('''
+            SELECT date, rate FROM exchange_rates WHERE currency = ? AND date >= ? AND date <= ? ORDER BY date
+        ''', (currency.upper(), start or '', end or '9999')).fetchall()
+
+#MARK: - Revaluation
+@metrics.instrument(rows=lambda updated: sum(updated.values()))
+def revalue(date=None):
+    # Re-prices every account at the rates in effect on date (today by default), one set-based UPDATE per
+    # currency that skips rows already at that rate. Currencies without a recorded rate keep theirs.
+    # Returns {currency: accounts updated}.
+    updated = {}
+    with database.transaction() as conn:
+        for currency, rate in sorted(rates_on(date, conn).items()):
+            updated[currency] = conn.execute('''
+                UPDATE accounts SET exchange_rate = ? WHERE UPPER(currency) = ? AND exchange_rate IS NOT ?
+            ''', (rate, currency, rate)).rowcount
+    return updated
+
+@metrics.instrument()
+def refresh(date=None, fetcher=None):
+    # Fetches today's rates, records them and revalues; returns (rates, {currency: accounts updated})
+    rates = fetch_latest(fetcher=fetcher)
+    if not rates and any(currency != BASE_CURRENCY for currency in held_currencies()):
+        raise ValueError("No exchange rates could be fetched")
+    record_rates(rates, date, source="api")
+    return rates, revalue(date)
+
+#MARK: - Point-in-Time Valuation
+@metrics.instrument(rows=lambda positions: len(positions.accounts))
+def load_positions_on(date):
+    # Positions as of the close of date: each account's balance from the balance history, priced at the rates
+    # in effect that day (its stored rate where none was recorded) in the currency the history recorded for it,
+    # so accounts deleted since keep theirs (BASE_CURRENCY for history from before currencies were recorded).
+    # Outcomes are those recorded on or before date, priced at that day's rate of their card's currency;
+    # undated ones (recorded before outcomes were dated) always count. Assets carry no dates, so they are today's.
+    import numpy as np
+    from .valuation import ACCOUNT_DTYPE, OUTCOME_DTYPE, ASSET_DTYPE, UNPAID_SQL, Positions
+    with database.connection() as conn:
+        rates = rates_on(date, conn)
+        rows = conn.execute('''
+            SELECT s.account_id, s.balance, a.exchange_rate, COALESCE(a.income_percentage, 0), COALESCE(NULLIF(s.currency, ''), UPPER(a.currency), ?)
+            FROM balance_snapshots s LEFT JOIN accounts a ON a.id = s.account_id
+            WHERE s.id IN (SELECT MAX(id) FROM balance_snapshots WHERE date <= ? GROUP BY account_id) AND s.balance != 0
+        ''', (BASE_CURRENCY, date)).fetchall()
+        accounts = np.array([(account_id, balance, rates.get(currency, stored if stored is not None else 1.0), income, currency)
+                             for account_id, balance, stored, income, currency in rows], dtype=ACCOUNT_DTYPE)
+        outcomes = np.array([(outcome_id, amount, unpaid, rates.get(currency, stored) if currency else 1.0)
+                             for outcome_id, amount, unpaid, stored, currency in conn.execute(f'''
+                                 SELECT o.id, o.amount, {UNPAID_SQL}, a.exchange_rate, UPPER(a.currency)
+                                 FROM credit_card_outcomes o LEFT JOIN accounts a ON a.id = o.account_id
+                                 WHERE o.date <= ?
+                             ''', (date,))], dtype=OUTCOME_DTYPE)
+        assets = np.array(conn.execute('SELECT id, quantity, price_per_unit FROM assets').fetchall(), dtype=ASSET_DTYPE)
+    return Positions(accounts, assets, outcomes), rates
+
+def value_on(date, reporting_currency=BASE_CURRENCY):
+    # valuation.Valuation of the portfolio on date, e.g. value_on("2024-06-30", "TRY").net_worth
+    from .valuation import value_portfolio
+    positions, rates = load_positions_on(date)
+
+    def rate_lookup(currency, quote=BASE_CURRENCY):
+        return rates.get(currency.upper())
+    return value_portfolio(positions, reporting_currency, rate_lookup)
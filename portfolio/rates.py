@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from . import database, metrics
+from .config import load_config
+
+API_URL = "https://api.exchangerate-api.com/v4/latest/{base}"
+DEFAULT_TTL = 3600  # Seconds a fetched rate stays fresh
+DEFAULT_MAX_ENTRIES = 2048  # One /latest table is ~160 quotes
+REQUEST_TIMEOUT = 5
+
+#MARK: - Fetchers
+# A fetcher takes a base currency and returns {quote: rate} for every quote, or None on failure
+def http_fetcher(retries=3, delay=1):
+    @metrics.instrument("rates.fetch")
+    def fetch(base):
+        import requests
+        for attempt in range(retries):
+            try:
+                response = requests.get(API_URL.format(base=base), timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                return response.json()['rates']
+            except Exception as e:
+                print(f"Attempt {attempt + 1} - Error fetching exchange rates for {base}: {str(e)}")
+                if attempt < retries - 1:
+                    metrics.increment("rates.fetch", "retries")
+                    time.sleep(delay * (attempt + 1))
+        return None
+    return fetch
+
+def fixture_fetcher(path):
+    # Offline mode: {"USD": {"TRY": 32.5, "EUR": 0.92}, ...} or a saved /latest response ({"base": ..., "rates": ...})
+    with open(path, 'r') as file:
+        data = json.load(file)
+    if 'rates' in data:
+        data = {data['base']: data['rates']}
+    tables = {base.upper(): rates for base, rates in data.items()}
+
+    def fetch(base):
+        return tables.get(base)
+    return fetch
+
+#MARK: - Rate Cache
+class RateCache:
+    def __init__(self, fetcher, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, persist=True):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.stale_hits = 0
+        self._entries = OrderedDict()  # (base, quote) -> (rate, fetched_at), least recently used first
+        self._lock = threading.Lock()
+        self._loaded = not persist
+
+    @metrics.instrument("rates.get")
+    def get(self, base, quote="TRY"):
+        base, quote = base.upper(), quote.upper()
+        if base == quote:
+            return 1.0
+        key = (base, quote)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            self.fetches += 1
+
+        # One request serves every quote for this base
+        rates = self.fetcher(base)
+        if not rates:
+            with self._lock:
+                self.fetch_errors += 1
+                if entry:
+                    self.stale_hits += 1
+            return entry[0] if entry else None
+        self.store(base, rates)
+        rate = rates.get(quote)
+        return float(rate) if rate is not None else None
+
+    def store(self, base, rates, fetched_at=None):
+        fetched_at = fetched_at or time.time()
+        rows = [(base.upper(), quote.upper(), float(rate), fetched_at) for quote, rate in rates.items()]
+        with self._lock:
+            for base_currency, quote, rate, fetched in rows:
+                key = (base_currency, quote)
+                self._entries[key] = (rate, fetched)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.persist:
+            with database.transaction() as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO exchange_rate_cache (base, quote, rate, fetched_at)
+                    VALUES (?, ?, ?, ?)
+                ''', rows)
+
+    def _load(self):
+        # Warm the in-memory cache from the still-fresh persisted rows on first use; the table is created by
+        # migration 13, so this is a plain read
+        if self._loaded:
+            return
+        self._loaded = True
+        with database.connection() as conn:
+            rows = conn.execute('''
+                SELECT base, quote, rate, fetched_at FROM exchange_rate_cache
+                WHERE fetched_at > ? ORDER BY fetched_at DESC LIMIT ?
+            ''', (time.time() - self.ttl, self.max_entries)).fetchall()
+        for base, quote, rate, fetched_at in reversed(rows):
+            self._entries[(base, quote)] = (rate, fetched_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persist:
+            with database.transaction() as conn:
+                conn.execute('DELETE FROM exchange_rate_cache')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "stale_hits": self.stale_hits,
+            "entries": len(self._entries),
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_rate_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = load_config()
+                fixture = config.get("exchange_rate_fixture")
+                fetcher = fixture_fetcher(fixture) if fixture else http_fetcher()
+                _cache = RateCache(fetcher, config.get("exchange_rate_ttl", DEFAULT_TTL),
+                                   config.get("exchange_rate_cache_size", DEFAULT_MAX_ENTRIES))
+    return _cache
+
+def set_rate_cache(cache):
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,251 @@
+import re
+import sqlite3
+import threading
+from . import database, metrics
+
+# Full-text search and categories for credit card outcomes.
+# outcomes_fts is an FTS5 index over credit_card_outcomes.description (external content, so the text
+# is stored once) and outcome_categories gives every outcome the category of the first rule whose LIKE
+# pattern matches its description. Triggers keep both in step with the outcomes, and category_totals
+# with outcome_categories, so per-category totals are single-row reads like portfolio_totals.
+# FTS5 flushes its pending terms at every statement a trigger runs in, which would cut outcome inserts
+# to a tenth of their speed, so the triggers queue index changes in outcomes_fts_pending instead and
+# sync_index() applies the queue in one statement before every search.
+UNCATEGORIZED = "Uncategorized"
+
+# prefix='2 3' keeps short prefix queries (search as you type) off a full term scan. Archive files
+# (archive.py) index their outcomes the same way.
+FTS_OPTIONS = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+def _category(description):
+    # Highest priority first, then the oldest rule
+    return f'''COALESCE((SELECT category FROM category_rules WHERE {description} LIKE pattern
+                         ORDER BY priority DESC, id LIMIT 1), '{UNCATEGORIZED}')'''
+
+def rebuild_search(conn):
+    conn.execute("INSERT INTO outcomes_fts (outcomes_fts) VALUES ('rebuild')")
+    conn.execute('DELETE FROM outcomes_fts_pending')
+    conn.execute('DELETE FROM outcome_categories')
+    conn.execute(f'''
+        INSERT INTO outcome_categories (outcome_id, category, amount)
+        SELECT id, {_category('description')}, amount FROM credit_card_outcomes
+    ''')
+    conn.execute('DELETE FROM category_totals')
+    conn.execute('''
+        INSERT INTO category_totals (category, total, row_count)
+        SELECT category, SUM(amount), COUNT(*) FROM outcome_categories GROUP BY category
+    ''')
+
+#MARK: - Search
+_sync_lock = threading.Lock()
+
+@metrics.instrument(rows=lambda count: count)
+def sync_index():
+    # Applies the queued index changes in order; returns how many there were
+    with _sync_lock:
+        with database.connection() as conn:
+            last = conn.execute('SELECT MAX(seq) FROM outcomes_fts_pending').fetchone()[0]
+        if last is None:
+            return 0
+        with database.transaction() as conn:
+            count = conn.execute('''
+                INSERT INTO outcomes_fts (outcomes_fts, rowid, description)
+                SELECT command, outcome_id, description FROM outcomes_fts_pending WHERE seq <= ? ORDER BY seq
+            ''', (last,)).rowcount
+            conn.execute('DELETE FROM outcomes_fts_pending WHERE seq <= ?', (last,))
+        return count
+
+TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+def match_query(text, prefix_last=False):
+    # User text to an FTS5 query: every word must match, "quoted words" match as a phrase and word* as a
+    # prefix; with prefix_last the last word is a prefix too (search as you type). Everything else is
+    # quoted, so no input is an FTS5 syntax error. None when there is nothing to search for.
+    terms = []
+    for phrase, word in TERM.findall(text):
+        words = re.findall(r'\w+', phrase or word)
+        if not words:
+            continue
+        # A word the tokenizer splits (e-mail, 3.5) matches as the phrase of its parts
+        terms.append('"' + ' '.join(words) + '"' + ('*' if word.endswith('*') else ''))
+    if not terms:
+        return None
+    if prefix_last and not terms[-1].endswith('*') and not TERM.findall(text)[-1][0]:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+RESULT_COLUMNS = ("id", "account_id", "amount", "description", "category")
+# bm25 scores every match before the top ones are known (about 5 ms per 1,000), so a query that matches
+# more than this returns its newest matches instead, straight off the index
+RANK_LIMIT = 10_000
+
+class Results:
+    def __init__(self, rows, matches, ranked):
+        self.rows = rows  # (id, account_id, amount, description, category)
+        self.matches = matches  # Every outcome the text matches, before the category and limit
+        self.ranked = ranked  # Best matches first; newest first when False
+
+def _count(conn, match):
+    return conn.execute('SELECT COUNT(*) FROM outcomes_fts WHERE outcomes_fts MATCH ?', (match,)).fetchone()[0]
+
+@metrics.instrument(rows=lambda results: len(results.rows))
+def search_outcomes(text='', category=None, limit=100, prefix_last=False, history=False):
+    # Best matches first for text, the largest outcomes for a category alone. With history the archived
+    # years follow the hot outcomes, newest year first; each archive has an index of its own (archive.py).
+    match = match_query(text or '', prefix_last)
+    if match is None and category is None:
+        return Results([], 0, False)
+    if match is not None:
+        sync_index()
+    results = _search(match, category, limit)
+    return _search_archives(results, match, category, limit) if history else results
+
+def _search(match, category, limit):
+    with database.connection() as conn:
+        if match is None:
+            rows = conn.execute('''
+                SELECT o.id, o.account_id, o.amount, o.description, c.category
+                FROM outcome_categories c JOIN credit_card_outcomes o ON o.id = c.outcome_id
+                WHERE c.category = ? ORDER BY c.amount DESC LIMIT ?
+            ''', (category, limit)).fetchall()
+            return Results(rows, len(rows), False)
+        matches = _count(conn, match)
+        ranked = matches <= RANK_LIMIT
+        rows = conn.execute(f'''
+            SELECT o.id, o.account_id, o.amount, o.description, c.category
+            FROM outcomes_fts f JOIN credit_card_outcomes o ON o.id = f.rowid JOIN outcome_categories c ON c.outcome_id = o.id
+            WHERE outcomes_fts MATCH :match {'AND c.category = :category' if category is not None else ''}
+            ORDER BY {'f.rank' if ranked else 'f.rowid DESC'} LIMIT :limit
+        ''', {'match': match, 'category': category, 'limit': limit}).fetchall()
+    return Results(rows, matches, ranked)
+
+def _search_archives(results, match, category, limit):
+    # The hot results followed by archived ones up to limit; every archived match counts towards matches
+    from . import archive
+    rows, matches = list(results.rows), results.matches
+    with archive.history() as conn:
+        for year, schema in archive.schemas(conn):
+            filters = f"o.{archive.visible(year)}" + (" AND o.category = :category" if category is not None else "")
+            params = {'match': match, 'category': category, 'limit': limit - len(rows)}
+            if match is None:
+                if len(rows) >= limit:
+                    break
+                found = conn.execute(f'''
+                    SELECT o.id, o.account_id, o.amount, o.description, o.category FROM {schema}.credit_card_outcomes o
+                    WHERE {filters} ORDER BY o.amount DESC LIMIT :limit
+                ''', params).fetchall()
+                rows += found
+                matches += len(found)
+                continue
+            count = conn.execute(f'''
+                SELECT COUNT(*) FROM {schema}.outcomes_fts f JOIN {schema}.credit_card_outcomes o ON o.id = f.rowid
+                WHERE f.outcomes_fts MATCH :match AND o.{archive.visible(year)}
+            ''', params).fetchone()[0]
+            matches += count
+            if len(rows) < limit:
+                rows += conn.execute(f'''
+                    SELECT o.id, o.account_id, o.amount, o.description, o.category
+                    FROM {schema}.outcomes_fts f JOIN {schema}.credit_card_outcomes o ON o.id = f.rowid
+                    WHERE f.outcomes_fts MATCH :match AND {filters}
+                    ORDER BY {'f.rank' if count <= RANK_LIMIT else 'f.rowid DESC'} LIMIT :limit
+                ''', params).fetchall()
+    return Results(rows, matches, results.ranked)
+
+def count_matches(text, prefix_last=False):
+    match = match_query(text or '', prefix_last)
+    if match is None:
+        return 0
+    sync_index()
+    with database.connection() as conn:
+        return _count(conn, match)
+
+#MARK: - Categories
+def get_category_totals(history=False):
+    # [(category, total, outcomes)], largest first, for every category that has outcomes. With history the
+    # archived years are added from the rollups the main database keeps of them.
+    with database.connection() as conn:
+        if history:
+            return conn.execute('''
+                SELECT category, SUM(total), SUM(row_count) FROM (
+                    SELECT category, total, row_count FROM category_totals
+                    UNION ALL SELECT category, SUM(amount), SUM(outcomes) FROM outcome_rollups GROUP BY category
+                ) GROUP BY category HAVING SUM(row_count) > 0 ORDER BY 2 DESC
+            ''').fetchall()
+        return conn.execute('''
+            SELECT category, total, row_count FROM category_totals WHERE row_count > 0 ORDER BY total DESC
+        ''').fetchall()
+
+def get_rules():
+    with database.connection() as conn:
+        return conn.execute('SELECT id, category, pattern, priority FROM category_rules ORDER BY priority DESC, id').fetchall()
+
+@metrics.instrument(rows=lambda count: count)
+def recategorize(conn):
+    # Applies the current rules to every outcome in one UPDATE; only outcomes whose category changes are
+    # written, and the totals follow them through the triggers. Returns how many moved.
+    return conn.execute(f'''
+        UPDATE outcome_categories SET category = n.category
+        FROM (SELECT id, {_category('description')} AS category FROM credit_card_outcomes) n
+        WHERE outcome_categories.outcome_id = n.id AND outcome_categories.category != n.category
+    ''').rowcount
+
+def add_rule(category, pattern, priority=0):
+    # Returns (rule id, outcomes recategorized)
+    with database.transaction() as conn:
+        cursor = conn.execute('INSERT INTO category_rules (category, pattern, priority) VALUES (?, ?, ?)',
+                              (category, pattern, priority))
+        return cursor.lastrowid, recategorize(conn)
+
+def delete_rule(rule_id):
+    with database.transaction() as conn:
+        conn.execute('DELETE FROM category_rules WHERE id = ?', (rule_id,))
+        return recategorize(conn)
+
+def check_search(tolerance=1e-6):
+    # The index against the descriptions, category_totals against a recount of outcome_categories, and
+    # outcome_categories against the outcomes; returns (check, key, stored, actual)
+    problems = []
+    sync_index()
+    with database.connection() as conn:
+        try:
+            conn.execute("INSERT INTO outcomes_fts (outcomes_fts, rank) VALUES ('integrity-check', 1)")
+        except sqlite3.DatabaseError as error:
+            problems.append(('index', 'outcomes_fts', str(error), None))
+        stored = {category: (total, count) for category, total, count in conn.execute(
+            'SELECT category, total, row_count FROM category_totals WHERE row_count != 0')}
+        actual = {category: (total, count) for category, total, count in conn.execute(
+            'SELECT category, SUM(amount), COUNT(*) FROM outcome_categories GROUP BY category')}
+        for category in sorted(stored.keys() | actual.keys()):
+            stored_total, stored_count = stored.get(category, (0, 0))
+            actual_total, actual_count = actual.get(category, (0, 0))
+            if stored_count != actual_count or abs(stored_total - actual_total) > tolerance * max(1.0, abs(actual_total)):
+                problems.append(('total', category, stored_total, actual_total))
+        for outcome_id, stored_amount, actual_amount in conn.execute('''
+            SELECT o.id, c.amount, o.amount FROM credit_card_outcomes o LEFT JOIN outcome_categories c ON c.outcome_id = o.id
+            WHERE c.amount IS NOT o.amount
+            UNION ALL
+            SELECT c.outcome_id, c.amount, NULL FROM outcome_categories c
+            WHERE NOT EXISTS (SELECT 1 FROM credit_card_outcomes WHERE id = c.outcome_id)
+        '''):
+            problems.append(('outcome', outcome_id, stored_amount, actual_amount))
+    return problems
+
+def repair_search():
+    with database.transaction() as conn:
+        rebuild_search(conn)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the search index, outcome categories and their totals against the outcomes")
+    parser.add_argument("--repair", action="store_true", help="Rebuild the search index, categories and totals")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    args = parser.parse_args()
+    if args.database:
+        database.configure(args.database)
+    problems = check_search()
+    for check, key, stored, actual in problems:
+        print(f"{check} {key}: stored {stored}, actual {actual}")
+    print(f"{len(problems)} discrepancies")
+    if problems and args.repair:
+        repair_search()
+        print("Search index and categories rebuilt")
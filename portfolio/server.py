@@ -0,0 +1,487 @@
+import asyncio
+import json
+import re
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+from . import database, history, metrics, pages, store, summary
+from .config import BASE_CURRENCY
+from .models import Asset, BankAccount, CreditCardOutcome
+
+# Local HTTP/JSON API over the portfolio database, standard library only: python -m portfolio serve
+#   GET, POST            /accounts, /outcomes, /assets          a page (?limit=&after=<last id>), or add one
+#   GET, PUT, DELETE     /accounts/<id>, /outcomes/<id>, /assets/<id>
+#   GET                  /totals?currency=, /money-over-time?start=&end=&granularity=day|month&currency=
+#   GET                  /health, and /metrics (Prometheus text) when started with --metrics
+# The event loop only parses and answers requests. Reads run on a fixed pool of threads, each with a
+# pooled WAL connection, so readers never wait for each other or for a writer; a request that would
+# queue behind too many others gets 503 rather than piling up. Writes go through one queue to one
+# thread, and whatever has queued while a batch commits goes into the next batch: one transaction and
+# one commit for many clients, each write in a savepoint of its own so a bad one fails alone.
+# The aggregates carry an ETag built from PRAGMA data_version, which moves whenever anything commits,
+# so the answer is computed once per change however many clients poll, and If-None-Match gets a 304.
+# The GUI may have the same file open: its cache (cache.py) merges its flushes with these writes and
+# reads the tables again once it sees them.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+QUEUE_DEPTH = 32  # Reads waiting per worker thread before new ones get 503
+MAX_PENDING_WRITES = 1024
+MAX_BATCH = 256  # Writes per transaction
+MAX_PAGE_SIZE = 1000
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+KEEP_ALIVE_TIMEOUT = 15  # Seconds an idle connection stays open
+AGGREGATE_CACHE_SIZE = 128  # Distinct aggregate URLs kept with their ETag
+DATE = re.compile(r"^\d{4}-\d{2}(-\d{2})?$")
+CURRENCY = re.compile(r"^[A-Za-z]{3}$")
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None, headers=None):
+        self.status = HTTPStatus(status)
+        self.message = message or self.status.phrase
+        self.headers = headers or {}
+        super().__init__(self.message)
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # Lower-case names
+        self.body = body
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query))
+        self.route = None  # e.g. "GET /accounts/{id}", for metrics
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        return connection != "close" if self.version == "HTTP/1.1" else connection == "keep-alive"
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    def int_param(self, name, default, minimum, maximum):
+        value = self.query.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise HTTPError(400, f"{name} must be an integer")
+        if not minimum <= value <= maximum:
+            raise HTTPError(400, f"{name} must be between {minimum} and {maximum}")
+        return value
+
+#MARK: - Validation
+def _field(data, name, kind, required=True):
+    value = data.get(name)
+    if value is None:
+        if required:
+            raise HTTPError(400, f"{name} is required")
+        return None
+    if kind is float and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if kind is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if kind is str and isinstance(value, str):
+        return value
+    raise HTTPError(400, f"{name} must be {'a number' if kind is float else 'an integer' if kind is int else 'a string'}")
+
+def account_from(data):
+    return BankAccount(_field(data, "account_type", str), _field(data, "currency", str).upper(),
+                       _field(data, "exchange_rate", float), _field(data, "balance", float),
+                       _field(data, "income_percentage", float, required=False))
+
+def outcome_from(data):
+    distributions = data.get("account_distributions") or {}
+    if not isinstance(distributions, dict):
+        raise HTTPError(400, "account_distributions must be an object of account id to amount")
+    try:
+        distributions = {int(account_id): float(amount) for account_id, amount in distributions.items()}
+    except (TypeError, ValueError):
+        raise HTTPError(400, "account_distributions must be an object of account id to amount")
+    return CreditCardOutcome(_field(data, "account_id", int), _field(data, "amount", float),
+                             _field(data, "description", str, required=False) or "", distributions)
+
+def asset_from(data):
+    return Asset(_field(data, "name", str), _field(data, "quantity", float), _field(data, "price_per_unit", float))
+
+#MARK: - Resources
+class Resource:
+    def __init__(self, page_table, table, parse, add, update, delete, references=None):
+        self.page_table = page_table  # Key of pages.TABLES, which also gives each row's shape here
+        self.table = table
+        self.parse = parse
+        self.add = add
+        self.update = update
+        self.delete = delete
+        self.references = references  # item -> ids of the accounts it points at, which must exist
+
+RESOURCES = {
+    "accounts": Resource("accounts", "accounts", account_from, store.add_account, store.update_account, store.delete_account),
+    "outcomes": Resource("outcomes", "credit_card_outcomes", outcome_from, store.add_credit_card_outcome,
+                         store.update_credit_card_outcome, store.delete_credit_card_outcome,
+                         lambda outcome: {outcome.account_id, *outcome.account_distributions}),
+    "assets": Resource("assets", "assets", asset_from, store.add_asset, store.update_asset, store.delete_asset),
+}
+
+def _item(columns, row):
+    item = dict(zip(columns, row))
+    if "account_distributions" in item:
+        # "2:50.0;3:25.0" as pages.py writes it, back to {"2": 50.0, "3": 25.0}
+        item["account_distributions"] = {account_id: float(amount) for account_id, _, amount in
+                                         (part.partition(":") for part in item["account_distributions"].split(";") if part)}
+    return item
+
+def list_items(resource, after, limit):
+    page = pages.fetch_page(resource.page_table, after=None if after is None else (after, after), limit=limit)
+    return {"items": [_item(page.columns, row) for row in pages.display_rows(page)],
+            "next": page.boundary()[1] if page.has_next else None}
+
+def get_item(resource, item_id):
+    source, column_list = pages.TABLES[resource.page_table]
+    with database.connection() as conn:
+        row = conn.execute(f"SELECT {', '.join(expression for _, expression in column_list)} {source} "
+                           f"WHERE {column_list[0][1]} = ?", (item_id,)).fetchone()
+    if row is None:
+        raise HTTPError(404, f"No such {resource.page_table[:-1]}: {item_id}")
+    return _item(pages.columns(resource.page_table), row)
+
+def _exists(resource, item_id):
+    with database.connection() as conn:
+        if conn.execute(f"SELECT 1 FROM {resource.table} WHERE id = ?", (item_id,)).fetchone() is None:
+            raise HTTPError(404, f"No such {resource.page_table[:-1]}: {item_id}")
+
+def _check_references(resource, item):
+    # The accounts are named in the request body rather than the path, so a missing one is a 400
+    if resource.references is None:
+        return
+    account_ids = sorted(resource.references(item))
+    with database.connection() as conn:
+        found = {row[0] for row in conn.execute(
+            f"SELECT id FROM accounts WHERE id IN ({', '.join('?' * len(account_ids))})", account_ids)}
+    missing = [account_id for account_id in account_ids if account_id not in found]
+    if missing:
+        raise HTTPError(400, f"No such account: {', '.join(map(str, missing))}")
+
+# Run on the writer thread inside WriteBatcher's transaction
+def create_item(resource, item):
+    _check_references(resource, item)
+    return {"id": resource.add(item)}
+
+def replace_item(resource, item_id, item):
+    _exists(resource, item_id)
+    _check_references(resource, item)
+    resource.update(item_id, item)
+    return {"id": item_id}
+
+def delete_item(resource, item_id):
+    _exists(resource, item_id)
+    resource.delete(item_id)
+    return {"id": item_id}
+
+def totals(currency):
+    # total_money is converted into currency; the breakdowns stay in each account's own currency
+    try:
+        total_money = history.total_money(currency)
+    except ValueError as error:
+        raise HTTPError(400, str(error))
+    return {"currency": currency, "total_money": total_money, "total_outcome": store.calculate_total_outcome(),
+            "by_currency": summary.get_totals("currency"), "by_account_type": summary.get_totals("account_type")}
+
+def _currency(request):
+    currency = request.query.get("currency", BASE_CURRENCY)
+    if not CURRENCY.match(currency):
+        raise HTTPError(400, "currency must be a three-letter code")
+    return currency.upper()
+
+def money_over_time(start, end, granularity, currency):
+    try:
+        points = history.money_over_time(start, end, granularity, currency)
+    except ValueError as error:
+        raise HTTPError(400, str(error))
+    return {"granularity": granularity, "currency": currency, "points": [list(point) for point in points]}
+
+#MARK: - Write Batching
+@metrics.instrument("server.write_batch", rows=len)
+def _run_batch(items):
+    # [(ok, result or exception)] in order; a failed write is rolled back to its savepoint, the rest commit
+    results = []
+    with database.batch():
+        for fn, args, _ in items:
+            try:
+                with database.transaction():
+                    results.append((True, fn(*args)))
+            except Exception as error:
+                results.append((False, error))
+    return results
+
+class WriteBatcher:
+    def __init__(self, executor, max_batch=MAX_BATCH, max_pending=MAX_PENDING_WRITES):
+        self._executor = executor
+        self.max_batch = max_batch
+        self._queue = asyncio.Queue(max_pending)
+
+    async def submit(self, fn, *args):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((fn, args, future))
+        except asyncio.QueueFull:
+            raise HTTPError(503, "Too many writes waiting", {"Retry-After": "1"})
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            while len(items) < self.max_batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(self._executor, _run_batch, items)
+            except Exception as error:
+                # The transaction as a whole failed (e.g. the file stayed locked), so none of it was written
+                results = [(False, error)] * len(items)
+            for (_, _, future), (ok, value) in zip(items, results):
+                if future.done():
+                    continue  # The client went away; its write stands
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+#MARK: - Server
+def _json(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+def _response(status, body=b"", headers=None, keep_alive=True):
+    fields = {"Connection": "keep-alive" if keep_alive else "close"}
+    if status not in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED):
+        fields["Content-Length"] = len(body)
+        if body:
+            fields["Content-Type"] = "application/json"
+    fields.update(headers or {})
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}"] + [f"{name}: {value}" for name, value in fields.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+async def _read_request(reader):
+    # None once the client has closed the connection between requests
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n"):
+            break
+        if not line:
+            return None
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(431)
+        name, separator, value = line.decode("latin-1").partition(":")
+        if not separator:
+            raise HTTPError(400, "Malformed header")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Send a Content-Length instead of a chunked body")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length > 0 else b""
+    return Request(method.upper(), target, version, headers, body)
+
+class Server:
+    def __init__(self, workers=DEFAULT_WORKERS, max_batch=MAX_BATCH):
+        self.path = database.get_pool().path
+        if self.path == ":memory:":
+            raise ValueError("The server needs a database file; every :memory: connection is a separate database")
+        self.workers = workers
+        self.read_limit = workers * QUEUE_DEPTH
+        self.max_batch = max_batch
+        self._reading = 0
+        self._aggregates = OrderedDict()  # target -> (data_version, etag, body)
+        self._boot = format(time.time_ns(), "x")  # An ETag from before a restart never matches
+        self._monitor = None
+        self._readers = self._writer = self._batcher = None
+
+    #MARK: Database Work
+    def data_version(self):
+        return self._monitor.execute("PRAGMA data_version").fetchone()[0]
+
+    async def read(self, fn, *args):
+        if self._reading >= self.read_limit:
+            raise HTTPError(503, "Too many requests waiting for the database", {"Retry-After": "1"})
+        self._reading += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._readers, fn, *args)
+        finally:
+            self._reading -= 1
+
+    async def aggregate(self, request, fn, *args):
+        # Computed once per committed change. The version is read before computing, so an answer that
+        # raced a commit is tagged with the older version and recomputed on the next request.
+        version = self.data_version()
+        cached = self._aggregates.get(request.target)
+        if cached is None or cached[0] != version:
+            cached = (version, f'"{self._boot}-{version}"', _json(await self.read(fn, *args)))
+            self._aggregates[request.target] = cached
+            while len(self._aggregates) > AGGREGATE_CACHE_SIZE:
+                self._aggregates.popitem(last=False)
+        else:
+            self._aggregates.move_to_end(request.target)
+        _, etag, body = cached
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        matches = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+        if etag in matches or "*" in matches:
+            return HTTPStatus.NOT_MODIFIED, b"", headers
+        return HTTPStatus.OK, body, headers
+
+    #MARK: Routing
+    async def route(self, request):
+        parts = [part for part in request.path.split("/") if part]
+        method = request.method
+        if len(parts) == 1 and parts[0] in RESOURCES:
+            resource = RESOURCES[parts[0]]
+            request.route = f"{method} /{parts[0]}"
+            if method == "GET":
+                after = request.int_param("after", None, 0, sys.maxsize)
+                limit = request.int_param("limit", pages.DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+                return HTTPStatus.OK, _json(await self.read(list_items, resource, after, limit)), None
+            if method == "POST":
+                result = await self._batcher.submit(create_item, resource, resource.parse(request.json()))
+                return HTTPStatus.CREATED, _json(result), {"Location": f"/{parts[0]}/{result['id']}"}
+            raise HTTPError(405, headers={"Allow": "GET, POST"})
+        if len(parts) == 2 and parts[0] in RESOURCES:
+            resource = RESOURCES[parts[0]]
+            request.route = f"{method} /{parts[0]}/{{id}}"
+            if not parts[1].isdigit():
+                raise HTTPError(404, f"No such {parts[0][:-1]}: {parts[1]}")
+            item_id = int(parts[1])
+            if method == "GET":
+                return HTTPStatus.OK, _json(await self.read(get_item, resource, item_id)), None
+            if method == "PUT":
+                return HTTPStatus.OK, _json(await self._batcher.submit(replace_item, resource, item_id, resource.parse(request.json()))), None
+            if method == "DELETE":
+                return HTTPStatus.OK, _json(await self._batcher.submit(delete_item, resource, item_id)), None
+            raise HTTPError(405, headers={"Allow": "GET, PUT, DELETE"})
+        path = "/" + "/".join(parts)
+        request.route = f"{method} {path}"
+        if path not in ("/totals", "/money-over-time", "/health", "/metrics"):
+            request.route = f"{method} (unknown)"
+            raise HTTPError(404, f"No such resource: {request.path}")
+        if method != "GET":
+            raise HTTPError(405, headers={"Allow": "GET"})
+        if path == "/totals":
+            return await self.aggregate(request, totals, _currency(request))
+        if path == "/money-over-time":
+            start, end = request.query.get("start"), request.query.get("end")
+            granularity = request.query.get("granularity", "day")
+            if granularity not in ("day", "month"):
+                raise HTTPError(400, "granularity must be day or month")
+            for value in (start, end):
+                if value is not None and not DATE.match(value):
+                    raise HTTPError(400, "start and end must be YYYY-MM-DD")
+            return await self.aggregate(request, money_over_time, start, end, granularity, _currency(request))
+        if path == "/metrics" and metrics.enabled():
+            return HTTPStatus.OK, metrics.prometheus_text().encode(), {"Content-Type": "text/plain; version=0.0.4"}
+        if path == "/metrics":
+            raise HTTPError(404, "Metrics are off; start the server with --metrics")
+        return HTTPStatus.OK, _json({"status": "ok", "data_version": self.data_version()}), None
+
+    async def handle(self, request):
+        start = time.perf_counter()
+        try:
+            status, body, headers = await self.route(request)
+        except HTTPError as error:
+            status, body, headers = error.status, _json({"error": error.message}), error.headers
+        except sqlite3.IntegrityError as error:
+            status, body, headers = HTTPStatus.CONFLICT, _json({"error": str(error)}), None
+        except sqlite3.OperationalError as error:
+            # Locked or busy past the busy timeout, e.g. while the GUI holds a long write
+            status, body, headers = HTTPStatus.SERVICE_UNAVAILABLE, _json({"error": str(error)}), {"Retry-After": "1"}
+        except Exception as error:
+            print(f"{request.method} {request.target}: {error!r}", file=sys.stderr)
+            status, body, headers = HTTPStatus.INTERNAL_SERVER_ERROR, _json({"error": "Internal server error"}), None
+        if metrics.enabled():
+            metrics.record(f"server.{request.route or request.method}", (time.perf_counter() - start) * 1000,
+                           error=status >= 500)
+        return status, body, headers
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except HTTPError as error:
+                    writer.write(_response(error.status, _json({"error": error.message}), keep_alive=False))
+                    await writer.drain()
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    writer.write(_response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                status, body, headers = await self.handle(request)
+                writer.write(_response(status, body, headers, request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    #MARK: Lifecycle
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        # Returns the listening asyncio.Server; port 0 picks a free one (server.sockets[0].getsockname())
+        store.create_database()
+        self._monitor = sqlite3.connect(self.path, check_same_thread=False)
+        self._readers = ThreadPoolExecutor(self.workers, thread_name_prefix="portfolio-read")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="portfolio-write")
+        self._batcher = WriteBatcher(self._writer, self.max_batch)
+        self._batch_task = asyncio.create_task(self._batcher.run())
+        return await asyncio.start_server(self.serve_connection, host, port)
+
+    def close(self):
+        self._batch_task.cancel()
+        self._readers.shutdown()
+        self._writer.shutdown()
+        self._monitor.close()
+
+    async def run(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        listener = await self.start(host, port)
+        address = listener.sockets[0].getsockname()
+        print(f"Serving {self.path} on http://{address[0]}:{address[1]} ({self.workers} readers)", flush=True)
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            self.close()
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, max_batch=MAX_BATCH):
+    # One pooled connection per reader plus the writer's, so no thread waits on the pool
+    database.configure(database.get_pool().path, workers + 1)
+    try:
+        asyncio.run(Server(workers, max_batch).run(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+import numpy as np
+from . import database, metrics
+
+# Columnar snapshots for analytics: a directory with one .npy file per column and a manifest.json.
+# Every table is read in one read transaction, so they all show the same moment even while the GUI or
+# the API keeps writing. Rows are fetched CHUNK_SIZE at a time straight into files opened with
+# open_memmap, so memory stays flat however large the tables are.
+# load_snapshot() maps the files back (np.load(mmap_mode='r')): opening a snapshot reads only the
+# manifest, and a column's pages are read from disk the first time they are touched, without a copy.
+# Strings are stored the way Arrow stores them, as UTF-8 bytes (uint8) plus n + 1 int64 offsets.
+# NULL numbers become NaN and NULL strings "". Outcome distributions get a table of their own.
+SNAPSHOT_VERSION = 1
+CHUNK_SIZE = 65_536
+MANIFEST = "manifest.json"
+
+# table: (FROM clause, ORDER BY, [(column, SQL expression, kind)]); kind is "i8", "f8" or "str"
+TABLES = {
+    "accounts": ("FROM accounts", "id", [
+        ("id", "id", "i8"),
+        ("account_type", "account_type", "str"),
+        ("currency", "currency", "str"),
+        ("exchange_rate", "exchange_rate", "f8"),
+        ("balance", "balance", "f8"),
+        ("income_percentage", "income_percentage", "f8"),
+        ("date", "date", "str"),
+    ]),
+    "outcomes": ("FROM credit_card_outcomes", "id", [
+        ("id", "id", "i8"),
+        ("account_id", "account_id", "i8"),
+        ("amount", "amount", "f8"),
+        ("description", "description", "str"),
+    ]),
+    "distributions": ("FROM outcome_distributions", "outcome_id, account_id", [
+        ("outcome_id", "outcome_id", "i8"),
+        ("account_id", "account_id", "i8"),
+        ("amount", "amount", "f8"),
+    ]),
+    "assets": ("FROM assets", "id", [
+        ("id", "id", "i8"),
+        ("name", "name", "str"),
+        ("quantity", "quantity", "f8"),
+        ("price_per_unit", "price_per_unit", "f8"),
+    ]),
+}
+
+def _select(expression, kind):
+    # Strings are read as SQLite renders them, so their UTF-8 length matches what was counted up front
+    return f"COALESCE(CAST({expression} AS TEXT), '')" if kind == "str" else expression
+
+def _files(table, column, kind):
+    if kind == "str":
+        return {"offsets": f"{table}.{column}.offsets.npy", "data": f"{table}.{column}.data.npy"}
+    return {"values": f"{table}.{column}.npy"}
+
+#MARK: - Writing
+def _write_table(conn, directory, table, chunk_size):
+    source, order, column_list = TABLES[table]
+    selected = [_select(expression, kind) for _, expression, kind in column_list]
+    # One pass for the sizes, so every file can be created at its final length before any row is written
+    strings = [index for index, (_, _, kind) in enumerate(column_list) if kind == "str"]
+    sizes = conn.execute(f"SELECT COUNT(*){''.join(f', COALESCE(SUM(LENGTH(CAST({selected[index]} AS BLOB))), 0)' for index in strings)} {source}").fetchone()
+    rows, byte_sizes = sizes[0], dict(zip(strings, sizes[1:]))
+    columns = []
+    for index, (column, _, kind) in enumerate(column_list):
+        files = _files(table, column, kind)
+        if kind == "str":
+            offsets = np.lib.format.open_memmap(os.path.join(directory, files["offsets"]), mode="w+", dtype=np.int64, shape=(rows + 1,))
+            data = np.lib.format.open_memmap(os.path.join(directory, files["data"]), mode="w+", dtype=np.uint8, shape=(byte_sizes[index],))
+            columns.append((kind, offsets, data))
+        else:
+            columns.append((kind, np.lib.format.open_memmap(os.path.join(directory, files["values"]), mode="w+", dtype=kind, shape=(rows,)), None))
+    cursor = conn.execute(f"SELECT {', '.join(selected)} {source} ORDER BY {order}")
+    position = 0
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        end = position + len(chunk)
+        for (kind, array, data), values in zip(columns, zip(*chunk)):
+            if kind != "str":
+                array[position:end] = np.array(values, dtype=kind)  # None becomes NaN in f8 columns
+                continue
+            encoded = [value.encode() for value in values]
+            start = array[position]
+            array[position + 1:end + 1] = start + np.cumsum(np.fromiter(map(len, encoded), np.int64, len(encoded)))
+            data[start:array[end]] = np.frombuffer(b"".join(encoded), np.uint8)
+        position = end
+    for _, array, data in columns:
+        array.flush()
+        if data is not None:
+            data.flush()
+    return rows
+
+@metrics.instrument(rows=lambda manifest: sum(table["rows"] for table in manifest["tables"].values()))
+def write_snapshot(path, chunk_size=CHUNK_SIZE):
+    # Writes every table to the directory path, replacing a previous snapshot there; returns the manifest
+    staging = f"{path}.partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    start = time.perf_counter()
+    manifest = {"version": SNAPSHOT_VERSION, "created": datetime.now().isoformat(timespec="seconds"),
+                "database": os.path.basename(database.get_pool().path), "tables": {}}
+    with database.connection() as conn:
+        conn.execute("BEGIN")  # One read transaction: the WAL keeps every table at the same moment
+        try:
+            for table, (_, _, column_list) in TABLES.items():
+                rows = _write_table(conn, staging, table, chunk_size)
+                manifest["tables"][table] = {"rows": rows, "columns": {column: kind for column, _, kind in column_list}}
+        finally:
+            conn.rollback()
+    manifest["seconds"] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(staging, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    # The complete snapshot replaces the old one only once it is whole
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(staging, path)
+    return manifest
+
+#MARK: - Reading
+class StringColumn:
+    # Read-only string column over the mapped bytes and offsets; only the rows asked for are decoded
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode()
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def equals(self, value):
+        # Boolean mask of the rows equal to value, compared byte by byte without decoding any row
+        encoded = np.frombuffer(value.encode(), np.uint8)
+        starts = self.offsets[:-1]
+        mask = np.diff(self.offsets) == len(encoded)
+        for offset, byte in enumerate(encoded):
+            candidates = np.flatnonzero(mask)
+            mask[candidates] = self.data[starts[candidates] + offset] == byte
+        return mask
+
+class SnapshotTable:
+    def __init__(self, directory, name, info):
+        self.directory = directory
+        self.name = name
+        self.rows = info["rows"]
+        self.kinds = info["columns"]
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return list(self.kinds)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, column):
+        # A memory-mapped array (StringColumn for strings), mapped on first use
+        if column not in self._columns:
+            if column not in self.kinds:
+                raise KeyError(f"{self.name} has no column {column}")
+            files = {key: np.load(os.path.join(self.directory, name), mmap_mode="r")
+                     for key, name in _files(self.name, column, self.kinds[column]).items()}
+            self._columns[column] = StringColumn(files["offsets"], files["data"]) if "data" in files else files["values"]
+        return self._columns[column]
+
+class Snapshot:
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.tables = {name: SnapshotTable(path, name, info) for name, info in manifest["tables"].items()}
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+def load_snapshot(path):
+    # e.g. accounts = load_snapshot("portfolio.snapshot")["accounts"]; (accounts["balance"] * accounts["exchange_rate"]).sum()
+    with open(os.path.join(path, MANIFEST)) as file:
+        manifest = json.load(file)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+    return Snapshot(path, manifest)
@@ -0,0 +1,169 @@
+from datetime import datetime
+from . import database, history, ledger, metrics, migrations, summary
+from .config import BASE_CURRENCY
+from .models import CreditCardOutcome
+
+#MARK: - Database Functions
+@metrics.instrument()
+def create_database():
+    # Brings the file up to the current schema; a no-op once it is
+    migrations.migrate()
+
+@metrics.instrument()
+def add_account(account):
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    with database.transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO accounts (account_type, currency, exchange_rate, balance, income_percentage, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, current_date))
+        ledger.post(conn, [ledger.opening(cursor.lastrowid, account.balance, current_date)], apply=False)
+    return cursor.lastrowid
+
+@metrics.instrument(rows=len)
+def get_accounts():
+    # Explicit columns: files created before the balance/date migration store them in a different order
+    with database.connection() as conn:
+        return conn.execute('''
+            SELECT id, account_type, currency, exchange_rate, balance, income_percentage, date FROM accounts
+        ''').fetchall()
+
+@metrics.instrument()
+def update_account(account_id, account):
+    with database.transaction() as conn:
+        row = conn.execute('SELECT balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
+        if row is None:
+            return
+        conn.execute('''
+            UPDATE accounts
+            SET account_type = ?, currency = ?, exchange_rate = ?, balance = ?, income_percentage = ?
+            WHERE id = ?
+        ''', (account.account_type, account.currency, account.exchange_rate, account.balance, account.income_percentage, account_id))
+        ledger.post(conn, [ledger.adjustment(account_id, account.balance - row[0])], apply=False)
+
+@metrics.instrument()
+def delete_account(account_id):
+    with database.transaction() as conn:
+        row = conn.execute('SELECT balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
+        if row is None:
+            return
+        # Posted while the account still exists, otherwise its postings would go to EQUITY
+        ledger.post(conn, [ledger.closing(account_id, row[0])], apply=False)
+        conn.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+
+def _insert_distributions(conn, outcome_id, account_distributions):
+    conn.executemany('''
+        INSERT INTO outcome_distributions (outcome_id, account_id, amount)
+        VALUES (?, ?, ?)
+    ''', [(outcome_id, int(account_id), amount) for account_id, amount in account_distributions.items()])
+
+@metrics.instrument()
+def add_credit_card_outcome(outcome):
+    # The paying accounts are debited by their distributions in the same transaction
+    with database.transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO credit_card_outcomes (account_id, amount, description)
+            VALUES (?, ?, ?)
+        ''', (outcome.account_id, outcome.amount, outcome.description))
+        _insert_distributions(conn, cursor.lastrowid, outcome.account_distributions)
+        ledger.post(conn, [ledger.outcome_entry(cursor.lastrowid, {}, outcome.account_distributions)])
+    return cursor.lastrowid
+
+@metrics.instrument(rows=len)
+def get_credit_card_outcomes():
+    # Rows keep their (id, account_id, amount, description, account_distributions) shape,
+    # with the distributions rebuilt from the join table as a JSON object
+    with database.connection() as conn:
+        return conn.execute('''
+            SELECT o.id, o.account_id, o.amount, o.description,
+                   (SELECT json_group_object(d.account_id, d.amount)
+                    FROM outcome_distributions d WHERE d.outcome_id = o.id)
+            FROM credit_card_outcomes o
+        ''').fetchall()
+
+@metrics.instrument()
+def get_credit_card_outcome(outcome_id):
+    with database.connection() as conn:
+        row = conn.execute('''
+            SELECT account_id, amount, description FROM credit_card_outcomes WHERE id = ?
+        ''', (outcome_id,)).fetchone()
+        if row is None:
+            return None
+        distributions = dict(conn.execute('''
+            SELECT account_id, amount FROM outcome_distributions WHERE outcome_id = ?
+        ''', (outcome_id,)).fetchall())
+    return CreditCardOutcome(row[0], row[1], row[2], distributions)
+
+@metrics.instrument()
+def get_account_outcome_total(account_id):
+    # Total this account has paid toward card outcomes; served from idx_outcome_distributions_account
+    with database.connection() as conn:
+        return conn.execute('''
+            SELECT COALESCE(SUM(amount), 0) FROM outcome_distributions WHERE account_id = ?
+        ''', (account_id,)).fetchone()[0]
+
+@metrics.instrument()
+def update_credit_card_outcome(outcome_id, outcome):
+    with database.transaction() as conn:
+        updated = conn.execute('''
+            UPDATE credit_card_outcomes
+            SET account_id = ?, amount = ?, description = ?
+            WHERE id = ?
+        ''', (outcome.account_id, outcome.amount, outcome.description, outcome_id)).rowcount
+        if not updated:
+            return  # No such outcome; writing its distributions would leave them orphaned
+        previous = ledger.outcome_distributions(conn, outcome_id)
+        conn.execute('DELETE FROM outcome_distributions WHERE outcome_id = ?', (outcome_id,))
+        _insert_distributions(conn, outcome_id, outcome.account_distributions)
+        # Only the difference from the old distributions moves the paying accounts
+        ledger.post(conn, [ledger.outcome_entry(outcome_id, previous, outcome.account_distributions)])
+
+@metrics.instrument()
+def delete_credit_card_outcome(outcome_id):
+    with database.transaction() as conn:
+        # Every paying account is credited back by a reversing entry
+        ledger.post(conn, [ledger.outcome_entry(outcome_id, ledger.outcome_distributions(conn, outcome_id), {})])
+        conn.execute('DELETE FROM outcome_distributions WHERE outcome_id = ?', (outcome_id,))
+        conn.execute('DELETE FROM credit_card_outcomes WHERE id = ?', (outcome_id,))
+
+@metrics.instrument()
+def add_asset(asset):
+    with database.transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO assets (name, quantity, price_per_unit)
+            VALUES (?, ?, ?)
+        ''', (asset.name, asset.quantity, asset.price_per_unit))
+    return cursor.lastrowid
+
+@metrics.instrument(rows=len)
+def get_assets():
+    with database.connection() as conn:
+        return conn.execute('SELECT * FROM assets').fetchall()
+
+@metrics.instrument()
+def update_asset(asset_id, asset):
+    with database.transaction() as conn:
+        conn.execute('''
+            UPDATE assets
+            SET name = ?, quantity = ?, price_per_unit = ?
+            WHERE id = ?
+        ''', (asset.name, asset.quantity, asset.price_per_unit, asset_id))
+
+@metrics.instrument()
+def delete_asset(asset_id):
+    with database.transaction() as conn:
+        conn.execute('DELETE FROM assets WHERE id = ?', (asset_id,))
+
+@metrics.instrument()
+def calculate_total_money():
+    # Maintained by triggers in summary.py
+    return summary.get_total('accounts')
+
+@metrics.instrument()
+def calculate_total_outcome():
+    return summary.get_total('outcomes')
+
+@metrics.instrument(rows=len)
+def get_money_over_time(start=None, end=None, granularity='day', reporting_currency=BASE_CURRENCY):
+    # Total money at the close of every day (or month) with a balance change, from the history rollups
+    return history.money_over_time(start, end, granularity, reporting_currency)
@@ -0,0 +1,115 @@
+from . import database
+
+# Running totals kept up to date by triggers, so dashboard totals are single-row reads.
+# dimension/key pairs:
+#   ('accounts', 'all')           sum of all balances
+#   ('currency', <currency>)      balances per currency
+#   ('account_type', <type>)      balances per account type
+#   ('outcomes', 'all')           sum of all credit card outcomes
+#   ('outcome_account', <id>)     outcomes per card account
+SUMMARY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS portfolio_totals (
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, key)
+    ) WITHOUT ROWID
+'''
+
+def _add(dimension, key, amount, count):
+    return f'''
+        INSERT INTO portfolio_totals (dimension, key, total, row_count) VALUES ('{dimension}', {key}, {amount}, {count})
+        ON CONFLICT (dimension, key) DO UPDATE SET total = total + excluded.total, row_count = row_count + excluded.row_count;'''
+
+def _account_changes(row, sign):
+    return (_add('accounts', "'all'", f"{sign}{row}.balance", f"{sign}1")
+            + _add('currency', f"{row}.currency", f"{sign}{row}.balance", f"{sign}1")
+            + _add('account_type', f"{row}.account_type", f"{sign}{row}.balance", f"{sign}1"))
+
+def _outcome_changes(row, sign):
+    return (_add('outcomes', "'all'", f"{sign}{row}.amount", f"{sign}1")
+            + _add('outcome_account', f"CAST({row}.account_id AS TEXT)", f"{sign}{row}.amount", f"{sign}1"))
+
+SUMMARY_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS accounts_totals_insert AFTER INSERT ON accounts BEGIN {_account_changes('NEW', '')} END",
+    f"CREATE TRIGGER IF NOT EXISTS accounts_totals_delete AFTER DELETE ON accounts BEGIN {_account_changes('OLD', '-')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS accounts_totals_update AFTER UPDATE OF balance, currency, account_type ON accounts
+        BEGIN {_account_changes('OLD', '-')} {_account_changes('NEW', '')} END''',
+    f"CREATE TRIGGER IF NOT EXISTS outcomes_totals_insert AFTER INSERT ON credit_card_outcomes BEGIN {_outcome_changes('NEW', '')} END",
+    f"CREATE TRIGGER IF NOT EXISTS outcomes_totals_delete AFTER DELETE ON credit_card_outcomes BEGIN {_outcome_changes('OLD', '-')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS outcomes_totals_update AFTER UPDATE OF account_id, amount ON credit_card_outcomes
+        BEGIN {_outcome_changes('OLD', '-')} {_outcome_changes('NEW', '')} END''',
+]
+
+# The same totals computed from scratch; used to (re)build the table and to check it
+RECOMPUTE_SQL = '''
+    SELECT 'accounts', 'all', COALESCE(SUM(balance), 0), COUNT(*) FROM accounts
+    UNION ALL SELECT 'currency', currency, SUM(balance), COUNT(*) FROM accounts GROUP BY currency
+    UNION ALL SELECT 'account_type', account_type, SUM(balance), COUNT(*) FROM accounts GROUP BY account_type
+    UNION ALL SELECT 'outcomes', 'all', COALESCE(SUM(amount), 0), COUNT(*) FROM credit_card_outcomes
+    UNION ALL SELECT 'outcome_account', CAST(account_id AS TEXT), SUM(amount), COUNT(*) FROM credit_card_outcomes GROUP BY account_id
+'''
+
+def create_summary(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'portfolio_totals'").fetchone()
+    conn.execute(SUMMARY_TABLE)
+    for trigger in SUMMARY_TRIGGERS:
+        conn.execute(trigger)
+    if not exists:
+        rebuild_totals(conn)
+
+def rebuild_totals(conn):
+    conn.execute('DELETE FROM portfolio_totals')
+    conn.execute(f'INSERT INTO portfolio_totals (dimension, key, total, row_count) {RECOMPUTE_SQL}')
+
+#MARK: - Reads
+def get_total(dimension, key='all'):
+    with database.connection() as conn:
+        row = conn.execute('SELECT total FROM portfolio_totals WHERE dimension = ? AND key = ?', (dimension, str(key))).fetchone()
+    return row[0] if row else 0
+
+def get_totals(dimension):
+    # {key: total} for every group that still has rows
+    with database.connection() as conn:
+        return dict(conn.execute('''
+            SELECT key, total FROM portfolio_totals WHERE dimension = ? AND row_count > 0
+        ''', (dimension,)).fetchall())
+
+#MARK: - Consistency Check
+def check_totals(tolerance=1e-6):
+    # Recomputes every total from the base tables and returns the groups that drifted
+    # as (dimension, key, stored total, actual total, stored count, actual count)
+    with database.connection() as conn:
+        stored = {(d, k): (t, c) for d, k, t, c in conn.execute(
+            'SELECT dimension, key, total, row_count FROM portfolio_totals')}
+        actual = {(d, k): (t, c) for d, k, t, c in conn.execute(RECOMPUTE_SQL)}
+    drift = []
+    for key in sorted(stored.keys() | actual.keys(), key=str):
+        stored_total, stored_count = stored.get(key, (0, 0))
+        actual_total, actual_count = actual.get(key, (0, 0))
+        if actual_count == 0 and stored_count == 0:
+            continue
+        if stored_count != actual_count or abs(stored_total - actual_total) > tolerance * max(1.0, abs(actual_total)):
+            drift.append((*key, stored_total, actual_total, stored_count, actual_count))
+    return drift
+
+def repair_totals():
+    with database.transaction() as conn:
+        rebuild_totals(conn)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the incrementally maintained portfolio totals against the base tables")
+    parser.add_argument("--repair", action="store_true", help="Rebuild the totals if any drift is found")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    args = parser.parse_args()
+    if args.database:
+        database.configure(args.database)
+    drift = check_totals()
+    for dimension, key, stored_total, actual_total, stored_count, actual_count in drift:
+        print(f"{dimension}/{key}: stored {stored_total} ({stored_count} rows), actual {actual_total} ({actual_count} rows)")
+    print(f"{len(drift)} drifted totals")
+    if drift and args.repair:
+        repair_totals()
+        print("Totals rebuilt")
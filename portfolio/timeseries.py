@@ -0,0 +1,48 @@
+import numpy as np
+from . import history
+from .config import BASE_CURRENCY
+
+# Time series for the Money Over Time chart: rows become datetime64/float64 arrays and are
+# downsampled to about one point per horizontal pixel, so drawing cost does not grow with history.
+DEFAULT_MAX_POINTS = 1000
+
+SERIES_DTYPE = np.dtype([('date', 'datetime64[D]'), ('value', 'f8')])
+
+def to_arrays(rows):
+    # [(ISO date or YYYY-MM month, value)] -> (datetime64[D] dates, float64 values), parsed in one pass
+    series = np.fromiter(rows, dtype=SERIES_DTYPE, count=len(rows))
+    return series['date'], series['value']
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, from each bucket in between,
+    # the point forming the largest triangle with the previous pick and the next bucket's mean.
+    # Returns indices into x/y, so callers can take any aligned arrays with them.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    xf = x.astype('datetime64[D]').astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.float64)
+    yf = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    picked = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x, next_y = xf[stop:edges[bucket + 2]].mean(), yf[stop:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = xf[-1], yf[-1]
+        ax, ay = xf[picked], yf[picked]
+        area = np.abs((ax - next_x) * (yf[start:stop] - ay) - (ax - xf[start:stop]) * (next_y - ay))
+        picked = start + int(area.argmax())
+        indices[bucket + 1] = picked
+    return indices
+
+def downsample(dates, values, max_points=DEFAULT_MAX_POINTS):
+    indices = lttb(dates, values, max_points)
+    return dates[indices], values[indices]
+
+def money_series(start=None, end=None, max_points=DEFAULT_MAX_POINTS, granularity='day', reporting_currency=BASE_CURRENCY):
+    # Only the requested window is read (an index range scan over the rollups), then downsampled
+    dates, values = to_arrays(history.money_over_time(start, end, granularity, reporting_currency))
+    return downsample(dates, values, max_points)
@@ -0,0 +1,120 @@
+import numpy as np
+from . import database, metrics
+from .config import BASE_CURRENCY, get_exchange_rate
+
+# accounts.exchange_rate holds the price of one unit of the account currency in BASE_CURRENCY
+CURRENCY_WIDTH = 8
+
+ACCOUNT_DTYPE = np.dtype([
+    ('id', 'i8'), ('balance', 'f8'), ('exchange_rate', 'f8'), ('income_percentage', 'f8'), ('currency', f'U{CURRENCY_WIDTH}'),
+])
+ASSET_DTYPE = np.dtype([('id', 'i8'), ('quantity', 'f8'), ('price_per_unit', 'f8')])
+# unpaid: the part of amount no account has paid yet (its distributions fall short of it)
+OUTCOME_DTYPE = np.dtype([('id', 'i8'), ('amount', 'f8'), ('unpaid', 'f8'), ('exchange_rate', 'f8')])
+
+# Paid parts are already out of the paying accounts' balances, so only the rest is still owed
+UNPAID_SQL = 'MAX(o.amount - (SELECT COALESCE(SUM(d.amount), 0) FROM outcome_distributions d WHERE d.outcome_id = o.id), 0)'
+
+#MARK: - Positions
+class Positions:
+    def __init__(self, accounts, assets, outcomes, currencies=None):
+        self.accounts = accounts
+        self.assets = assets
+        self.outcomes = outcomes
+        # Sorted distinct currencies and each account's index into them, computed once per load
+        if currencies is None:
+            currencies = np.unique(accounts['currency'])
+        self.currencies = np.asarray(currencies, dtype=ACCOUNT_DTYPE['currency'])
+        self.currency_codes = np.zeros(len(accounts), dtype=np.intp)
+        for code, currency in enumerate(self.currencies):
+            self.currency_codes[accounts['currency'] == currency] = code
+
+def _load(conn, table, query, dtype):
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    return np.fromiter(conn.execute(query), dtype=dtype, count=count)
+
+@metrics.instrument(rows=lambda positions: len(positions.accounts) + len(positions.assets) + len(positions.outcomes))
+def load_positions():
+    # One pass per table straight into structured arrays, no intermediate lists of tuples
+    with database.connection() as conn:
+        accounts = _load(conn, 'accounts', '''
+            SELECT id, balance, exchange_rate, COALESCE(income_percentage, 0), UPPER(currency) FROM accounts
+        ''', ACCOUNT_DTYPE)
+        assets = _load(conn, 'assets', 'SELECT id, quantity, price_per_unit FROM assets', ASSET_DTYPE)
+        # Outcomes are charged in the currency of the card account they belong to
+        outcomes = _load(conn, 'credit_card_outcomes', f'''
+            SELECT o.id, o.amount, {UNPAID_SQL}, COALESCE(a.exchange_rate, 1.0)
+            FROM credit_card_outcomes o LEFT JOIN accounts a ON a.id = o.account_id
+        ''', OUTCOME_DTYPE)
+        currencies = sorted(row[0] for row in conn.execute('SELECT DISTINCT UPPER(currency) FROM accounts'))
+    return Positions(accounts, assets, outcomes, currencies)
+
+#MARK: - Valuation
+class Valuation:
+    def __init__(self, reporting_currency, account_ids, account_values, monthly_income, currencies, exposure,
+                 assets_total, outcome_ids, outcome_values, unpaid_values, rate=1.0):
+        self.reporting_currency = reporting_currency
+        self.rate = rate  # Price of one unit of the reporting currency in BASE_CURRENCY
+        self.account_ids = account_ids
+        self.account_values = account_values  # Balance of every account in the reporting currency
+        self.monthly_income = monthly_income  # BankAccount.calculate_monthly_income for every account, converted
+        self.currencies = currencies
+        self.exposure = exposure  # Value held in each currency, aligned with currencies
+        self.outcome_ids = outcome_ids
+        self.outcome_values = outcome_values  # Every outcome's amount, for the outcome charts
+        self.unpaid_values = unpaid_values  # What is still owed on each
+        self.accounts_total = float(account_values.sum())
+        self.assets_total = assets_total
+        self.outcomes_total = float(outcome_values.sum())
+        self.debt_total = float(unpaid_values.sum())
+        self.monthly_income_total = float(monthly_income.sum())
+
+    @property
+    def net_worth(self):
+        # Paid outcomes already left the accounts they were paid from; subtracting them again would count them twice
+        return self.accounts_total + self.assets_total - self.debt_total
+
+    def exposure_by_currency(self):
+        return dict(zip(self.currencies.tolist(), self.exposure.tolist()))
+
+def reporting_rate(positions, reporting_currency, rate_lookup=get_exchange_rate):
+    # Price of one unit of the reporting currency in BASE_CURRENCY, preferring the rates already stored on accounts
+    if reporting_currency == BASE_CURRENCY:
+        return 1.0
+    matches = np.flatnonzero(positions.currencies == reporting_currency)
+    if len(matches):
+        return float(positions.accounts['exchange_rate'][positions.currency_codes == matches[0]].mean())
+    rate = rate_lookup(reporting_currency, BASE_CURRENCY)
+    if rate is None:
+        raise ValueError(f"No exchange rate available for {reporting_currency}")
+    return rate
+
+@metrics.instrument()
+def value_portfolio(positions, reporting_currency=BASE_CURRENCY, rate_lookup=get_exchange_rate):
+    reporting_currency = reporting_currency.upper()
+    rate = reporting_rate(positions, reporting_currency, rate_lookup)
+    scale = 1.0 / rate
+    accounts = positions.accounts
+
+    account_values = accounts['balance'] * accounts['exchange_rate'] * scale
+    monthly_income = account_values * (accounts['income_percentage'] / 100)
+    currencies = positions.currencies
+    exposure = np.bincount(positions.currency_codes, weights=account_values, minlength=len(currencies))
+
+    # Assets have no currency column and are priced in BASE_CURRENCY
+    assets_total = float(np.dot(positions.assets['quantity'], positions.assets['price_per_unit'])) * scale
+    outcome_values = positions.outcomes['amount'] * positions.outcomes['exchange_rate'] * scale
+    unpaid_values = positions.outcomes['unpaid'] * positions.outcomes['exchange_rate'] * scale
+    if assets_total:
+        index = np.searchsorted(currencies, BASE_CURRENCY)
+        if index < len(currencies) and currencies[index] == BASE_CURRENCY:
+            exposure[index] += assets_total
+        else:
+            currencies = np.insert(currencies, index, BASE_CURRENCY)
+            exposure = np.insert(exposure, index, assets_total)
+
+    return Valuation(reporting_currency, accounts['id'], account_values, monthly_income, currencies, exposure,
+                     assets_total, positions.outcomes['id'], outcome_values, unpaid_values, rate)
+
+def calculate_net_worth(reporting_currency=BASE_CURRENCY):
+    return value_portfolio(load_positions(), reporting_currency).net_worth
@@ -0,0 +1,93 @@
+import argparse
+import os
+import time
+from matplotlib.backends.backend_pdf import PdfPages
+from portfolio import database, store
+from portfolio.config import load_config
+from portfolio.chart_data import money_breakdown, outcome_breakdown, money_pie, outcome_pie, MONEY_GROUPS, OUTCOME_GROUPS, TOP_N
+from charts import PieChart, TimeSeriesChart, FanChart
+from translations import LANG_DICT
+
+# Batch report: the dashboard's charts rendered straight to files with the Agg backend, without Tk,
+# pyplot or a display, e.g. from cron or on a server. Groupings, language and reporting currency
+# default to config.json, so the files show what the GUI would.
+# python report.py --output reports --format png pdf
+FORMATS = ("png", "pdf")
+
+def pies(texts, money_group, outcome_group, reporting_currency, top_n):
+    from portfolio.valuation import load_positions, value_portfolio
+    valuation = value_portfolio(load_positions(), reporting_currency)
+    scale = 1.0 / valuation.rate
+    money, outcome = PieChart(name="money"), PieChart(footer_y=0.01, name="outcome")
+    money.set_data(*money_pie(money_breakdown(money_group, top_n, scale), valuation, texts))
+    outcome.set_data(*outcome_pie(outcome_breakdown(outcome_group, top_n, scale), valuation, texts))
+    return [("money", money.figure), ("outcomes", outcome.figure)]
+
+def money_over_time(texts, reporting_currency):
+    from portfolio.timeseries import money_series
+    dates, balances = money_series(reporting_currency=reporting_currency)
+    chart = TimeSeriesChart(title=texts["money_over_time"], xlabel=texts["date"], ylabel=f"{texts['total_money']} ({reporting_currency})")
+    chart.set_data(dates, balances, fit=True)
+    return [("money_over_time", chart.figure)]
+
+def projection(texts, config, reporting_currency):
+    from portfolio.valuation import load_positions
+    from portfolio.projection import project, DEFAULT_MONTHS, DEFAULT_PATHS
+    result = project(load_positions(), config.get("projection_months", DEFAULT_MONTHS), config.get("projection_paths", DEFAULT_PATHS),
+                     config.get("projection_workers"), reporting_currency=reporting_currency)
+    if result is None:
+        return []
+    chart = FanChart(xlabel=texts["date"], ylabel=f"{texts['total_money']} ({result.reporting_currency})")
+    chart.set_data(result.dates, result.quantiles, result.bands, title=f"{texts['projection']}: {result.paths:,} paths")
+    return [("projection", chart.figure)]
+
+def write_report(output, formats, language, money_group, outcome_group, reporting_currency, top_n, config, with_projection=False):
+    # Returns the paths written: one PNG per chart, and every chart as a page of a single report.pdf
+    texts = LANG_DICT[language]
+    os.makedirs(output, exist_ok=True)
+    sections = [lambda: pies(texts, money_group, outcome_group, reporting_currency, top_n), lambda: money_over_time(texts, reporting_currency)]
+    if with_projection:
+        sections.append(lambda: projection(texts, config, reporting_currency))
+    written = []
+    pdf = PdfPages(os.path.join(output, "report.pdf")) if "pdf" in formats else None
+    try:
+        for section in sections:
+            start = time.perf_counter()
+            figures = section()
+            for name, figure in figures:
+                if "png" in formats:
+                    path = os.path.join(output, f"{name}.png")
+                    figure.savefig(path)
+                    written.append(path)
+                if pdf is not None:
+                    pdf.savefig(figure)
+            print(f"{', '.join(name for name, _ in figures) or 'nothing to draw'}: {time.perf_counter() - start:.2f} s")
+    finally:
+        if pdf is not None:
+            pdf.close()
+            written.append(os.path.join(output, "report.pdf"))
+    return written
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Render the portfolio charts to PNG and PDF files")
+    parser.add_argument("--database", help="Database file (default: database_path from config.json)")
+    parser.add_argument("--output", default="reports", help="Directory for the files")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--language", choices=sorted(LANG_DICT), default=config.get("language", "en"))
+    parser.add_argument("--money-grouping", choices=MONEY_GROUPS, default=config.get("money_grouping", "account"))
+    parser.add_argument("--outcome-grouping", choices=OUTCOME_GROUPS, default=config.get("outcome_grouping", "outcome"))
+    parser.add_argument("--reporting-currency", default=config.get("reporting_currency", "TRY"))
+    parser.add_argument("--top-n", type=int, default=config.get("chart_top_n", TOP_N))
+    parser.add_argument("--projection", action="store_true", help="Add a fan chart of the net worth projection")
+    args = parser.parse_args(argv)
+    if args.database:
+        database.configure(args.database)
+    store.create_database()
+    start = time.perf_counter()
+    written = write_report(args.output, args.format, args.language, args.money_grouping, args.outcome_grouping,
+                           args.reporting_currency.upper(), args.top_n, config, args.projection)
+    print(f"Wrote {len(written)} file(s) to {args.output} in {time.perf_counter() - start:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from tkinter import ttk
+import customtkinter as ctk
+from portfolio.pages import fetch_page, display_rows, columns as table_columns
+
+PAGE_SIZE = 50  # Rows held and drawn at a time
+FILTER_DELAY = 250  # ms of no typing before the filter is applied
+
+#MARK: - Table View
+# One page of a table in a Treeview. Pages are fetched on the executor with keyset pagination; scrolling
+# past either end, the Previous/Next buttons, heading clicks (sort) and the filter box all fetch a new page
+# and replace the rows, so opening or paging a table costs the same whatever its size.
+class TableView:
+    def __init__(self, master, executor, table, on_error=None, page_size=PAGE_SIZE, params=None, labels=None):
+        self.executor = executor
+        self.table = table
+        self.page_size = page_size
+        self.params = params
+        self.on_error = on_error
+        self.columns = table_columns(table)
+        self.sort = "id"
+        self.descending = False
+        self.filters = {}
+        self.page = None
+        self._key = f"table_{table}_{id(self)}"
+        labels = labels or {}
+
+        controls = ctk.CTkFrame(master)
+        controls.pack(side="top", fill="x")
+        self.filter_column = ctk.CTkOptionMenu(controls, values=self.columns, width=160)
+        self.filter_column.set(self.columns[1] if len(self.columns) > 1 else self.columns[0])
+        self.filter_column.pack(side="left", padx=5, pady=5)
+        self.filter_entry = ctk.CTkEntry(controls, placeholder_text=labels.get("filter", "Filter"), width=200)
+        self.filter_entry.pack(side="left", padx=5, pady=5)
+        self.filter_entry.bind("<KeyRelease>", lambda event: self._filter_changed())
+        self.next_button = ctk.CTkButton(controls, text=labels.get("next", "Next"), width=80, command=self.next_page)
+        self.next_button.pack(side="right", padx=5, pady=5)
+        self.previous_button = ctk.CTkButton(controls, text=labels.get("previous", "Previous"), width=80, command=self.previous_page)
+        self.previous_button.pack(side="right", padx=5, pady=5)
+        self.status = ctk.CTkLabel(controls, text="")
+        self.status.pack(side="right", padx=10)
+
+        self.tree = ttk.Treeview(master, columns=self.columns, show="headings", height=page_size)
+        for column in self.columns:
+            self.tree.heading(column, text=column, command=lambda column=column: self.sort_by(column))
+            self.tree.column(column, width=120, stretch=True)
+        self.tree.pack(side="top", fill="both", expand=True)
+        # Scrolling past the first or last row turns the page
+        self.tree.bind("<MouseWheel>", self._wheel)
+        self.tree.bind("<Button-4>", lambda event: self._edge_scroll(-1))
+        self.tree.bind("<Button-5>", lambda event: self._edge_scroll(1))
+        self.load()
+
+    def load(self, after=None, before=None, delay=0):
+        # Only the latest request per view is delivered, so fast paging or typing never queues pages
+        self.executor.coalesce(self._key, fetch_page, self.table, after, before, self.page_size, self.sort, self.descending,
+                               dict(self.filters), self.params, delay=delay, on_done=self._show, on_error=self.on_error)
+
+    def _show(self, page):
+        if not self.tree.winfo_exists():
+            return
+        self.page = page
+        self.tree.delete(*self.tree.get_children())
+        for row in display_rows(page):
+            self.tree.insert("", "end", values=["" if value is None else value for value in row])
+        self.previous_button.configure(state="normal" if page.has_previous else "disabled")
+        self.next_button.configure(state="normal" if page.has_next else "disabled")
+        arrow = " ▼" if self.descending else " ▲"
+        for column in self.columns:
+            self.tree.heading(column, text=column + (arrow if column == self.sort else ""))
+        self.status.configure(text=f"{len(page.rows)} rows")
+
+    def next_page(self):
+        if self.page and self.page.has_next and self.page.rows:
+            self.load(after=self.page.boundary())
+
+    def previous_page(self):
+        if self.page and self.page.has_previous and self.page.rows:
+            self.load(before=self.page.boundary(last=False))
+
+    def sort_by(self, column):
+        self.descending = not self.descending if column == self.sort else False
+        self.sort = column
+        self.load()
+
+    def _filter_changed(self):
+        self.filters = {self.filter_column.get(): self.filter_entry.get().strip()}
+        self.load(delay=FILTER_DELAY)
+
+    def _wheel(self, event):
+        self._edge_scroll(-1 if event.delta > 0 else 1)
+
+    def _edge_scroll(self, direction):
+        first, last = self.tree.yview()
+        if direction > 0 and last >= 1.0:
+            self.next_page()
+        elif direction < 0 and first <= 0.0:
+            self.previous_page()
+
+def open_table(root, executor, table, title, on_error=None, header=None, **options):
+    # A window holding one TableView; header is optional text shown above it
+    window = ctk.CTkToplevel(root)
+    window.title(title)
+    window.geometry("900x600")
+    if header:
+        ctk.CTkLabel(window, text=header, justify="left", anchor="w").pack(side="top", fill="x", padx=10, pady=5)
+    return TableView(window, executor, table, on_error=on_error, **options)
+
+#MARK: - Outcome Search
+# Ranked full-text search over outcome descriptions as the user types, next to the per-category totals.
+# Picking a category narrows the results to it (or lists its largest outcomes when nothing is typed).
+class SearchView:
+    def __init__(self, master, executor, on_error=None, limit=PAGE_SIZE * 2, labels=None):
+        from portfolio.search import RESULT_COLUMNS
+        self.executor = executor
+        self.on_error = on_error
+        self.limit = limit
+        self.category = None
+        self._categories = {}  # Treeview item -> category, None for every category
+        self._key = f"search_{id(self)}"
+        labels = labels or {}
+        self.all_label = labels.get("all_categories", "All categories")
+
+        controls = ctk.CTkFrame(master)
+        controls.pack(side="top", fill="x")
+        self.entry = ctk.CTkEntry(controls, placeholder_text=labels.get("search", "Search"), width=320)
+        self.entry.pack(side="left", padx=5, pady=5)
+        self.entry.bind("<KeyRelease>", lambda event: self.load(delay=FILTER_DELAY))
+        self.status = ctk.CTkLabel(controls, text="")
+        self.status.pack(side="right", padx=10)
+
+        body = ctk.CTkFrame(master)
+        body.pack(side="top", fill="both", expand=True)
+        self.categories = ttk.Treeview(body, columns=("category", "outcomes", "total"), show="headings", selectmode="browse")
+        for column, width in (("category", 140), ("outcomes", 80), ("total", 110)):
+            self.categories.heading(column, text=labels.get(column, column))
+            self.categories.column(column, width=width, stretch=False)
+        self.categories.pack(side="left", fill="y")
+        self.categories.bind("<<TreeviewSelect>>", lambda event: self._category_selected())
+        self.tree = ttk.Treeview(body, columns=RESULT_COLUMNS, show="headings", height=PAGE_SIZE)
+        for column in RESULT_COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=240 if column == "description" else 90, stretch=True)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.load_categories()
+        self.entry.focus_set()
+
+    def load_categories(self):
+        from portfolio.search import get_category_totals
+        self.executor.submit(get_category_totals, on_done=self._show_categories, on_error=self.on_error)
+
+    def _show_categories(self, totals):
+        if not self.categories.winfo_exists():
+            return
+        self.categories.delete(*self.categories.get_children())
+        self._categories = {self.categories.insert("", "end", values=(self.all_label, "", "")): None}
+        for category, total, count in totals:
+            self._categories[self.categories.insert("", "end", values=(category, count, f"{total:,.2f}"))] = category
+
+    def _category_selected(self):
+        selection = self.categories.selection()
+        self.category = self._categories.get(selection[0]) if selection else None
+        self.load()
+
+    def load(self, delay=0):
+        # The last word is searched as a prefix, so results follow the typing; only the latest query is delivered
+        from portfolio.search import search_outcomes
+        self.executor.coalesce(self._key, search_outcomes, self.entry.get(), self.category, self.limit, True,
+                               delay=delay, on_done=self._show, on_error=self.on_error)
+
+    def _show(self, results):
+        if not self.tree.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for row in results.rows:
+            self.tree.insert("", "end", values=["" if value is None else value for value in row])
+        self.status.configure(text=f"{len(results.rows)} / {results.matches:,}")
+
+def open_search(root, executor, title, on_error=None, **options):
+    window = ctk.CTkToplevel(root)
+    window.title(title)
+    window.geometry("1000x600")
+    return SearchView(window, executor, on_error=on_error, **options)
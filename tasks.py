@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+POLL_INTERVAL = 30  # ms between result queue checks on the Tk thread
+
+class TaskCancelled(Exception):
+    pass
+
+class Task:
+    def __init__(self, executor, key=None):
+        self.key = key
+        self._executor = executor
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def progress(self, value):
+        # Called from the worker; doubles as the cancellation point for long-running jobs
+        if self.cancelled:
+            raise TaskCancelled()
+        self._executor._results.put((self, "progress", value))
+
+#MARK: - Executor
+# Runs blocking work (network, database, chart data) on a thread pool and delivers
+# results back on the Tk thread by polling a queue with root.after. Writes are submitted with
+# serial=True and run one at a time on a thread of their own, in the order they were made.
+class TaskExecutor:
+    def __init__(self, root, max_workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bank-worker")
+        self._serial = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bank-writer")
+        self._results = queue.SimpleQueue()
+        self._callbacks = {}
+        self._timers = {}  # key -> pending root.after id for coalesced work
+        self._running = {}  # key -> latest coalesced task
+        self._poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, with_task=False, key=None, serial=False):
+        task = Task(self, key)
+        self._callbacks[task] = (on_done, on_error, on_progress)
+
+        def run():
+            try:
+                result = fn(task, *args) if with_task else fn(*args)
+                self._results.put((task, "done", result))
+            except TaskCancelled:
+                self._results.put((task, "cancelled", None))
+            except Exception as e:
+                self._results.put((task, "error", e))
+        (self._serial if serial else self._pool).submit(run)
+        return task
+
+    def coalesce(self, key, fn, *args, delay=150, **callbacks):
+        # A burst of calls with the same key within `delay` ms runs fn once; a newer run
+        # supersedes an older one still in flight, whose result is then dropped
+        if key in self._timers:
+            self.root.after_cancel(self._timers[key])
+
+        def start():
+            self._timers.pop(key, None)
+            previous = self._running.get(key)
+            if previous:
+                previous.cancel()
+            self._running[key] = self.submit(fn, *args, key=key, **callbacks)
+        self._timers[key] = self.root.after(delay, start)
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    task, kind, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._deliver(task, kind, value)
+        finally:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def _deliver(self, task, kind, value):
+        on_done, on_error, on_progress = self._callbacks.get(task, (None, None, None))
+        if kind == "progress":
+            if on_progress and not task.cancelled:
+                on_progress(value)
+            return
+        self._callbacks.pop(task, None)
+        if task.key is not None and self._running.get(task.key) is task:
+            del self._running[task.key]
+        if kind == "error":
+            if not on_error:
+                raise value
+            on_error(value)
+        elif kind == "done" and on_done and not task.cancelled:
+            on_done(value)
+
+    def shutdown(self):
+        for timer in self._timers.values():
+            self.root.after_cancel(timer)
+        self._timers.clear()
+        for task in list(self._callbacks):
+            task.cancel()
+        self.root.after_cancel(self._poll_id)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        # Writes already queued still run, so none the user has been told about is lost
+        self._serial.shutdown(wait=True)
+
+#MARK: - Responsiveness Probe
+# Schedules a tick every `interval` ms and records how late it fires; the lateness is the
+# time the event loop was blocked
+class StallProbe:
+    def __init__(self, root, interval=20):
+        self.root = root
+        self.interval = interval
+        self._after_id = None
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.max_stall = 0.0
+        self.total_stall = 0.0
+        self.stalls_over_100ms = 0
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval / 1000
+        self._after_id = self.root.after(self.interval, self._tick)
+        return self
+
+    def stop(self):
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        stall = max(0.0, (now - self._expected) * 1000)
+        self.samples += 1
+        self.total_stall += stall
+        self.max_stall = max(self.max_stall, stall)
+        if stall > 100:
+            self.stalls_over_100ms += 1
+        self._expected = now + self.interval / 1000
+        self._after_id = self.root.after(self.interval, self._tick)
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "max_stall_ms": self.max_stall,
+            "mean_stall_ms": self.total_stall / self.samples if self.samples else 0.0,
+            "stalls_over_100ms": self.stalls_over_100ms,
+        }
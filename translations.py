@@ -0,0 +1,134 @@
+# UI strings by language code. The GUI and the headless chart report (report.py) both read them,
+# so a chart says the same thing on screen and in a file.
+LANG_DICT = {
+    "en": {
+        "add_account": "Add Account",
+        "view_accounts": "View Accounts",
+        "update_account": "Update Account",
+        "delete_account": "Delete Account",
+        "add_credit_card_outcome": "Add Credit Card Outcome",
+        "view_credit_card_outcomes": "View Credit Card Outcomes",
+        "search_outcomes": "Search Credit Card Outcomes",
+        "search": "Search descriptions (\"phrase\", prefix*)",
+        "all_categories": "All categories",
+        "category": "Category",
+        "outcomes": "Outcomes",
+        "total": "Total",
+        "update_credit_card_outcome": "Update Credit Card Outcome",
+        "delete_credit_card_outcome": "Delete Credit Card Outcome",
+        "add_asset": "Add Asset",
+        "view_assets": "View Assets",
+        "update_asset": "Update Asset",
+        "delete_asset": "Delete Asset",
+        "show_total_money_pie_chart": "Show Total Money Pie Chart",
+        "show_total_outcome_pie_chart": "Show Total Outcome Pie Chart",
+        "exit": "Exit",
+        "switch_language": "Switch Language",
+        "info": "Info",
+        "error": "Error",
+        "account_added_successfully": "Account added successfully",
+        "account_updated_successfully": "Account updated successfully",
+        "account_deleted_successfully": "Account deleted successfully",
+        "credit_card_outcome_added": "Credit card outcome added successfully",
+        "credit_card_outcome_updated": "Credit card outcome updated successfully",
+        "credit_card_outcome_deleted": "Credit card outcome deleted successfully",
+        "asset_added_successfully": "Asset added successfully",
+        "asset_updated_successfully": "Asset updated successfully",
+        "asset_deleted_successfully": "Asset deleted successfully",
+        "invalid_input": "Invalid input",
+        "total_money_distribution": "Total Money Distribution",
+        "no_data": "No Data",
+        "total_outcome_distribution": "Total Outcome Distribution",
+        "show_money_distribution_list": "Show Money Distribution List",
+        "import_data": "Import",
+        "cancel": "Cancel",
+        "import_kind": "What does the file contain? (accounts / outcomes / assets)",
+        "import_account_id": "Enter card account ID (leave blank to use the file's account_id column):",
+        "group_by": "Group charts by:",
+        "other": "Other",
+        "total_money": "Total Money",
+        "total_debt": "Total debt",
+        "money_over_time": "Overall Money Over Time",
+        "date": "Date",
+        "filter": "Filter",
+        "previous": "Previous",
+        "next": "Next",
+        "diagnostics": "Diagnostics",
+        "record_metrics": "Record metrics",
+        "start_profiling": "Start profiling",
+        "stop_profiling": "Stop profiling",
+        "reset": "Reset",
+        "export": "Export...",
+        "projection": "Net Worth Projection",
+        "no_projection_data": "Add an account or asset to project",
+        "refresh_rates": "Refresh Exchange Rates",
+        "rates_refreshed": "Re-priced {accounts} accounts at today's rates: {rates}",
+        "saving_paused": "Your changes could not be saved yet and editing is paused. Saving is retried in the background.\n\n{error}",
+        "unsaved_changes": "Your last changes could not be saved. Retry, or cancel to quit without them.\n\n{error}"
+    },
+    "tr": {
+        "add_account": "Hesap Ekle",
+        "view_accounts": "Hesapları Görüntüle",
+        "update_account": "Hesabı Güncelle",
+        "delete_account": "Hesabı Sil",
+        "add_credit_card_outcome": "Kredi Kartı Harcaması Ekle",
+        "view_credit_card_outcomes": "Kredi Kartı Harcamalarını Görüntüle",
+        "search_outcomes": "Kredi Kartı Harcamalarında Ara",
+        "search": "Açıklamalarda ara (\"ifade\", önek*)",
+        "all_categories": "Tüm kategoriler",
+        "category": "Kategori",
+        "outcomes": "Harcamalar",
+        "total": "Toplam",
+        "update_credit_card_outcome": "Kredi Kartı Harcamasını Güncelle",
+        "delete_credit_card_outcome": "Kredi Kartı Harcamasını Sil",
+        "add_asset": "Varlık Ekle",
+        "view_assets": "Varlıkları Görüntüle",
+        "update_asset": "Varlığı Güncelle",
+        "delete_asset": "Varlığı Sil",
+        "show_total_money_pie_chart": "Toplam Para Pasta Grafiğini Göster",
+        "show_total_outcome_pie_chart": "Toplam Harcama Pasta Grafiğini Göster",
+        "exit": "Çıkış",
+        "switch_language": "Dili Değiştir",
+        "info": "Bilgi",
+        "error": "Hata",
+        "account_added_successfully": "Hesap başarıyla eklendi",
+        "account_updated_successfully": "Hesap başarıyla güncellendi",
+        "account_deleted_successfully": "Hesap başarıyla silindi",
+        "credit_card_outcome_added": "Kredi kartı harcaması başarıyla eklendi",
+        "credit_card_outcome_updated": "Kredi kartı harcaması başarıyla güncellendi",
+        "credit_card_outcome_deleted": "Kredi kartı harcaması başarıyla silindi",
+        "asset_added_successfully": "Varlık başarıyla eklendi",
+        "asset_updated_successfully": "Varlık başarıyla güncellendi",
+        "asset_deleted_successfully": "Varlık başarıyla silindi",
+        "invalid_input": "Geçersiz giriş",
+        "total_money_distribution": "Toplam Para Dağılımı",
+        "no_data": "Veri Yok",
+        "total_outcome_distribution": "Toplam Harcama Dağılımı",
+        "show_money_distribution_list": "Para Dağılımını Göster",
+        "import_data": "İçe Aktar",
+        "cancel": "İptal",
+        "import_kind": "Dosya ne içeriyor? (accounts / outcomes / assets)",
+        "import_account_id": "Kart hesap ID'sini girin (dosyadaki account_id sütununu kullanmak için boş bırakın):",
+        "group_by": "Grafikleri grupla:",
+        "other": "Diğer",
+        "total_money": "Toplam Para",
+        "total_debt": "Toplam borç",
+        "money_over_time": "Zaman İçinde Toplam Para",
+        "date": "Tarih",
+        "filter": "Filtrele",
+        "previous": "Önceki",
+        "next": "Sonraki",
+        "diagnostics": "Tanılama",
+        "record_metrics": "Ölçümleri kaydet",
+        "start_profiling": "Profillemeyi başlat",
+        "stop_profiling": "Profillemeyi durdur",
+        "reset": "Sıfırla",
+        "export": "Dışa aktar...",
+        "projection": "Net Değer Projeksiyonu",
+        "no_projection_data": "Projeksiyon için bir hesap veya varlık ekleyin",
+        "refresh_rates": "Döviz Kurlarını Güncelle",
+        "rates_refreshed": "{accounts} hesap bugünün kurlarıyla yeniden fiyatlandı: {rates}",
+        "saving_paused": "Değişiklikleriniz henüz kaydedilemedi ve düzenleme duraklatıldı. Kaydetme arka planda yeniden deneniyor.\n\n{error}",
+        "unsaved_changes": "Son değişiklikleriniz kaydedilemedi. Yeniden deneyin ya da onlarsız çıkmak için iptal edin.\n\n{error}"
+    }
+}